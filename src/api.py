@@ -1,28 +1,90 @@
 """
 FastAPI endpoints untuk Pub-Sub Log Aggregator
 """
-from fastapi import FastAPI, HTTPException, Query
-from typing import Union, List
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from typing import Iterable, Optional
 import logging
+import math
 from datetime import datetime
 from src.models import (
-    Event, 
     PublishResponse, 
+    StreamPublishResponse,
     EventsResponse, 
     Stats, 
     HealthResponse
 )
-from src.event_processor import EventProcessor
+from src.dedup_store import decode_cursor, parse_event_ts
+from src.event_processor import EventProcessor, InvalidPayloadError, QueueFullError
+from src.export import EXPORT_FORMATS, stream_export
+from src.stream_ingest import (
+    ingest_ndjson,
+    CorruptBodyError,
+    StreamInterruptedError,
+    UnsupportedEncodingError
+)
+from src.wire import (
+    JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    InvalidBodyError,
+    UnsupportedMediaTypeError,
+    decode_publish_body,
+    encode_response,
+    publish_adapter
+)
 
 logger = logging.getLogger(__name__)
 
 
-def create_app(processor: EventProcessor) -> FastAPI:
+def _publish_request_body() -> dict:
+    """Skema OpenAPI body /publish (body dibaca manual untuk content negotiation)"""
+    schema = publish_adapter.json_schema(ref_template="#/components/schemas/{model}")
+    schema.pop("$defs", None)
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                JSON_MEDIA_TYPE: {"schema": schema},
+                MSGPACK_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
+
+
+def _parse_time_bounds(since: Optional[str], until: Optional[str]) -> dict:
+    """Parse query since/until (ISO8601) menjadi epoch seconds, 400 jika tidak valid"""
+    bounds = {}
+    for name, value in (("since", since), ("until", until)):
+        if value is not None:
+            bounds[name] = parse_event_ts(value)
+            if bounds[name] is None:
+                raise HTTPException(
+                    status_code=400, detail=f"Invalid ISO8601 timestamp for {name}: {value}"
+                )
+    return bounds
+
+
+def _negotiate(model, accept: Optional[str]) -> Response:
+    """Encode response sesuai header Accept (406 jika MessagePack tidak tersedia)"""
+    try:
+        return encode_response(model, accept)
+    except UnsupportedMediaTypeError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+def create_app(
+    processor: EventProcessor,
+    trusted_api_keys: Optional[Iterable[str]] = None
+) -> FastAPI:
     """
     Factory function untuk membuat FastAPI app
     
     Args:
         processor: Instance EventProcessor
+        trusted_api_keys: API key (header X-API-Key) milik producer terpercaya
+            yang boleh memakai fast-path validation
         
     Returns:
         Configured FastAPI application
@@ -32,94 +94,228 @@ def create_app(processor: EventProcessor) -> FastAPI:
         description="Idempotent consumer dengan deduplication untuk log aggregation",
         version="1.0.0"
     )
+    trusted_keys = frozenset(trusted_api_keys or ())
     
-    @app.post("/publish", response_model=PublishResponse, status_code=200)
-    async def publish_events(events: Union[Event, List[Event]]):
+    def is_trusted(request: Request) -> bool:
+        """Check apakah request berasal dari producer terpercaya (opt-in fast path)"""
+        api_key = request.headers.get("x-api-key")
+        return api_key is not None and api_key in trusted_keys
+    
+    @app.post(
+        "/publish",
+        response_model=PublishResponse,
+        status_code=200,
+        openapi_extra=_publish_request_body()
+    )
+    async def publish_events(request: Request):
         """
         Publish event(s) ke aggregator
         
-        Mendukung single event atau batch events.
+        Mendukung single event atau batch events, dalam JSON atau MessagePack
+        (Content-Type: application/msgpack). Response mengikuti header Accept.
+        Request dengan X-API-Key terpercaya divalidasi lewat fast path.
         Event yang duplikat (berdasarkan topic + event_id) akan di-drop.
         
         Args:
-            events: Single Event atau List of Events
+            request: Request dengan body single Event atau List of Events
             
         Returns:
             PublishResponse dengan statistik processing
         """
+        accept = request.headers.get("accept")
+        try:
+            events = decode_publish_body(
+                await request.body(),
+                request.headers.get("content-type"),
+                trusted=is_trusted(request)
+            )
+        except UnsupportedMediaTypeError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except InvalidBodyError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ValidationError as e:
+            raise RequestValidationError(
+                [
+                    {**error, "loc": ("body", *error["loc"])}
+                    for error in e.errors(include_url=False, include_context=False)
+                ]
+            )
+        
         try:
             # Normalize input ke list
-            if isinstance(events, Event):
-                event_list = [events]
-            else:
-                event_list = events
+            event_list = events if isinstance(events, list) else [events]
             
             if not event_list:
                 raise HTTPException(status_code=400, detail="No events provided")
             
-            # Submit events untuk diproses
-            received = len(event_list)
-            
-            # Track duplicates yang sudah ada di dedup store
-            duplicates = 0
-            processed = 0
-            
-            for event in event_list:
-                if processor.dedup_store.is_duplicate(event):
-                    duplicates += 1
-                    processor.stats.received += 1
-                    processor.stats.duplicate_dropped += 1
-                    logger.info(f"Duplicate rejected immediately: {event.get_dedup_key()}")
-                else:
-                    await processor.submit_event(event)
-                    processed += 1
+            # Claim + queue dalam satu bulk call (dedup atomik di processor)
+            result = await processor.submit_events(event_list)
             
             logger.info(
-                f"Published {received} events: "
-                f"{processed} queued, {duplicates} duplicates rejected"
+                f"Published {result['received']} events: "
+                f"{result['processed']} queued, {result['duplicates']} duplicates rejected"
             )
             
-            return PublishResponse(
+            response = PublishResponse(
                 status="success",
-                received=received,
-                processed=processed,
-                duplicates=duplicates,
-                message=f"Successfully queued {processed} unique events"
+                received=result["received"],
+                processed=result["processed"],
+                duplicates=result["duplicates"],
+                message=f"Successfully queued {result['processed']} unique events"
             )
             
+        except HTTPException:
+            raise
+        except InvalidPayloadError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except QueueFullError as e:
+            logger.warning(f"Publish rejected (backpressure): {e}")
+            raise HTTPException(
+                status_code=413 if e.too_large else 429,
+                detail=str(e),
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
         except Exception as e:
             logger.error(f"Error publishing events: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+        
+        return _negotiate(response, accept)
+    
+    @app.post("/publish/stream", response_model=StreamPublishResponse, status_code=200)
+    async def publish_stream(request: Request):
+        """
+        Publish event dalam format NDJSON (satu event JSON per baris)
+        
+        Body di-parse dan di-queue secara incremental selama stream masuk,
+        sehingga batch besar tidak perlu di-buffer penuh di memory. Body boleh
+        dikompresi (Content-Encoding: gzip, deflate atau zstd). Baris yang tidak
+        valid ditolak tanpa menggagalkan baris lain.
+        
+        Args:
+            request: Request dengan body NDJSON
+            
+        Returns:
+            StreamPublishResponse dengan counter per stream dan nomor baris yang ditolak
+        """
+        try:
+            result = await ingest_ndjson(
+                processor,
+                request.stream(),
+                content_encoding=request.headers.get("content-encoding"),
+                trusted=is_trusted(request)
+            )
+        except UnsupportedEncodingError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except StreamInterruptedError as e:
+            logger.warning(
+                f"NDJSON stream interrupted at line {e.resume_from_line} (backpressure): {e}"
+            )
+            raise HTTPException(
+                status_code=413 if e.cause.too_large else 429,
+                detail={
+                    "message": str(e),
+                    "resume_from_line": e.resume_from_line,
+                    **e.result
+                },
+                headers={"Retry-After": str(max(1, math.ceil(e.cause.retry_after)))}
+            )
+        except CorruptBodyError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error ingesting NDJSON stream: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+        
+        if result["received"] == 0 and result["rejected"] == 0:
+            raise HTTPException(status_code=400, detail="No events provided")
+        
+        return StreamPublishResponse(
+            status="success",
+            message=f"Successfully queued {result['processed']} unique events",
+            **result
+        )
     
     @app.get("/events", response_model=EventsResponse)
     async def get_events(
+        request: Request,
         topic: str = Query(..., description="Topic name to query"),
-        limit: int = Query(1000, ge=1, le=10000, description="Maximum events to return")
+        limit: int = Query(1000, ge=1, le=10000, description="Maximum events to return"),
+        cursor: Optional[str] = Query(None, description="next_cursor dari halaman sebelumnya"),
+        since: Optional[str] = Query(None, description="Event timestamp >= since (ISO8601)"),
+        until: Optional[str] = Query(None, description="Event timestamp < until (ISO8601)")
     ):
         """
-        Query events berdasarkan topic
+        Query events berdasarkan topic dengan keyset (cursor) pagination
+        
+        Events diurutkan dari yang terbaru diproses. Gunakan next_cursor dari
+        response sebagai parameter cursor untuk mengambil halaman berikutnya.
         
         Args:
             topic: Nama topic
-            limit: Maksimal jumlah events (default: 1000)
+            limit: Maksimal jumlah events per halaman (default: 1000)
+            cursor: Cursor opaque dari halaman sebelumnya
+            since: Filter timestamp event (inklusif)
+            until: Filter timestamp event (eksklusif)
             
         Returns:
-            EventsResponse dengan list of events
+            EventsResponse dengan list of events dan next_cursor (JSON, atau
+            MessagePack jika header Accept berisi application/msgpack)
         """
+        bounds = _parse_time_bounds(since, until)
+        if cursor is not None:
+            try:
+                decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
         try:
-            events = processor.get_events_by_topic(topic, limit)
+            events, next_cursor = await processor.get_events_page(
+                topic, limit, cursor, bounds.get("since"), bounds.get("until")
+            )
             
             logger.debug(f"Query events for topic '{topic}': {len(events)} events found")
             
-            return EventsResponse(
+            # Konversi record internal ke model Event hanya di boundary API
+            response = EventsResponse.model_construct(
                 topic=topic,
                 count=len(events),
-                events=events
+                events=[record.to_event() for record in events],
+                next_cursor=next_cursor
             )
             
         except Exception as e:
             logger.error(f"Error querying events: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+        
+        return _negotiate(response, request.headers.get("accept"))
+    
+    @app.get("/events/export")
+    async def export_events(
+        topic: str = Query(..., description="Topic name to export"),
+        format: str = Query("ndjson", pattern="^(ndjson|json)$", description="ndjson atau json"),
+        since: Optional[str] = Query(None, description="Event timestamp >= since (ISO8601)"),
+        until: Optional[str] = Query(None, description="Event timestamp < until (ISO8601)")
+    ):
+        """
+        Export seluruh event satu topic sebagai streaming response
+        
+        Event dibaca per chunk dan diserialisasi langsung dari row SQLite
+        (tanpa model Event), sehingga memory server tidak bergantung pada
+        jumlah event di topic.
+        
+        Args:
+            topic: Nama topic
+            format: ndjson (satu event per baris) atau json (array)
+            since: Filter timestamp event (inklusif)
+            until: Filter timestamp event (eksklusif)
+            
+        Returns:
+            StreamingResponse NDJSON / JSON
+        """
+        bounds = _parse_time_bounds(since, until)
+        return StreamingResponse(
+            stream_export(processor, topic, format, bounds.get("since"), bounds.get("until")),
+            media_type=EXPORT_FORMATS[format]
+        )
     
     @app.get("/stats", response_model=Stats)
     async def get_stats():
@@ -130,7 +326,7 @@ def create_app(processor: EventProcessor) -> FastAPI:
             Stats object dengan metrik real-time
         """
         try:
-            stats = processor.get_stats()
+            stats = await processor.get_stats_async()
             logger.debug(f"Stats queried: {stats.received} received, {stats.unique_processed} processed")
             return stats
             
@@ -160,7 +356,9 @@ def create_app(processor: EventProcessor) -> FastAPI:
             "status": "running",
             "endpoints": {
                 "publish": "POST /publish",
+                "publish_stream": "POST /publish/stream (NDJSON)",
                 "query": "GET /events?topic=<topic>",
+                "export": "GET /events/export?topic=<topic>&format=ndjson",
                 "stats": "GET /stats",
                 "health": "GET /health"
             }
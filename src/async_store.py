@@ -0,0 +1,116 @@
+"""
+Async facade untuk DedupStore
+Menjalankan operasi SQLite di thread terpisah supaya event loop uvicorn
+tetap responsif (termasuk /health) selama ingestion besar
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple
+from src.models import EventLike, EventRecord
+from src.storage import DedupBackend
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDedupStore:
+    """
+    Facade async di atas DedupStore
+
+    Semua operasi tulis dijalankan di satu thread writer khusus (antrian
+    request ke writer sama dengan urutan await), sedangkan operasi baca
+    dijalankan di pool thread reader seukuran pool koneksi reader store.
+    Method mengembalikan awaitable sehingga lock dan I/O SQLite tidak pernah
+    memblokir event loop.
+    """
+
+    def __init__(self, store: DedupBackend, read_workers: Optional[int] = None):
+        """
+        Inisialisasi facade
+
+        Args:
+            store: Engine dedup store yang dibungkus (lihat storage.DedupBackend)
+            read_workers: Jumlah thread reader (default: store.pool_size)
+        """
+        self.store = store
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dedup-writer")
+        self._readers = ThreadPoolExecutor(
+            max_workers=read_workers or store.pool_size, thread_name_prefix="dedup-reader"
+        )
+
+    async def _run(self, executor: ThreadPoolExecutor, fn, *args, **kwargs):
+        """Jalankan fungsi blocking di executor dan await hasilnya"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+    async def run_reader(self, fn, *args, **kwargs):
+        """Jalankan fungsi baca blocking (mis. membaca + serialisasi chunk) di thread reader"""
+        return await self._run(self._readers, fn, *args, **kwargs)
+
+    async def claim_many(self, events: List[EventLike]) -> List[bool]:
+        """Async DedupStore.claim_many (thread writer)"""
+        return await self._run(self._writer, self.store.claim_many, events)
+
+    async def claim(self, event: EventLike) -> bool:
+        """Async DedupStore.claim (thread writer)"""
+        return await self._run(self._writer, self.store.claim, event)
+
+    async def is_duplicate(self, event: EventLike) -> bool:
+        """Async DedupStore.is_duplicate (thread reader)"""
+        return await self._run(self._readers, self.store.is_duplicate, event)
+
+    async def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[EventRecord]:
+        """Async DedupStore.get_events_by_topic (thread reader)"""
+        return await self._run(self._readers, self.store.get_events_by_topic, topic, limit)
+
+    async def get_events_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[EventRecord], Optional[str]]:
+        """Async DedupStore.get_events_page (thread reader)"""
+        return await self._run(
+            self._readers, self.store.get_events_page, topic, limit, cursor, since, until
+        )
+
+    async def get_all_topics(self) -> Set[str]:
+        """Async DedupStore.get_all_topics (thread reader)"""
+        return await self._run(self._readers, self.store.get_all_topics)
+
+    async def get_total_processed(self) -> int:
+        """Async DedupStore.get_total_processed (thread reader)"""
+        return await self._run(self._readers, self.store.get_total_processed)
+
+    async def checkpoint(self, mode: str = "PASSIVE"):
+        """Async DedupStore.checkpoint (thread writer)"""
+        await self._run(self._writer, self.store.checkpoint, mode)
+
+    async def compact(self) -> int:
+        """
+        Async DedupStore.compact (thread writer)
+        
+        Tiap batch expiry dijadwalkan sebagai tugas writer terpisah, sehingga
+        claim_many yang masuk selama compaction ikut antri di antara batch.
+        
+        Returns:
+            Total event yang dihapus
+        """
+        total = 0
+        while True:
+            expired = await self._run(self._writer, self.store.expire_batch)
+            total += expired
+            if expired < self.store.retention.batch_size:
+                break
+        await self._run(self._writer, self.store.vacuum_step)
+        return total
+    
+    async def close(self):
+        """Tutup store di thread writer lalu matikan semua thread"""
+        await self._run(self._writer, self.store.close)
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        logger.info("AsyncDedupStore closed")
@@ -0,0 +1,148 @@
+"""
+Bloom filter untuk mempercepat negative lookup di dedup store
+Sebagian besar event unik, jadi "pasti belum pernah dilihat" bisa dijawab
+tanpa B-tree lookup ke SQLite
+"""
+import hashlib
+import math
+import os
+import struct
+import threading
+from typing import Optional, Tuple
+
+
+class BloomFilter:
+    """
+    Bloom filter dengan double hashing (blake2b)
+
+    Ukuran bit array dan jumlah hash function dihitung dari expected
+    cardinality dan target false-positive rate. Tidak pernah menghasilkan
+    false negative, sehingga miss dari filter berarti key pasti belum ada.
+    """
+
+    _MAGIC = b"BLM1"
+    _HEADER = struct.Struct("<4sQIQd16s")
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        """
+        Inisialisasi filter kosong
+
+        Args:
+            capacity: Perkiraan jumlah key yang akan disimpan
+            fp_rate: Target false-positive rate (0.0 - 1.0)
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        if not 0.0 < fp_rate < 1.0:
+            raise ValueError("fp_rate must be between 0 and 1")
+
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, key: bytes):
+        """Hitung posisi bit untuk key (Kirsch-Mitzenmacher double hashing)"""
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, key: bytes):
+        """
+        Tambahkan key ke filter
+
+        Args:
+            key: Key dalam bentuk bytes
+        """
+        positions = self._positions(key)
+        bits = self._bits
+        with self._lock:
+            for pos in positions:
+                bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def might_contain(self, key: bytes) -> bool:
+        """
+        Check apakah key mungkin ada di filter
+
+        Args:
+            key: Key dalam bentuk bytes
+
+        Returns:
+            False jika key pasti tidak ada, True jika mungkin ada
+        """
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def fill_ratio(self) -> float:
+        """
+        Hitung rasio bit yang sudah di-set
+
+        Returns:
+            Fill ratio (0.0 - 1.0)
+        """
+        set_bits = int.from_bytes(self._bits, "little").bit_count()
+        return set_bits / self.num_bits
+
+    def clear(self):
+        """Reset semua bit"""
+        with self._lock:
+            self._bits = bytearray(len(self._bits))
+            self.count = 0
+
+    def save(self, path: str, token: bytes):
+        """
+        Simpan snapshot filter ke disk secara atomik
+
+        Args:
+            path: Path file snapshot
+            token: Token 16 byte untuk memvalidasi snapshot saat load
+        """
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            header = self._HEADER.pack(
+                self._MAGIC, self.capacity, self.num_hashes, self.count, self.fp_rate, token
+            )
+            with open(tmp_path, "wb") as f:
+                f.write(header)
+                f.write(self._bits)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional[Tuple["BloomFilter", bytes]]:
+        """
+        Load snapshot filter dari disk
+
+        Args:
+            path: Path file snapshot
+
+        Returns:
+            Tuple (BloomFilter, token), atau None jika file tidak ada/rusak
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if len(data) < cls._HEADER.size:
+            return None
+        magic, capacity, num_hashes, count, fp_rate, token = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC:
+            return None
+
+        bloom = cls(capacity, fp_rate)
+        bits = data[cls._HEADER.size:]
+        if bloom.num_hashes != num_hashes or len(bits) != len(bloom._bits):
+            return None
+
+        bloom._bits = bytearray(bits)
+        bloom.count = count
+        return bloom, token
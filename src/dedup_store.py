@@ -2,78 +2,680 @@
 Deduplication Store menggunakan SQLite untuk persistensi
 Menyimpan event yang sudah diproses untuk mencegah duplikasi
 """
+import base64
+import hashlib
+import json
 import sqlite3
 import threading
-import json
+import queue
 import logging
-from datetime import datetime
-from typing import Optional, List, Set
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, List, Set, Literal, Tuple, Union
 from pathlib import Path
-from src.models import Event
+from pydantic import BaseModel, Field
+from src.models import EventLike, EventRecord, TopicStats
+from src.key_cache import RecentKeyCache
+from src.bloom import BloomFilter
+from src.segment_log import LogEntry, SegmentLog
 
 logger = logging.getLogger(__name__)
 
+# Counter lifetime yang di-persist di tabel dedup_counters
+COUNTER_NAMES = ("received", "unique_processed", "duplicate_dropped")
+
+# Token snapshot Bloom filter di dedup_meta; nama baru sejak filter di-key
+# dengan dedup_key_hash sehingga snapshot format lama tidak pernah dipakai
+_BLOOM_SNAPSHOT_META = "bloom_snapshot_keyhash"
+
+
+def parse_event_ts(timestamp: str) -> Optional[float]:
+    """
+    Konversi timestamp ISO8601 event menjadi epoch seconds (UTC)
+    
+    Args:
+        timestamp: Timestamp ISO8601 (tanpa offset dianggap UTC)
+        
+    Returns:
+        Epoch seconds, atau None jika tidak bisa di-parse
+    """
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def dedup_key_hash(topic: str, event_id: str) -> bytes:
+    """
+    Hash 128-bit untuk key dedup (topic, event_id)
+    
+    Panjang topic ikut di-hash supaya pasangan (topic, event_id) yang
+    berbeda tidak pernah menghasilkan input yang sama.
+    
+    Args:
+        topic: Nama topic
+        event_id: Identifier event
+        
+    Returns:
+        16 byte digest BLAKE2b
+    """
+    return hashlib.blake2b(
+        f"{len(topic)}:{topic}{event_id}".encode(), digest_size=16
+    ).digest()
+
+
+def encode_cursor(processed_at: str, event_id: str) -> str:
+    """
+    Encode posisi keyset (processed_at, event_id) menjadi cursor opaque
+    
+    Args:
+        processed_at: processed_at row terakhir di halaman
+        event_id: event_id row terakhir di halaman
+        
+    Returns:
+        Cursor base64url
+    """
+    raw = json.dumps([processed_at, event_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode cursor opaque menjadi posisi keyset
+    
+    Args:
+        cursor: Cursor dari encode_cursor
+        
+    Returns:
+        Tuple (processed_at, event_id)
+        
+    Raises:
+        ValueError: Jika cursor tidak valid
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        processed_at, event_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(processed_at, str) or not isinstance(event_id, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    # processed_at dipakai engine sebagai datetime (mis. bisect segment log)
+    try:
+        datetime.fromisoformat(processed_at)
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return processed_at, event_id
+
+
+class StorageProfile(BaseModel):
+    """
+    Konfigurasi PRAGMA SQLite untuk dedup database
+    
+    Attributes:
+        journal_mode: Mode journal (WAL agar reader tidak memblokir writer)
+        synchronous: Level fsync (NORMAL cukup aman untuk WAL, FULL paling durable)
+        cache_size: Ukuran page cache per koneksi (negatif = KiB, positif = pages)
+        mmap_size: Ukuran memory-mapped I/O dalam bytes (0 = nonaktif)
+        temp_store: Lokasi tabel/index sementara
+        busy_timeout_ms: Waktu menunggu lock sebelum SQLITE_BUSY
+        wal_checkpoint_interval: Interval checkpoint WAL periodik dalam detik (0 = nonaktif)
+    """
+    journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    cache_size: int = Field(default=-16000, description="PRAGMA cache_size")
+    mmap_size: int = Field(default=0, ge=0, description="PRAGMA mmap_size (bytes)")
+    temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    busy_timeout_ms: int = Field(default=5000, ge=0, description="PRAGMA busy_timeout")
+    wal_checkpoint_interval: float = Field(default=60.0, ge=0, description="Detik antar checkpoint")
+    
+    @classmethod
+    def preset(cls, name: str) -> "StorageProfile":
+        """
+        Ambil profile bawaan berdasarkan nama
+        
+        Args:
+            name: "wal" (default), "durable" (WAL + FULL) atau "legacy"
+                  (rollback journal seperti versi awal)
+            
+        Returns:
+            StorageProfile instance
+        """
+        presets = {
+            "wal": {},
+            "durable": {"synchronous": "FULL"},
+            "legacy": {
+                "journal_mode": "DELETE",
+                "synchronous": "FULL",
+                "cache_size": -2000,
+                "temp_store": "DEFAULT",
+                "wal_checkpoint_interval": 0
+            },
+        }
+        if name not in presets:
+            raise ValueError(f"Unknown storage profile: {name} (choices: {', '.join(presets)})")
+        return cls(**presets[name])
+
+
+class RetentionPolicy(BaseModel):
+    """
+    Retention window dedup: event yang lebih lama dari window dihapus dan
+    key-nya boleh diterima lagi sebagai event baru
+    
+    Umur event dihitung dari processed_at (waktu claim), sehingga expiry
+    bisa memakai index idx_processed_at.
+    
+    Attributes:
+        retention_seconds: Window global dalam detik (0 = simpan selamanya)
+        topic_retention: Override window per topic (0 = topic disimpan selamanya)
+        batch_size: Maksimal event yang dihapus per transaksi
+        interval: Detik antar putaran compaction di background
+        vacuum_pages: Maksimal page yang dikembalikan ke OS per putaran
+            (PRAGMA incremental_vacuum, 0 = nonaktif)
+    """
+    retention_seconds: float = Field(default=0.0, ge=0, description="Window global (detik)")
+    topic_retention: Dict[str, float] = Field(
+        default_factory=dict, description="Override window per topic (detik)"
+    )
+    batch_size: int = Field(default=1000, ge=1, description="Event per transaksi expiry")
+    interval: float = Field(default=60.0, gt=0, description="Detik antar compaction")
+    vacuum_pages: int = Field(default=1000, ge=0, description="Page per incremental vacuum")
+    
+    @property
+    def enabled(self) -> bool:
+        """True jika ada topic yang punya retention window"""
+        return self.retention_seconds > 0 or any(v > 0 for v in self.topic_retention.values())
+
 
 class DedupStore:
     """
     Persistent deduplication store menggunakan SQLite
     
     Menyimpan (topic, event_id) yang sudah diproses untuk mencegah
-    reprocessing event yang sama, bahkan setelah restart.
-    
-    Thread-safe dengan menggunakan threading.Lock untuk concurrent access.
+    reprocessing event yang sama, bahkan setelah restart. Dedup set
+    (dedup_keys, hash key saja) dipisah dari log event (event_log) yang
+    dibaca /events, sehingga lookup duplikasi tidak menyentuh page payload.
+    Dengan event_log_dir, payload disimpan di SegmentLog (file segment
+    append-only yang di-mmap) dan SQLite hanya menyimpan key dan counter.
+
+    Koneksi SQLite dibuka sekali dan dipakai ulang: satu koneksi writer
+    (di-serialisasi dengan threading.Lock) dan pool kecil koneksi reader
+    yang di-checkout per operasi baca, sehingga tidak ada biaya
+    connect/warmup page cache per event.
     """
     
-    def __init__(self, db_path: str = "data/dedup.db"):
+    def __init__(
+        self,
+        db_path: str = "data/dedup.db",
+        pool_size: int = 4,
+        profile: Optional[StorageProfile] = None,
+        key_cache_size: int = 10000,
+        key_cache_ttl: float = 300.0,
+        bloom_capacity: int = 0,
+        bloom_fp_rate: float = 0.01,
+        retention: Optional[RetentionPolicy] = None,
+        event_log_dir: Optional[str] = None,
+        segment_bytes: int = 64 * 1024 * 1024,
+        log_fsync_interval: float = 0.0
+    ):
         """
         Inisialisasi dedup store
         
         Args:
             db_path: Path ke SQLite database file
+            pool_size: Jumlah koneksi reader di pool
+            profile: StorageProfile untuk PRAGMA SQLite (default: WAL)
+            key_cache_size: Kapasitas cache key yang baru diproses (0 = nonaktif)
+            key_cache_ttl: TTL key di cache dalam detik (0 = tanpa TTL)
+            bloom_capacity: Expected cardinality untuk Bloom filter negative
+                lookup (0 = nonaktif). Filter hanya koheren jika store ini satu-satunya
+                writer ke db_path.
+            bloom_fp_rate: Target false-positive rate Bloom filter
+            retention: RetentionPolicy untuk expiry event lama (default: simpan selamanya)
+            event_log_dir: Direktori SegmentLog untuk payload event (None = tabel
+                event_log SQLite). Dengan segment log, SQLite hanya menyimpan key.
+            segment_bytes: Kapasitas satu file segment
+            log_fsync_interval: Detik minimal antar fsync segment (0 = fsync
+                setiap batch sebelum key di-commit)
         """
+        if pool_size < 1:
+            raise ValueError("pool_size must be >= 1")
+        if event_log_dir and retention is not None and retention.topic_retention:
+            # Segment berisi campuran topic dan hanya bisa di-expire utuh
+            raise ValueError("Per-topic retention is not supported with the segment event log")
+        
         self.db_path = db_path
+        self.pool_size = pool_size
+        self.profile = profile or StorageProfile()
+        self.retention = retention or RetentionPolicy()
         self.lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._last_checkpoint = time.monotonic()
+        self.key_cache: Optional[RecentKeyCache] = (
+            RecentKeyCache(key_cache_size, key_cache_ttl) if key_cache_size > 0 else None
+        )
+        
+        # Metrik compaction (expiry + incremental vacuum)
+        self.expired_events = 0
+        self.vacuumed_pages = 0
+        self.compaction_seconds = 0.0
+        
+        # Payload di segment log (opsional); segment yang sedang di-expire
+        self.segment_log: Optional[SegmentLog] = (
+            SegmentLog(event_log_dir, segment_bytes, log_fsync_interval) if event_log_dir else None
+        )
+        self._expiring: Optional[Tuple[int, int]] = None
         
         # Buat direktori jika belum ada
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         
+        # Koneksi writer (long-lived) dan pool koneksi reader
+        self._writer = self._connect()
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=pool_size)
+        
         # Inisialisasi database
         self._init_db()
-        logger.info(f"DedupStore initialized at {db_path}")
+        
+        for _ in range(pool_size):
+            self._readers.put(self._connect())
+        
+        # Bloom filter untuk definite-miss tanpa SQLite
+        self.bloom: Optional[BloomFilter] = None
+        self.bloom_path = f"{db_path}.bloom"
+        self.bloom_negatives = 0
+        self.bloom_false_positives = 0
+        self.bloom_false_negatives = 0
+        if bloom_capacity > 0:
+            self.bloom = self._load_bloom(bloom_capacity, bloom_fp_rate)
+        
+        logger.info(
+            f"DedupStore initialized at {db_path} (reader pool: {pool_size}, "
+            f"journal_mode: {self.profile.journal_mode}, synchronous: {self.profile.synchronous})"
+        )
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Buka koneksi SQLite yang bisa dipakai lintas thread dengan PRAGMA dari profile"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            timeout=self.profile.busy_timeout_ms / 1000
+        )
+        conn.execute(f"PRAGMA busy_timeout = {self.profile.busy_timeout_ms}")
+        conn.execute(f"PRAGMA synchronous = {self.profile.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {self.profile.cache_size}")
+        conn.execute(f"PRAGMA mmap_size = {self.profile.mmap_size}")
+        conn.execute(f"PRAGMA temp_store = {self.profile.temp_store}")
+        return conn
+    
+    @contextmanager
+    def _reader(self):
+        """Checkout koneksi reader dari pool, kembalikan setelah selesai"""
+        if self._closed:
+            raise RuntimeError("DedupStore is closed")
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
+    @property
+    def closed(self) -> bool:
+        """True jika store sudah di-close"""
+        return self._closed
+    
+    def close(self):
+        """Tutup koneksi writer dan semua koneksi reader (simpan snapshot Bloom filter)"""
+        with self.lock:
+            if self._closed:
+                return
+            if any(self._counter_deltas.values()):
+                with self._writer as conn:
+                    self._write_counter_deltas(conn, {})
+                self._commit_counter_deltas({})
+            if self.bloom is not None:
+                self._save_bloom()
+            if self.segment_log is not None:
+                self.segment_log.close()
+            self._closed = True
+            self._writer.close()
+            for _ in range(self.pool_size):
+                self._readers.get().close()
+        logger.info(f"DedupStore closed: {self.db_path}")
     
     def _init_db(self):
         """Inisialisasi schema database"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.lock:
+            conn = self._writer
             cursor = conn.cursor()
             
-            # Tabel untuk menyimpan event yang sudah diproses
+            # auto_vacuum hanya bisa diset sebelum tabel pertama (dan sebelum WAL)
+            # dibuat: database baru selalu INCREMENTAL agar page hasil expiry
+            # bisa dikembalikan ke OS tanpa VACUUM penuh
+            is_new = cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+            if is_new:
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            
+            # journal_mode persisten di file database, cukup diset sekali
+            mode = cursor.execute(f"PRAGMA journal_mode = {self.profile.journal_mode}").fetchone()[0]
+            if mode.upper() != self.profile.journal_mode:
+                logger.warning(f"journal_mode {self.profile.journal_mode} not applied (got {mode})")
+            
+            # Dedup set: hanya hash key 128-bit di tabel WITHOUT ROWID, sehingga
+            # page index berisi ratusan key (tidak tercampur payload) dan lookup
+            # duplikasi tetap muat di page cache
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS dedup_keys (
+                    key_hash BLOB PRIMARY KEY
+                ) WITHOUT ROWID
+            """)
+            
+            # Log event append-only untuk /events dan export (tanpa index dedup)
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS processed_events (
+                CREATE TABLE IF NOT EXISTS event_log (
+                    id INTEGER PRIMARY KEY,
                     topic TEXT NOT NULL,
                     event_id TEXT NOT NULL,
                     timestamp TEXT NOT NULL,
                     source TEXT NOT NULL,
                     payload TEXT,
                     processed_at TEXT NOT NULL,
-                    PRIMARY KEY (topic, event_id)
+                    event_ts REAL
                 )
             """)
             
-            # Index untuk query cepat
+            # Database lama: pindahkan processed_events ke layout baru
+            has_legacy = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'processed_events'"
+            ).fetchone()
+            if has_legacy:
+                self._migrate_processed_events(conn)
+            
+            # Index untuk keyset pagination per topic (juga melayani lookup per topic)
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_topic 
-                ON processed_events(topic)
+                CREATE INDEX IF NOT EXISTS idx_topic_processed_at 
+                ON event_log(topic, processed_at, event_id)
             """)
             
+            # Index untuk expiry retention window
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_processed_at 
-                ON processed_events(processed_at)
+                ON event_log(processed_at)
+            """)
+            
+            # Metadata internal (mis. token snapshot Bloom filter)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS dedup_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            
+            # Counter per topic, di-update di transaksi yang sama dengan insert
+            has_topic_stats = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'topic_stats'"
+            ).fetchone()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS topic_stats (
+                    topic TEXT PRIMARY KEY,
+                    event_count INTEGER NOT NULL,
+                    first_processed_at TEXT NOT NULL,
+                    last_processed_at TEXT NOT NULL
+                )
+            """)
+            if not has_topic_stats:
+                # Database lama: bangun counter sekali dari tabel event
+                cursor.execute("""
+                    INSERT INTO topic_stats
+                    SELECT topic, COUNT(*), MIN(processed_at), MAX(processed_at)
+                    FROM event_log
+                    GROUP BY topic
+                """)
+            
+            # Counter lifetime (received/unique/duplicate), di-update per batch
+            has_counters = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dedup_counters'"
+            ).fetchone()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS dedup_counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
             """)
+            if not has_counters:
+                # Database lama: mulai dari jumlah event tersimpan (dari topic_stats, tanpa scan)
+                stored = cursor.execute(
+                    "SELECT COALESCE(SUM(event_count), 0) FROM topic_stats"
+                ).fetchone()[0]
+                cursor.executemany(
+                    "INSERT INTO dedup_counters (name, value) VALUES (?, ?)",
+                    [("received", stored), ("unique_processed", stored), ("duplicate_dropped", 0)]
+                )
             
             conn.commit()
+            
+            # Payload di segment log: buka log sampai posisi yang tercatat commit
+            committed = self._get_meta("event_log_end")
+            if self.segment_log is not None:
+                self._open_segment_log(conn, committed)
+            elif committed:
+                logger.warning(
+                    f"Event payloads were previously stored in a segment log (end {committed}); "
+                    "start with the same event_log_dir to read them"
+                )
+            
+            self._topic_stats: Dict[str, TopicStats] = {}
+            self._counters: Dict[str, int] = dict.fromkeys(COUNTER_NAMES, 0)
+            self._counter_deltas: Dict[str, int] = dict.fromkeys(COUNTER_NAMES, 0)
+            self._reload_topic_stats()
+            
+            self._incremental_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            if self.retention.enabled and not self._incremental_vacuum:
+                logger.warning(
+                    "auto_vacuum is not INCREMENTAL: expired pages are reused but the "
+                    "database file will not shrink (set auto_vacuum = INCREMENTAL and VACUUM once)"
+                )
             logger.info("Database schema initialized")
     
-    def is_duplicate(self, event: Event) -> bool:
+    def _migrate_processed_events(self, conn: sqlite3.Connection):
+        """
+        Migrasi tabel processed_events (key + payload dalam satu tabel) ke
+        dedup_keys + event_log dalam satu transaksi
+        
+        Jika proses berhenti di tengah migrasi, transaksi di-rollback dan
+        migrasi diulang dari awal saat start berikutnya.
+        """
+        started = time.perf_counter()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(processed_events)")}
+        # Database versi awal belum punya kolom event_ts
+        event_ts = "event_ts" if "event_ts" in columns else "parse_event_ts(timestamp)"
+        conn.create_function("parse_event_ts", 1, parse_event_ts, deterministic=True)
+        conn.create_function("dedup_key_hash", 2, dedup_key_hash, deterministic=True)
+        
+        conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                INSERT INTO event_log
+                (topic, event_id, timestamp, source, payload, processed_at, event_ts)
+                SELECT topic, event_id, timestamp, source, payload, processed_at, {event_ts}
+                FROM processed_events
+                ORDER BY processed_at
+            """)
+            conn.execute("""
+                INSERT OR IGNORE INTO dedup_keys (key_hash)
+                SELECT dedup_key_hash(topic, event_id) FROM processed_events
+            """)
+            migrated = conn.execute("SELECT changes()").fetchone()[0]
+            conn.execute("DROP TABLE processed_events")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        
+        logger.info(
+            f"Migrated processed_events to dedup_keys + event_log: {migrated} keys "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+    
+    def _open_segment_log(self, conn: sqlite3.Connection, committed: Optional[str]):
+        """
+        Buka SegmentLog, pindahkan row event_log (backend SQLite) ke log dan
+        samakan topic_stats dengan isi log (dipanggil dengan lock writer)
+        
+        Args:
+            conn: Koneksi writer
+            committed: Posisi akhir log yang tercatat di transaksi terakhir
+        """
+        log = self.segment_log
+        log.open(committed)
+        
+        if conn.execute("SELECT 1 FROM event_log LIMIT 1").fetchone():
+            started = time.perf_counter()
+            cursor = conn.execute("""
+                SELECT topic, event_id, timestamp, source, payload, processed_at, event_ts
+                FROM event_log
+                ORDER BY processed_at, event_id
+            """)
+            moved = 0
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                log.append([
+                    (
+                        processed_at,
+                        event_ts,
+                        EventRecord(topic, event_id, timestamp, source, payload_json=payload or "{}")
+                    )
+                    for topic, event_id, timestamp, source, payload, processed_at, event_ts in rows
+                ])
+                moved += len(rows)
+            log.sync(force=True)
+            try:
+                with conn:
+                    conn.execute("DELETE FROM event_log")
+                    self._write_log_end(conn)
+            except BaseException:
+                log.rollback()
+                raise
+            log.publish()
+            logger.info(
+                f"Moved {moved} events from event_log to the segment log "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        
+        # Counter topic mengikuti payload yang benar-benar ada di log
+        summary = log.topic_summary()
+        with conn:
+            conn.execute("DELETE FROM topic_stats")
+            conn.executemany(
+                "INSERT INTO topic_stats VALUES (?, ?, ?, ?)",
+                [(topic, *values) for topic, values in summary.items()]
+            )
+            self._write_log_end(conn)
+    
+    def _write_log_end(self, conn: sqlite3.Connection):
+        """Catat posisi akhir segment log di transaksi yang sedang berjalan"""
+        conn.execute(
+            "INSERT OR REPLACE INTO dedup_meta (key, value) VALUES ('event_log_end', ?)",
+            (self.segment_log.end,)
+        )
+    
+    def _get_meta(self, key: str) -> Optional[str]:
+        """Baca nilai dari tabel dedup_meta (dipanggil dengan lock writer)"""
+        row = self._writer.execute("SELECT value FROM dedup_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def _set_meta(self, key: str, value: str):
+        """Tulis nilai ke tabel dedup_meta (dipanggil dengan lock writer)"""
+        with self._writer as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO dedup_meta (key, value) VALUES (?, ?)", (key, value)
+            )
+    
+    def _load_bloom(self, capacity: int, fp_rate: float) -> BloomFilter:
+        """
+        Load Bloom filter dari snapshot, atau rebuild dari tabel dedup_keys
+        
+        Filter di-key dengan dedup_key_hash dan di-rebuild dari dedup_keys
+        (bukan event log), jadi filter dan UNIQUE index selalu menggambarkan
+        himpunan key yang sama, apapun backend event log-nya. Snapshot hanya dipakai jika tokennya sama dengan token yang dicatat di
+        database saat close terakhir. Setelah load, token di database langsung
+        dihapus sehingga crash sebelum close berikutnya memaksa rebuild penuh
+        (insert setelah titik ini tidak ada di snapshot).
+        
+        Args:
+            capacity: Expected cardinality
+            fp_rate: Target false-positive rate
+            
+        Returns:
+            BloomFilter yang berisi semua key di store
+        """
+        with self.lock:
+            expected_token = self._get_meta(_BLOOM_SNAPSHOT_META)
+            loaded = BloomFilter.load(self.bloom_path)
+            bloom = None
+            
+            if loaded is not None and expected_token:
+                snapshot, token = loaded
+                if (token.hex() == expected_token
+                        and snapshot.capacity == capacity and snapshot.fp_rate == fp_rate):
+                    bloom = snapshot
+                    logger.info(f"Bloom filter loaded from snapshot ({bloom.count} keys)")
+            
+            # Snapshot di disk tidak lagi valid sampai close berikutnya
+            self._set_meta(_BLOOM_SNAPSHOT_META, "")
+            
+            if bloom is None:
+                bloom = BloomFilter(capacity, fp_rate)
+                cursor = self._writer.execute("SELECT key_hash FROM dedup_keys")
+                while True:
+                    rows = cursor.fetchmany(10000)
+                    if not rows:
+                        break
+                    for (key_hash,) in rows:
+                        bloom.add(key_hash)
+                logger.info(f"Bloom filter rebuilt from dedup_keys scan ({bloom.count} keys)")
+            
+            return bloom
+    
+    def _save_bloom(self):
+        """Simpan snapshot Bloom filter dan catat tokennya (dipanggil dengan lock writer)"""
+        token = os.urandom(16)
+        try:
+            self.bloom.save(self.bloom_path, token)
+        except OSError as e:
+            logger.error(f"Failed to save Bloom filter snapshot: {e}")
+            return
+        self._set_meta(_BLOOM_SNAPSHOT_META, token.hex())
+        logger.info(f"Bloom filter snapshot saved ({self.bloom.count} keys)")
+    
+    def filter_stats(self) -> dict:
+        """
+        Statistik Bloom filter
+        
+        Returns:
+            Dict dengan fill_ratio dan measured_fp_rate (false positive /
+            semua lookup key yang ternyata belum ada)
+        """
+        if self.bloom is None:
+            return {"fill_ratio": 0.0, "measured_fp_rate": 0.0}
+        
+        with self.lock:
+            negatives, false_positives = self.bloom_negatives, self.bloom_false_positives
+        absent_lookups = negatives + false_positives
+        fp_rate = false_positives / absent_lookups if absent_lookups else 0.0
+        return {
+            "fill_ratio": round(self.bloom.fill_ratio(), 4),
+            "measured_fp_rate": round(fp_rate, 4)
+        }
+    
+    def is_duplicate(self, event: EventLike) -> bool:
         """
         Check apakah event sudah pernah diproses (duplikasi)
         
@@ -83,130 +685,1034 @@ class DedupStore:
         Returns:
             True jika event adalah duplikasi, False jika unik
         """
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT 1 FROM processed_events WHERE topic = ? AND event_id = ?",
-                    (event.topic, event.event_id)
-                )
-                result = cursor.fetchone()
-                
-                is_dup = result is not None
-                if is_dup:
-                    logger.info(f"Duplicate detected: {event.get_dedup_key()}")
-                
-                return is_dup
+        key = EventRecord.from_event(event).key
+        
+        # Hot path: retry yang baru saja diproses
+        if self.key_cache is not None and self.key_cache.contains(key):
+            logger.info(f"Duplicate detected (cached): {event.get_dedup_key()}")
+            return True
+        
+        # Definite miss dari Bloom filter: tidak perlu lookup SQLite
+        key_hash = dedup_key_hash(*key)
+        if self.bloom is not None and not self.bloom.might_contain(key_hash):
+            with self.lock:
+                self.bloom_negatives += 1
+            return False
+        
+        with self._reader() as conn:
+            cursor = conn.execute(
+                "SELECT 1 FROM dedup_keys WHERE key_hash = ?",
+                (key_hash,)
+            )
+            result = cursor.fetchone()
+            cursor.close()
+        
+        is_dup = result is not None
+        if not is_dup and self.bloom is not None:
+            with self.lock:
+                self.bloom_false_positives += 1
+        if is_dup:
+            if self.key_cache is not None:
+                self.key_cache.add(key)
+            logger.info(f"Duplicate detected: {event.get_dedup_key()}")
+        
+        return is_dup
     
-    def mark_processed(self, event: Event) -> bool:
+    def claim(self, event: EventLike) -> bool:
         """
-        Mark event sebagai sudah diproses
+        Claim event secara atomik (insert-if-absent)
         
         Args:
-            event: Event object yang sudah diproses
+            event: Event object
             
         Returns:
-            True jika berhasil disimpan, False jika duplikasi (sudah ada)
+            True jika event baru (berhasil di-claim), False jika duplikasi
         """
+        return self.claim_many([event])[0]
+    
+    def claim_many(self, events: List[EventLike]) -> List[bool]:
+        """
+        Claim batch event secara atomik dalam satu transaksi (group commit)
+        
+        Operasi insert-if-absent tunggal: cek duplikasi dan penyimpanan key
+        terjadi di statement yang sama (INSERT OR IGNORE ke dedup_keys) di
+        bawah lock writer, jadi tidak ada race window antara "check" dan
+        "mark"; hanya event yang key-nya baru ditulis ke event_log. Hanya ada satu commit
+        (satu fsync) per batch; event dianggap processed (durable) setelah
+        transaksi batch ini commit. Key yang ada di key cache langsung dianggap
+        duplikasi tanpa menyentuh SQLite. Jika Bloom filter aktif, key yang
+        definite miss di-insert sekaligus (executemany) tanpa cek rowcount per
+        key; hanya key yang "mungkin ada" yang melewati INSERT OR IGNORE per
+        key. Jika jumlah row yang masuk tidak cocok (filter tidak sinkron),
+        jalur definite miss diulang per key, jadi filter yang salah tidak
+        pernah menggagalkan batch.
+        Counter per topic dan counter lifetime (dedup_counters) di-update di
+        transaksi yang sama.
+        
+        Args:
+            events: List of Event/EventRecord objects
+            
+        Returns:
+            List of bool sejajar dengan input: True jika event baru di-insert,
+            False jika sudah ada (termasuk duplikasi di dalam batch yang sama)
+            
+        Raises:
+            RuntimeError: Jika store sudah di-close
+        """
+        if not events:
+            return []
+        
+        records = [EventRecord.from_event(event) for event in events]
         with self.lock:
+            if self._closed:
+                raise RuntimeError("DedupStore is closed")
+            conn = self._writer
+            processed_at = datetime.utcnow().isoformat()
+            if self.segment_log is not None:
+                processed_at = self.segment_log.next_processed_at(processed_at)
+            inserted = [False] * len(records)
+            
+            pending = [
+                (i, record) for i, record in enumerate(records)
+                if self.key_cache is None or not self.key_cache.contains(record.key)
+            ]
+            if not pending:
+                # Semua duplikasi dari cache: tanpa transaksi, counter ditunda
+                # sampai transaksi batch berikutnya (atau close)
+                with self._stats_lock:
+                    self._counter_deltas["received"] += len(records)
+                    self._counter_deltas["duplicate_dropped"] += len(records)
+                return inserted
+            
+            # Bloom filter: definite miss berarti key pasti belum ada. Key
+            # ditambahkan ke filter sebelum commit agar tidak ada window di mana
+            # key sudah ada di store tapi filter bilang miss; duplikasi di dalam
+            # batch yang sama otomatis jatuh ke jalur "mungkin ada".
+            absent = []
+            maybe = pending
+            if self.bloom is not None:
+                maybe = []
+                for i, record in pending:
+                    key_hash = dedup_key_hash(*record.key)
+                    if self.bloom.might_contain(key_hash):
+                        maybe.append((i, record))
+                    else:
+                        absent.append((i, record))
+                    self.bloom.add(key_hash)
+            
+            false_positives = false_negatives = 0
             try:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    processed_at = datetime.utcnow().isoformat()
+                with conn:
+                    if absent:
+                        false_negatives = self._insert_absent_keys(conn, absent, inserted)
+                    for i, record in maybe:
+                        cursor = conn.execute(
+                            "INSERT OR IGNORE INTO dedup_keys (key_hash) VALUES (?)",
+                            (dedup_key_hash(*record.key),)
+                        )
+                        if cursor.rowcount == 1:
+                            inserted[i] = True
+                            false_positives += 1
+                    
+                    new_records = [record for i, record in pending if inserted[i]]
+                    new_per_topic: Dict[str, int] = {}
+                    for record in new_records:
+                        new_per_topic[record.topic] = new_per_topic.get(record.topic, 0) + 1
                     
-                    cursor.execute("""
-                        INSERT INTO processed_events 
-                        (topic, event_id, timestamp, source, payload, processed_at)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        event.topic,
-                        event.event_id,
-                        event.timestamp,
-                        event.source,
-                        json.dumps(event.payload),
-                        processed_at
-                    ))
+                    # Hanya event baru yang masuk log (append-only); index per
+                    # topic di segment log mengandalkan urutan (processed_at, event_id)
+                    if self.segment_log is not None:
+                        new_records.sort(key=lambda record: record.event_id)
+                    self._append_events(conn, [
+                        (processed_at, parse_event_ts(record.timestamp), record)
+                        for record in new_records
+                    ])
                     
-                    conn.commit()
-                    logger.debug(f"Event marked as processed: {event.get_dedup_key()}")
-                    return True
+                    # Counter per topic ikut commit/rollback bersama insert
+                    conn.executemany("""
+                        INSERT INTO topic_stats
+                        (topic, event_count, first_processed_at, last_processed_at)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(topic) DO UPDATE SET
+                            event_count = event_count + excluded.event_count,
+                            last_processed_at = excluded.last_processed_at
+                    """, [
+                        (topic, count, processed_at, processed_at)
+                        for topic, count in new_per_topic.items()
+                    ])
                     
-            except sqlite3.IntegrityError:
-                # Duplikasi (PRIMARY KEY constraint violated)
-                logger.warning(f"Attempted to mark duplicate event: {event.get_dedup_key()}")
-                return False
+                    batch_counts = self._batch_counts(len(records), sum(new_per_topic.values()))
+                    self._write_counter_deltas(conn, batch_counts)
+            except BaseException:
+                if self.segment_log is not None:
+                    self.segment_log.rollback()
+                raise
+            
+            if self.segment_log is not None:
+                self.segment_log.publish()
+            self._apply_topic_counts(new_per_topic, processed_at)
+            self._commit_counter_deltas(batch_counts)
+            if self.bloom is not None:
+                self.bloom_negatives += len(absent) - false_negatives
+                self.bloom_false_positives += false_positives
+                self.bloom_false_negatives += false_negatives
+            
+            # Setelah commit semua key di batch pasti ada di store
+            if self.key_cache is not None:
+                self.key_cache.add_many(record.key for _, record in pending)
+            
+            self._maybe_checkpoint()
+            return inserted
     
-    def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[Event]:
+    def _insert_absent_keys(
+        self, conn: sqlite3.Connection, absent: List[Tuple[int, EventRecord]], inserted: List[bool]
+    ) -> int:
         """
-        Ambil semua event yang sudah diproses untuk topic tertentu
+        Insert key yang definite miss menurut Bloom filter (dipanggil dengan lock writer)
+        
+        Satu executemany INSERT OR IGNORE; rowcount total dibandingkan dengan
+        jumlah key. Jika ada key yang ternyata sudah ada, savepoint di-rollback
+        dan key di-insert ulang per key agar yang sudah ada tetap duplikasi.
         
         Args:
-            topic: Nama topic
-            limit: Maksimal jumlah event yang dikembalikan
+            conn: Koneksi writer di dalam transaksi batch
+            absent: Pasangan (index input, record) yang definite miss
+            inserted: Flag hasil claim, di-set True untuk key yang baru
             
         Returns:
-            List of Event objects
+            Jumlah Bloom false negative (key yang sudah ada di dedup_keys)
+        """
+        conn.execute("SAVEPOINT bloom_absent")
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO dedup_keys (key_hash) VALUES (?)",
+            [(dedup_key_hash(*record.key),) for _, record in absent]
+        )
+        if cursor.rowcount == len(absent):
+            conn.execute("RELEASE bloom_absent")
+            for i, _ in absent:
+                inserted[i] = True
+            return 0
+        
+        conn.execute("ROLLBACK TO bloom_absent")
+        conn.execute("RELEASE bloom_absent")
+        false_negatives = 0
+        for i, record in absent:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO dedup_keys (key_hash) VALUES (?)",
+                (dedup_key_hash(*record.key),)
+            )
+            if cursor.rowcount == 1:
+                inserted[i] = True
+            else:
+                false_negatives += 1
+        logger.warning(f"Bloom filter false negatives in batch: {false_negatives} keys already stored")
+        return false_negatives
+    
+    def _append_events(self, conn: sqlite3.Connection, entries: List[LogEntry]):
+        """
+        Tulis event baru ke log di transaksi claim yang sedang berjalan
+
+        Dengan segment log, record di-append dan di-fsync sebelum transaksi
+        key commit, dan posisi akhir log dicatat di transaksi yang sama
+        sehingga record tanpa key yang ter-commit dibuang saat recovery.
+
+        Args:
+            conn: Koneksi writer (di dalam transaksi)
+            entries: List (processed_at, event_ts, record); untuk segment log
+                urut (processed_at, event_id) per topic
+        """
+        if self.segment_log is None:
+            conn.executemany("""
+                INSERT INTO event_log
+                (topic, event_id, timestamp, source, payload, processed_at, event_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    record.topic,
+                    record.event_id,
+                    record.timestamp,
+                    record.source,
+                    record.payload_json,
+                    processed_at,
+                    event_ts
+                )
+                for processed_at, event_ts, record in entries
+            ])
+            return
+
+        if not entries:
+            return
+        self.segment_log.append(entries)
+        self.segment_log.sync()
+        self._write_log_end(conn)
+
+    def import_events(self, entries: List[LogEntry]) -> int:
+        """
+        Masukkan event dengan processed_at aslinya (reshard/restore offline)
+
+        Berbeda dengan claim_many, processed_at tidak diganti waktu sekarang,
+        sehingga urutan /events dan umur retention tetap sama. Key yang sudah
+        ada dilewati. Counter lifetime tidak berubah (lihat add_counters).
+
+        Args:
+            entries: List (processed_at, event_ts, record), urut (processed_at,
+                event_id) dan lebih baru dari isi store (syarat segment log)
+
+        Returns:
+            Jumlah event yang di-insert
         """
         with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT topic, event_id, timestamp, source, payload
-                    FROM processed_events
-                    WHERE topic = ?
-                    ORDER BY processed_at DESC
-                    LIMIT ?
-                """, (topic, limit))
-                
-                events = []
-                for row in cursor.fetchall():
-                    try:
-                        event = Event(
-                            topic=row[0],
-                            event_id=row[1],
-                            timestamp=row[2],
-                            source=row[3],
-                            payload=json.loads(row[4]) if row[4] else {}
+            if self._closed:
+                raise RuntimeError("DedupStore is closed")
+            conn = self._writer
+            new_entries: List[LogEntry] = []
+            topic_ranges: Dict[str, List] = {}
+            try:
+                with conn:
+                    for entry in entries:
+                        processed_at, _, record = entry
+                        cursor = conn.execute(
+                            "INSERT OR IGNORE INTO dedup_keys (key_hash) VALUES (?)",
+                            (dedup_key_hash(*record.key),)
                         )
-                        events.append(event)
-                    except Exception as e:
-                        logger.error(f"Failed to parse event from DB: {e}")
+                        if cursor.rowcount != 1:
+                            continue
+                        new_entries.append(entry)
+                        current = topic_ranges.get(record.topic)
+                        if current is None:
+                            topic_ranges[record.topic] = [1, processed_at, processed_at]
+                        else:
+                            current[0] += 1
+                            current[1] = min(current[1], processed_at)
+                            current[2] = max(current[2], processed_at)
+
+                    self._append_events(conn, new_entries)
+                    conn.executemany("""
+                        INSERT INTO topic_stats
+                        (topic, event_count, first_processed_at, last_processed_at)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(topic) DO UPDATE SET
+                            event_count = event_count + excluded.event_count,
+                            first_processed_at = MIN(first_processed_at, excluded.first_processed_at),
+                            last_processed_at = MAX(last_processed_at, excluded.last_processed_at)
+                    """, [(topic, *values) for topic, values in topic_ranges.items()])
+            except BaseException:
+                if self.segment_log is not None:
+                    self.segment_log.rollback()
+                raise
+
+            if self.segment_log is not None:
+                self.segment_log.publish()
+            if self.bloom is not None:
+                for _, _, record in new_entries:
+                    self.bloom.add(dedup_key_hash(*record.key))
+            self._reload_topic_stats()
+            return len(new_entries)
+
+    def iter_events(self, batch_size: int = 10000) -> Iterator[LogEntry]:
+        """
+        Iterasi semua event tersimpan urut (processed_at, event_id)
+
+        Dipakai tool reshard; dengan backend SQLite satu koneksi reader
+        dipegang sampai iterasi selesai.
+
+        Args:
+            batch_size: Row per fetch dari SQLite
+
+        Yields:
+            Tuple (processed_at, event_ts, record)
+        """
+        if self.segment_log is not None:
+            # Urutan append segment log sudah urut (processed_at, event_id)
+            yield from self.segment_log.iter_entries()
+            return
+        with self._reader() as conn:
+            cursor = conn.execute("""
+                SELECT topic, event_id, timestamp, source, payload, processed_at, event_ts
+                FROM event_log
+                ORDER BY processed_at, event_id
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for topic, event_id, timestamp, source, payload, processed_at, event_ts in rows:
+                    yield (
+                        processed_at,
+                        event_ts,
+                        EventRecord(topic, event_id, timestamp, source, payload_json=payload or "{}")
+                    )
+
+    def add_counters(self, deltas: Dict[str, int]):
+        """
+        Tambahkan nilai ke counter lifetime (mis. total dari store asal saat reshard)
+
+        Args:
+            deltas: Dict nama counter -> nilai yang ditambahkan
+        """
+        with self.lock:
+            with self._writer as conn:
+                self._write_counter_deltas(conn, deltas)
+            self._commit_counter_deltas(deltas)
+    
+    def mark_processed(self, event: EventLike) -> bool:
+        """
+        Mark event sebagai sudah diproses (alias claim dengan logging)
+        
+        Args:
+            event: Event object yang sudah diproses
+            
+        Returns:
+            True jika berhasil disimpan, False jika duplikasi (sudah ada)
+        """
+        inserted = self.claim(event)
+        if inserted:
+            logger.debug(f"Event marked as processed: {event.get_dedup_key()}")
+        else:
+            logger.warning(f"Attempted to mark duplicate event: {event.get_dedup_key()}")
+        return inserted
+    
+    def mark_processed_many(self, events: List[EventLike]) -> List[bool]:
+        """
+        Mark batch event sebagai sudah diproses (alias claim_many)
+        
+        Args:
+            events: List of Event objects yang sudah diproses
+            
+        Returns:
+            List of bool sejajar dengan input, lihat claim_many
+        """
+        return self.claim_many(events)
+    
+    def _maybe_checkpoint(self):
+        """Jalankan WAL checkpoint jika interval sudah lewat (dipanggil dengan lock writer)"""
+        interval = self.profile.wal_checkpoint_interval
+        if self.profile.journal_mode != "WAL" or interval <= 0:
+            return
+        
+        now = time.monotonic()
+        if now - self._last_checkpoint >= interval:
+            self._last_checkpoint = now
+            self._checkpoint("PASSIVE")
+    
+    def _checkpoint(self, mode: str):
+        """Eksekusi PRAGMA wal_checkpoint pada koneksi writer"""
+        busy, log_frames, checkpointed = self._writer.execute(
+            f"PRAGMA wal_checkpoint({mode})"
+        ).fetchone()
+        logger.debug(
+            f"WAL checkpoint ({mode}): {checkpointed}/{log_frames} frames, busy={busy}"
+        )
+    
+    def checkpoint(self, mode: Literal["PASSIVE", "FULL", "RESTART", "TRUNCATE"] = "PASSIVE"):
+        """
+        Jalankan WAL checkpoint secara manual
+        
+        Args:
+            mode: Mode checkpoint SQLite
+        """
+        if self.profile.journal_mode != "WAL":
+            return
+        with self.lock:
+            self._last_checkpoint = time.monotonic()
+            self._checkpoint(mode)
+    
+    def _expiry_cutoffs(self, now: datetime) -> Tuple[Optional[str], Dict[str, Optional[str]]]:
+        """
+        Hitung batas processed_at untuk expiry
+        
+        Returns:
+            Tuple (cutoff global atau None, dict topic override -> cutoff atau None)
+        """
+        def cutoff(seconds: float) -> Optional[str]:
+            return (now - timedelta(seconds=seconds)).isoformat() if seconds > 0 else None
+        
+        overrides = {
+            topic: cutoff(seconds) for topic, seconds in self.retention.topic_retention.items()
+        }
+        return cutoff(self.retention.retention_seconds), overrides
+    
+    def expire_batch(self, now: Optional[datetime] = None) -> int:
+        """
+        Hapus satu batch event yang sudah lewat retention window
+        
+        Satu transaksi pendek berisi paling banyak retention.batch_size event,
+        sehingga lock writer hanya ditahan sebentar dan claim_many bisa
+        berjalan di antara batch. Event dipilih urut processed_at lewat index
+        idx_processed_at (window global) atau idx_topic_processed_at (override
+        per topic). Counter per topic, key cache dan metrik ikut di-update;
+        Bloom filter tidak bisa menghapus key, jadi key yang expired hanya
+        menjadi false positive yang dijawab SQLite.
+        
+        Args:
+            now: Waktu acuan (default: sekarang, UTC)
+            
+        Returns:
+            Jumlah event yang dihapus (< batch_size berarti sudah habis)
+        """
+        if not self.retention.enabled:
+            return 0
+        if self.segment_log is not None:
+            return self._expire_segment_batch(now or datetime.utcnow())
+        
+        global_cutoff, overrides = self._expiry_cutoffs(now or datetime.utcnow())
+        with self.lock:
+            if self._closed:
+                return 0
+            started = time.perf_counter()
+            conn = self._writer
+            remaining = self.retention.batch_size
+            rows = []
+            
+            with conn:
+                for topic, cutoff in overrides.items():
+                    if cutoff is None or remaining <= 0:
+                        continue
+                    found = conn.execute(
+                        """
+                        SELECT id, topic, event_id FROM event_log
+                        WHERE topic = ? AND processed_at < ?
+                        ORDER BY processed_at LIMIT ?
+                        """,
+                        (topic, cutoff, remaining)
+                    ).fetchall()
+                    rows.extend(found)
+                    remaining -= len(found)
                 
-                return events
+                if global_cutoff is not None and remaining > 0:
+                    excluded = list(overrides)
+                    placeholders = ",".join("?" * len(excluded))
+                    rows.extend(conn.execute(
+                        f"""
+                        SELECT id, topic, event_id FROM event_log
+                        WHERE processed_at < ? AND topic NOT IN ({placeholders})
+                        ORDER BY processed_at LIMIT ?
+                        """,
+                        (global_cutoff, *excluded, remaining)
+                    ).fetchall())
+                
+                if not rows:
+                    self.compaction_seconds += time.perf_counter() - started
+                    return 0
+                
+                conn.executemany(
+                    "DELETE FROM event_log WHERE id = ?", [(row[0],) for row in rows]
+                )
+                conn.executemany(
+                    "DELETE FROM dedup_keys WHERE key_hash = ?",
+                    [(dedup_key_hash(topic, event_id),) for _, topic, event_id in rows]
+                )
+                
+                expired_per_topic: Dict[str, int] = {}
+                for _, topic, _ in rows:
+                    expired_per_topic[topic] = expired_per_topic.get(topic, 0) + 1
+                conn.executemany(
+                    """
+                    UPDATE topic_stats SET
+                        event_count = event_count - ?,
+                        first_processed_at = COALESCE(
+                            (SELECT MIN(processed_at) FROM event_log WHERE topic = ?),
+                            first_processed_at
+                        )
+                    WHERE topic = ?
+                    """,
+                    [(count, topic, topic) for topic, count in expired_per_topic.items()]
+                )
+                conn.execute("DELETE FROM topic_stats WHERE event_count <= 0")
+                placeholders = ",".join("?" * len(expired_per_topic))
+                updated = conn.execute(
+                    f"SELECT * FROM topic_stats WHERE topic IN ({placeholders})",
+                    list(expired_per_topic)
+                ).fetchall()
+            
+            self._replace_topic_stats(list(expired_per_topic), updated)
+            if self.key_cache is not None:
+                for _, topic, event_id in rows:
+                    self.key_cache.discard((topic, event_id))
+            
+            elapsed = time.perf_counter() - started
+            self.expired_events += len(rows)
+            self.compaction_seconds += elapsed
+            logger.debug(f"Expired {len(rows)} events in {elapsed * 1000:.1f} ms")
+            return len(rows)
+    
+    def _expire_segment_batch(self, now: datetime) -> int:
+        """
+        expire_batch untuk segment log
+        
+        Retention berlaku per segment: segment tertua yang seluruh event-nya
+        lewat window dilepas dari index (langsung tidak terlihat di /events),
+        lalu key-nya dihapus dari dedup_keys per batch dan file segment dihapus
+        setelah key terakhirnya di-commit. Crash di tengah proses aman: segment
+        yang filenya masih ada di-index ulang saat open dan di-expire lagi.
+        
+        Args:
+            now: Waktu acuan (UTC)
+            
+        Returns:
+            Jumlah key yang dihapus
+        """
+        cutoff, _ = self._expiry_cutoffs(now)
+        log = self.segment_log
+        with self.lock:
+            if self._closed:
+                return 0
+            started = time.perf_counter()
+            conn = self._writer
+            keys: List[Tuple[str, str]] = []
+            detached_topics: Set[str] = set()
+            finished: List[int] = []
+            
+            while len(keys) < self.retention.batch_size:
+                if self._expiring is None:
+                    found = log.detach_expired(cutoff)
+                    if found is None:
+                        break
+                    base, counts = found
+                    detached_topics.update(counts)
+                    self._expiring = (base, 0)
+                base, offset = self._expiring
+                batch, offset = log.segment_keys(base, offset, self.retention.batch_size - len(keys))
+                keys.extend(batch)
+                if offset is None:
+                    finished.append(base)
+                    self._expiring = None
+                else:
+                    self._expiring = (base, offset)
+            
+            if not keys and not finished:
+                self.compaction_seconds += time.perf_counter() - started
+                return 0
+            
+            summary = log.topic_summary(detached_topics)
+            with conn:
+                conn.executemany(
+                    "DELETE FROM dedup_keys WHERE key_hash = ?",
+                    [(dedup_key_hash(topic, event_id),) for topic, event_id in keys]
+                )
+                conn.executemany(
+                    "DELETE FROM topic_stats WHERE topic = ?", [(topic,) for topic in detached_topics]
+                )
+                conn.executemany(
+                    "INSERT INTO topic_stats VALUES (?, ?, ?, ?)",
+                    [(topic, *values) for topic, values in summary.items()]
+                )
+            
+            self._replace_topic_stats(
+                list(detached_topics), [(topic, *values) for topic, values in summary.items()]
+            )
+            for base in finished:
+                log.remove_segment(base)
+            if self.key_cache is not None:
+                for key in keys:
+                    self.key_cache.discard(key)
+            
+            elapsed = time.perf_counter() - started
+            self.expired_events += len(keys)
+            self.compaction_seconds += elapsed
+            logger.debug(
+                f"Expired {len(keys)} events ({len(finished)} segment(s) removed) "
+                f"in {elapsed * 1000:.1f} ms"
+            )
+            return len(keys)
+    
+    def vacuum_step(self, pages: Optional[int] = None) -> int:
+        """
+        Kembalikan page kosong (hasil expiry) ke OS dengan PRAGMA incremental_vacuum
+        
+        Hanya berlaku untuk database dengan auto_vacuum = INCREMENTAL.
+        
+        Args:
+            pages: Maksimal page yang dibebaskan (default: retention.vacuum_pages)
+            
+        Returns:
+            Jumlah page yang dibebaskan
+        """
+        pages = self.retention.vacuum_pages if pages is None else pages
+        if not self._incremental_vacuum or pages <= 0:
+            return 0
+        with self.lock:
+            if self._closed:
+                return 0
+            started = time.perf_counter()
+            conn = self._writer
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if before:
+                # execute() hanya men-step pragma sekali (satu page); executescript
+                # menjalankannya sampai selesai
+                conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            freed = before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            self.vacuumed_pages += freed
+            self.compaction_seconds += time.perf_counter() - started
+            return freed
+    
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """
+        Jalankan satu putaran compaction: expire semua event lama per batch
+        lalu incremental vacuum
+        
+        Lock writer dilepas di antara batch. Dari event loop gunakan
+        AsyncDedupStore.compact supaya claim bisa diselipkan di antara batch.
+        
+        Args:
+            now: Waktu acuan (default: sekarang, UTC)
+            
+        Returns:
+            Total event yang dihapus
+        """
+        total = 0
+        while True:
+            expired = self.expire_batch(now)
+            total += expired
+            if expired < self.retention.batch_size:
+                break
+        self.vacuum_step()
+        return total
+    
+    def retention_stats(self) -> dict:
+        """
+        Metrik compaction
+        
+        Returns:
+            Dict dengan expired_events, vacuumed_pages dan compaction_seconds
+            (total waktu lock writer ditahan untuk expiry dan vacuum)
+        """
+        return {
+            "expired_events": self.expired_events,
+            "vacuumed_pages": self.vacuumed_pages,
+            "compaction_seconds": round(self.compaction_seconds, 4)
+        }
+    
+    def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[EventRecord]:
+        """
+        Ambil event terbaru yang sudah diproses untuk topic tertentu
+        
+        Args:
+            topic: Nama topic
+            limit: Maksimal jumlah event yang dikembalikan
+            
+        Returns:
+            List of EventRecord objects (halaman pertama get_events_page)
+        """
+        return self.get_events_page(topic, limit)[0]
+    
+    def get_events_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[EventRecord], Optional[str]]:
+        """
+        Ambil satu halaman event untuk topic dengan keyset pagination
+        
+        Urutan processed_at DESC, event_id DESC dilayani langsung oleh index
+        (topic, processed_at, event_id), dan halaman berikutnya dimulai dari
+        posisi cursor (bukan OFFSET), sehingga halaman dalam sama murahnya
+        dengan halaman pertama. Row dikembalikan sebagai EventRecord apa adanya
+        (payload tetap JSON string), tanpa validasi ulang model Event.
+        
+        Args:
+            topic: Nama topic
+            limit: Maksimal jumlah event per halaman
+            cursor: Cursor dari halaman sebelumnya (None = halaman pertama)
+            since: Filter timestamp event >= since (epoch seconds)
+            until: Filter timestamp event < until (epoch seconds)
+            
+        Returns:
+            Tuple (list of EventRecord, cursor halaman berikutnya atau None)
+            
+        Raises:
+            ValueError: Jika cursor tidak valid
+        """
+        if self.segment_log is not None:
+            return self._read_segment_log(self.segment_log.read, topic, limit, cursor, since, until)
+
+        before = decode_cursor(cursor) if cursor is not None else None
+        rows = self._select_event_log(topic, limit, before, since, until)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][5], rows[-1][1])
+
+        records = [
+            EventRecord(row[0], row[1], row[2], row[3], payload_json=row[4] or "{}")
+            for row in rows
+        ]
+        return records, next_cursor
+
+    def _select_event_log(
+        self,
+        topic: str,
+        limit: int,
+        before: Optional[Tuple[str, str]],
+        since: Optional[float],
+        until: Optional[float]
+    ) -> List[tuple]:
+        """
+        Query satu halaman event_log (limit + 1 row, terbaru dulu)
+
+        Returns:
+            Row (topic, event_id, timestamp, source, payload, processed_at)
+        """
+        conditions = ["topic = ?"]
+        params: list = [topic]
+        if before is not None:
+            conditions.append("(processed_at, event_id) < (?, ?)")
+            params.extend(before)
+        if since is not None:
+            conditions.append("event_ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("event_ts < ?")
+            params.append(until)
+        params.append(limit + 1)
+
+        with self._reader() as conn:
+            return conn.execute(f"""
+                SELECT topic, event_id, timestamp, source, payload, processed_at
+                FROM event_log
+                WHERE {" AND ".join(conditions)}
+                ORDER BY processed_at DESC, event_id DESC
+                LIMIT ?
+            """, params).fetchall()
+
+    def get_events_keyed(
+        self,
+        topic: str,
+        limit: int,
+        before: Optional[Tuple[str, str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        as_json: bool = False
+    ) -> Tuple[List[Tuple[str, str, Union[EventRecord, bytes, memoryview]]], bool]:
+        """
+        Satu halaman event beserta key keyset tiap event (untuk merge halaman
+        beberapa store, mis. ShardedDedupStore)
+
+        Args:
+            topic: Nama topic
+            limit: Maksimal jumlah event
+            before: Hanya event dengan (processed_at, event_id) < key ini
+            since: Filter timestamp event >= since (epoch seconds)
+            until: Filter timestamp event < until (epoch seconds)
+            as_json: True = event sebagai JSON (seperti get_events_json_page)
+
+        Returns:
+            Tuple (list (processed_at, event_id, event) terbaru dulu, True jika
+            masih ada event setelah halaman ini)
+
+        Raises:
+            ValueError: Jika processed_at di before tidak valid
+        """
+        if self.segment_log is not None:
+            if self._closed:
+                raise RuntimeError("DedupStore is closed")
+            return self.segment_log.read_keyed(topic, limit, before, since, until, as_json)
+
+        rows = self._select_event_log(topic, limit, before, since, until)
+        entries = []
+        for topic, event_id, timestamp, source, payload, processed_at in rows[:limit]:
+            record = EventRecord(topic, event_id, timestamp, source, payload_json=payload or "{}")
+            entries.append((processed_at, event_id, record.to_json().encode() if as_json else record))
+        return entries, len(rows) > limit
+    
+    def get_events_json_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[Union[bytes, memoryview]], Optional[str]]:
+        """
+        Seperti get_events_page, tetapi tiap event sudah berupa JSON
+        
+        Dengan segment log, hasilnya slice mmap apa adanya (tanpa decode dan
+        encode ulang), sehingga export cukup menggabungkan slice ke body.
+        
+        Returns:
+            Tuple (list JSON event, cursor halaman berikutnya atau None)
+            
+        Raises:
+            ValueError: Jika cursor tidak valid
+        """
+        if self.segment_log is not None:
+            return self._read_segment_log(
+                self.segment_log.read_json, topic, limit, cursor, since, until
+            )
+        records, next_cursor = self.get_events_page(topic, limit, cursor, since, until)
+        return [record.to_json().encode() for record in records], next_cursor
+    
+    def _read_segment_log(self, read, topic, limit, cursor, since, until) -> Tuple[list, Optional[str]]:
+        """Baca satu halaman dari segment log (format cursor sama dengan backend SQLite)"""
+        if self._closed:
+            raise RuntimeError("DedupStore is closed")
+        before = decode_cursor(cursor) if cursor is not None else None
+        try:
+            items, last = read(topic, limit, before, since, until)
+        except ValueError as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+        return items, encode_cursor(*last) if last is not None else None
+    
+    def _reload_topic_stats(self):
+        """Load counter topic dan counter lifetime ke memory (dipanggil dengan lock writer)"""
+        rows = self._writer.execute("SELECT * FROM topic_stats").fetchall()
+        counters = dict(self._writer.execute("SELECT name, value FROM dedup_counters").fetchall())
+        # data_version koneksi writer hanya berubah jika koneksi lain commit
+        self._data_version = self._writer.execute("PRAGMA data_version").fetchone()[0]
+        with self._stats_lock:
+            self._topic_stats = {
+                row[0]: TopicStats(
+                    topic=row[0],
+                    count=row[1],
+                    first_processed_at=row[2],
+                    last_processed_at=row[3]
+                )
+                for row in rows
+            }
+            self._counters = {name: counters.get(name, 0) for name in COUNTER_NAMES}
+    
+    def _sync_topic_stats(self):
+        """
+        Reload counter jika ada writer lain (instance/proses lain) yang commit
+        
+        Tidak menunggu lock writer: jika writer store ini sedang aktif, counter
+        in-memory dipakai apa adanya.
+        """
+        if self._closed or not self.lock.acquire(blocking=False):
+            return
+        try:
+            version = self._writer.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._reload_topic_stats()
+        finally:
+            self.lock.release()
+    
+    def _apply_topic_counts(self, new_per_topic: Dict[str, int], processed_at: str):
+        """Update counter topic in-memory setelah transaksi insert commit"""
+        with self._stats_lock:
+            for topic, count in new_per_topic.items():
+                current = self._topic_stats.get(topic)
+                if current is None:
+                    self._topic_stats[topic] = TopicStats(
+                        topic=topic,
+                        count=count,
+                        first_processed_at=processed_at,
+                        last_processed_at=processed_at
+                    )
+                else:
+                    current.count += count
+                    current.last_processed_at = processed_at
+    
+    def _replace_topic_stats(self, topics: List[str], rows: List[tuple]):
+        """Ganti counter in-memory topic dengan baris topic_stats terbaru (setelah expiry)"""
+        with self._stats_lock:
+            for topic in topics:
+                self._topic_stats.pop(topic, None)
+            for row in rows:
+                self._topic_stats[row[0]] = TopicStats(
+                    topic=row[0],
+                    count=row[1],
+                    first_processed_at=row[2],
+                    last_processed_at=row[3]
+                )
+    
+    @staticmethod
+    def _batch_counts(received: int, unique: int) -> Dict[str, int]:
+        """Counter lifetime untuk satu batch claim"""
+        return {
+            "received": received,
+            "unique_processed": unique,
+            "duplicate_dropped": received - unique
+        }
+    
+    def _write_counter_deltas(self, conn: sqlite3.Connection, batch: Dict[str, int]):
+        """Tulis delta tertunda + counter batch di transaksi yang sedang berjalan"""
+        conn.executemany(
+            "UPDATE dedup_counters SET value = value + ? WHERE name = ?",
+            [
+                (self._counter_deltas[name] + batch.get(name, 0), name)
+                for name in COUNTER_NAMES
+                if self._counter_deltas[name] + batch.get(name, 0)
+            ]
+        )
+    
+    def _commit_counter_deltas(self, batch: Dict[str, int]):
+        """Pindahkan delta tertunda + counter batch ke counter persisted setelah commit"""
+        with self._stats_lock:
+            for name in COUNTER_NAMES:
+                self._counters[name] += self._counter_deltas[name] + batch.get(name, 0)
+                self._counter_deltas[name] = 0
+    
+    def get_counters(self) -> Dict[str, int]:
+        """
+        Ambil counter lifetime (received, unique_processed, duplicate_dropped)
+        
+        Counter di-persist di tabel dedup_counters bersama transaksi batch,
+        sehingga tetap benar setelah restart tanpa scan tabel event.
+        
+        Returns:
+            Dict nama counter -> nilai
+        """
+        self._sync_topic_stats()
+        with self._stats_lock:
+            return {name: self._counters[name] + self._counter_deltas[name] for name in COUNTER_NAMES}
+    
+    def get_topic_stats(self) -> List[TopicStats]:
+        """
+        Ambil counter per topic (dari memory, tanpa scan tabel event)
+        
+        Returns:
+            List of TopicStats, urut nama topic
+        """
+        self._sync_topic_stats()
+        with self._stats_lock:
+            return [stats.model_copy() for _, stats in sorted(self._topic_stats.items())]
     
     def get_all_topics(self) -> Set[str]:
         """
-        Ambil semua topic yang pernah diproses
+        Ambil semua topic yang pernah diproses (O(jumlah topic), dari memory)
         
         Returns:
             Set of topic names
         """
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT DISTINCT topic FROM processed_events")
-                topics = {row[0] for row in cursor.fetchall()}
-                return topics
+        self._sync_topic_stats()
+        with self._stats_lock:
+            return set(self._topic_stats)
     
     def get_total_processed(self) -> int:
         """
-        Hitung total event yang sudah diproses
+        Hitung total event yang sudah diproses (jumlah counter per topic)
         
         Returns:
             Total count of processed events
         """
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM processed_events")
-                count = cursor.fetchone()[0]
-                return count
+        self._sync_topic_stats()
+        with self._stats_lock:
+            return sum(stats.count for stats in self._topic_stats.values())
     
     def clear(self):
         """Hapus semua data (untuk testing)"""
         with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM processed_events")
-                conn.commit()
-                logger.info("DedupStore cleared")
+            if self.segment_log is not None:
+                self.segment_log.clear()
+                self._expiring = None
+            with self._writer as conn:
+                conn.execute("DELETE FROM dedup_keys")
+                conn.execute("DELETE FROM event_log")
+                conn.execute("DELETE FROM topic_stats")
+                conn.execute("UPDATE dedup_counters SET value = 0")
+                if self.segment_log is not None:
+                    self._write_log_end(conn)
+            with self._stats_lock:
+                self._topic_stats.clear()
+                self._counters = dict.fromkeys(COUNTER_NAMES, 0)
+                self._counter_deltas = dict.fromkeys(COUNTER_NAMES, 0)
+            if self.key_cache is not None:
+                self.key_cache.clear()
+            if self.bloom is not None:
+                self.bloom.clear()
+            logger.info("DedupStore cleared")
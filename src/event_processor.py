@@ -4,135 +4,533 @@ dengan idempotency dan deduplication
 """
 import asyncio
 import logging
-from typing import List
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from src.models import Event, Stats
-from src.dedup_store import DedupStore
+from src.models import EventLike, EventRecord, Stats, PartitionStats
+from src.storage import DedupBackend
+from src.async_store import AsyncDedupStore
 
 logger = logging.getLogger(__name__)
 
+# Sentinel untuk menghentikan worker (satu per worker, diletakkan di akhir queue)
+_STOP = object()
+
+
+class QueueFullError(Exception):
+    """
+    Queue processor penuh, batch ditolak sebelum di-claim (backpressure)
+    
+    Attributes:
+        retry_after: Saran detik sebelum publisher mencoba lagi
+        too_large: True jika batch tidak akan pernah muat (lebih besar dari kapasitas)
+    """
+    
+    def __init__(self, message: str, retry_after: float = 1.0, too_large: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.too_large = too_large
+
+
+class InvalidPayloadError(ValueError):
+    """Payload event tidak bisa diserialisasi ke JSON, batch ditolak sebelum di-claim"""
+
+
+def serialize_payloads(events: List[EventRecord]):
+    """
+    Serialisasi payload semua event sebelum batch diterima
+
+    payload_json di-cache di record, jadi claim di thread writer tidak perlu
+    serialisasi ulang. Payload yang gagal diserialisasi ditolak di sini agar
+    tidak menggagalkan transaksi claim seluruh batch.
+
+    Args:
+        events: List of EventRecord
+
+    Raises:
+        InvalidPayloadError: Jika ada payload yang tidak bisa direpresentasikan JSON
+    """
+    for event in events:
+        try:
+            event.payload_json
+        except (TypeError, ValueError) as e:
+            raise InvalidPayloadError(
+                f"Payload of event {event.get_dedup_key()} is not JSON-serializable: {e}"
+            ) from e
+
+
+class Partition:
+    """
+    Satu partisi topic: queue FIFO sendiri dan counter untuk observability
+    
+    Item di queue berupa tuple (waktu enqueue, ukuran bytes, event) sehingga
+    lag (lama event menunggu di queue) bisa diukur saat dequeue dan kapasitas
+    bytes bisa dilepas setelah event diproses.
+    """
+    
+    def __init__(self, index: int):
+        """
+        Inisialisasi partisi
+        
+        Args:
+            index: Nomor partisi
+        """
+        self.index = index
+        self.queue: "asyncio.Queue[Tuple[float, int, EventRecord]]" = asyncio.Queue()
+        self.enqueued = 0
+        self.processed = 0
+        self.lag_seconds = 0.0
+    
+    def put(self, event: EventRecord, size: int = 0):
+        """Masukkan event ke queue partisi (kapasitas sudah di-reserve oleh processor)"""
+        self.queue.put_nowait((time.monotonic(), size, event))
+        self.enqueued += 1
+    
+    def get_stats(self) -> PartitionStats:
+        """Snapshot metrik partisi"""
+        return PartitionStats(
+            partition=self.index,
+            depth=self.queue.qsize(),
+            enqueued=self.enqueued,
+            processed=self.processed,
+            lag_seconds=round(self.lag_seconds, 4)
+        )
+
 
 class EventProcessor:
     """
     Idempotent event processor dengan deduplication
     
-    Memproses event dari internal queue dan memastikan setiap event
-    hanya diproses sekali (idempotency) menggunakan dedup store.
+    Deduplication terjadi di satu tahap saja, yaitu admission
+    (submit_events): seluruh batch di-claim ke dedup store dengan satu
+    operasi atomik claim_many (insert-if-absent, satu transaksi). Hanya
+    event yang berhasil di-claim yang masuk queue, sehingga consumer tidak
+    perlu cek duplikasi lagi.
+    
+    Semantik durability: event dianggap processed setelah transaksi
+    claim_many commit, yaitu sebelum submit_events (dan /publish) return.
+    Publisher yang tidak menerima response (crash sebelum commit) akan
+    retry (at-least-once) dan dedup store mencegah double processing.
+    
+    Consumer men-drain event yang sudah di-claim dari queue dalam batch:
+    menunggu hanya jika queue kosong, lalu mengambil semua event yang
+    tersedia sampai batch_size (opsional linger batch_timeout_ms sekali per
+    batch) dan menyerahkan seluruh batch ke _process_batch.
+    
+    Topic di-hash ke salah satu dari num_partitions partisi, masing-masing
+    dengan queue dan consumer sendiri, sehingga topic yang ramai tidak
+    menahan topic lain di partisi berbeda. Tiap partisi punya num_workers
+    worker; event dengan topic yang sama tetap diproses berurutan (FIFO per
+    topic) dan tidak pernah bersamaan.
+    
+    Kapasitas queue dibatasi max_queue_events dan/atau max_queue_bytes.
+    Sebelum claim, submit_events me-reserve kapasitas untuk seluruh batch,
+    menunggu paling lama enqueue_timeout detik, lalu melempar QueueFullError
+    (HTTP 429) jika tetap penuh. Reserve dilakukan sebelum claim supaya event
+    yang ditolak tidak tercatat sebagai processed.
+    
+    Jika dedup store punya RetentionPolicy aktif, satu background task
+    menjalankan compaction tiap retention.interval detik (expiry per batch
+    lalu incremental vacuum).
     """
     
-    def __init__(self, dedup_store: DedupStore):
+    def __init__(
+        self,
+        dedup_store: DedupBackend,
+        batch_size: int = 100,
+        batch_timeout_ms: float = 0.0,
+        num_workers: int = 1,
+        num_partitions: int = 1,
+        max_queue_events: int = 0,
+        max_queue_bytes: int = 0,
+        enqueue_timeout: float = 0.0,
+        retry_after: float = 1.0
+    ):
         """
         Inisialisasi event processor
         
         Args:
-            dedup_store: Instance DedupStore untuk deduplication
+            dedup_store: Engine dedup store (DedupStore, ShardedDedupStore atau
+                MemoryDedupStore; lihat storage.DedupBackend)
+            batch_size: Maksimal event per batch consumer
+            batch_timeout_ms: Linger sekali per batch untuk menunggu event
+                tambahan jika batch belum penuh (0 = langsung proses)
+            num_workers: Jumlah consumer worker per partisi
+            num_partitions: Jumlah partisi queue (topic di-hash ke partisi)
+            max_queue_events: Maksimal event di semua partisi (0 = unbounded)
+            max_queue_bytes: Maksimal perkiraan ukuran event di queue (0 = unbounded)
+            enqueue_timeout: Detik menunggu kapasitas sebelum menolak batch
+            retry_after: Saran Retry-After (detik) saat batch ditolak
         """
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        if num_workers < 1:
+            raise ValueError("num_workers must be >= 1")
+        if num_partitions < 1:
+            raise ValueError("num_partitions must be >= 1")
+        
         self.dedup_store = dedup_store
-        self.queue: asyncio.Queue[Event] = asyncio.Queue()
+        # Semua akses storage dari coroutine lewat facade async (thread terpisah)
+        self.store = AsyncDedupStore(dedup_store)
+        self.batch_size = batch_size
+        self.batch_timeout_ms = batch_timeout_ms
+        self.num_workers = num_workers
+        self.partitions = [Partition(i) for i in range(num_partitions)]
+        self.max_queue_events = max_queue_events
+        self.max_queue_bytes = max_queue_bytes
+        self.enqueue_timeout = enqueue_timeout
+        self.retry_after = retry_after
+        
+        # Kapasitas yang sedang terpakai (termasuk yang sudah di-reserve)
+        self._queued_events = 0
+        self._queued_bytes = 0
+        self._space_waiters = 0
+        self._space_available = asyncio.Event()
         self.stats = Stats()
         self.start_time = datetime.utcnow()
         self.is_running = False
-        self._processor_task = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._compaction_task: Optional[asyncio.Task] = None
+        
+        # Future "selesai" milik event terakhir yang di-dequeue per topic
+        self._topic_tails: Dict[str, asyncio.Future] = {}
         
         logger.info("EventProcessor initialized")
     
     async def start(self):
-        """Start background processing task"""
+        """Start background processing workers"""
         if not self.is_running:
             self.is_running = True
-            self._processor_task = asyncio.create_task(self._process_events())
-            logger.info("EventProcessor started")
+            self._worker_tasks = [
+                asyncio.create_task(self._process_events(partition, worker_id))
+                for partition in self.partitions
+                for worker_id in range(self.num_workers)
+            ]
+            if self.dedup_store.retention.enabled:
+                self._compaction_task = asyncio.create_task(self._compaction_loop())
+            logger.info(
+                f"EventProcessor started ({len(self.partitions)} partitions x "
+                f"{self.num_workers} workers)"
+            )
+    
+    async def _compaction_loop(self):
+        """Background task: expire event yang lewat retention window secara periodik"""
+        policy = self.dedup_store.retention
+        logger.info(
+            f"Compaction started (retention: {policy.retention_seconds}s, "
+            f"per-topic: {policy.topic_retention}, interval: {policy.interval}s)"
+        )
+        while self.is_running:
+            try:
+                expired = await self.store.compact()
+                if expired:
+                    logger.info(f"Compaction expired {expired} events")
+            except Exception as e:
+                logger.error(f"Compaction failed: {e}", exc_info=True)
+            await asyncio.sleep(policy.interval)
+    
+    def partition_for(self, topic: str) -> Partition:
+        """
+        Tentukan partisi untuk topic (hash stabil lintas restart)
+        
+        Args:
+            topic: Nama topic
+            
+        Returns:
+            Partition untuk topic tersebut
+        """
+        return self.partitions[zlib.crc32(topic.encode()) % len(self.partitions)]
+    
+    def queue_depth(self) -> int:
+        """Total event yang menunggu di semua partisi"""
+        return sum(p.queue.qsize() for p in self.partitions)
+    
+    async def drain(self):
+        """Tunggu sampai semua event di semua partisi selesai diproses"""
+        for partition in self.partitions:
+            await partition.queue.join()
     
     async def stop(self):
-        """Stop background processing task"""
+        """Drain queue, stop semua worker, lalu tutup koneksi dedup store"""
         if self.is_running:
+            # Graceful: event yang sudah di-claim diproses dulu
+            await self.drain()
+            
+            # Satu sentinel per worker di akhir tiap queue partisi
             self.is_running = False
-            if self._processor_task:
-                await self._processor_task
+            for partition in self.partitions:
+                for _ in range(self.num_workers):
+                    partition.queue.put_nowait(_STOP)
+            await asyncio.gather(*self._worker_tasks)
+            self._worker_tasks = []
+            
+            if self._compaction_task is not None:
+                self._compaction_task.cancel()
+                try:
+                    await self._compaction_task
+                except asyncio.CancelledError:
+                    pass
+                self._compaction_task = None
+            
+            await self.store.close()
             logger.info("EventProcessor stopped")
     
-    async def submit_event(self, event: Event) -> dict:
+    async def submit_event(self, event: EventLike) -> dict:
         """
         Submit single event untuk diproses
         
         Args:
-            event: Event object
+            event: Event atau EventRecord
             
         Returns:
             Dict dengan status processing
         """
-        self.stats.received += 1
-        await self.queue.put(event)
-        return {"status": "queued", "event_id": event.event_id}
+        result = await self.submit_events([event])
+        result["event_id"] = event.event_id
+        return result
     
-    async def submit_events(self, events: List[Event]) -> dict:
+    async def submit_events(self, events: List[EventLike]) -> dict:
         """
-        Submit batch events untuk diproses
+        Claim batch events ke dedup store lalu queue event yang unik
+        
+        Event model dikonversi sekali ke EventRecord di sini; queue, dedup
+        store dan consumer hanya bekerja dengan record.
         
         Args:
-            events: List of Event objects
+            events: List of Event atau EventRecord
             
         Returns:
-            Dict dengan statistik processing
+            Dict dengan status, received, processed (event unik yang
+            di-claim) dan duplicates (event yang di-drop)
+            
+        Raises:
+            InvalidPayloadError: Jika ada payload yang tidak bisa diserialisasi ke JSON
+            QueueFullError: Jika kapasitas queue tidak tersedia
         """
+        events = [EventRecord.from_event(event) for event in events]
+        # Serialisasi payload di thread reader (bukan event loop), sebelum reserve
+        await self.store.run_reader(serialize_payloads, events)
         received = len(events)
-        self.stats.received += received
+        sizes = [self._estimate_size(e) for e in events] if self.max_queue_bytes else [0] * received
+        
+        await self._reserve(received, sum(sizes))
+        
+        try:
+            claimed = await self.store.claim_many(events)
+        except Exception:
+            self._release(received, sum(sizes))
+            raise
         
-        for event in events:
-            await self.queue.put(event)
+        processed = 0
+        for event, size, is_new in zip(events, sizes, claimed):
+            if is_new:
+                processed += 1
+                self.partition_for(event.topic).put(event, size)
+            else:
+                # Duplikasi tidak masuk queue, kembalikan kapasitasnya
+                self._release(1, size)
+                logger.info(f"Duplicate dropped: {event.get_dedup_key()}")
         
-        logger.info(f"Queued {received} events for processing")
+        duplicates = received - processed
+        
+        logger.info(f"Claimed {received} events: {processed} unique, {duplicates} duplicates")
         return {
             "status": "queued",
-            "received": received
+            "received": received,
+            "processed": processed,
+            "duplicates": duplicates
         }
     
-    async def _process_events(self):
+    @staticmethod
+    def _estimate_size(event: EventRecord) -> int:
+        """Perkiraan ukuran event di memory (bytes) untuk limit max_queue_bytes"""
+        return (
+            len(event.topic) + len(event.event_id) + len(event.timestamp)
+            + len(event.source) + len(event.payload_json)
+        )
+    
+    def _fits(self, count: int, size: int) -> bool:
+        """Check apakah count event / size bytes masih muat di queue"""
+        if self.max_queue_events and self._queued_events + count > self.max_queue_events:
+            return False
+        if self.max_queue_bytes and self._queued_bytes + size > self.max_queue_bytes:
+            return False
+        return True
+    
+    async def _reserve(self, count: int, size: int):
         """
-        Background task untuk memproses event dari queue
+        Reserve kapasitas queue untuk satu batch, tunggu sampai enqueue_timeout
         
-        Menerapkan idempotency: check duplikasi sebelum processing
+        Args:
+            count: Jumlah event
+            size: Perkiraan total ukuran bytes
+            
+        Raises:
+            QueueFullError: Jika kapasitas tidak tersedia sebelum timeout
         """
-        logger.info("Event processing loop started")
+        if ((self.max_queue_events and count > self.max_queue_events)
+                or (self.max_queue_bytes and size > self.max_queue_bytes)):
+            self.stats.rejected_events += count
+            self.stats.rejected_requests += 1
+            raise QueueFullError(
+                f"Batch of {count} events ({size} bytes) exceeds queue capacity",
+                retry_after=self.retry_after,
+                too_large=True
+            )
         
-        while self.is_running:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.enqueue_timeout
+        
+        while not self._fits(count, size):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.stats.rejected_events += count
+                self.stats.rejected_requests += 1
+                raise QueueFullError(
+                    f"Queue full ({self._queued_events} events, {self._queued_bytes} bytes)",
+                    retry_after=self.retry_after
+                )
+            
+            self._space_available.clear()
+            self._space_waiters += 1
             try:
-                # Ambil event dari queue dengan timeout
-                event = await asyncio.wait_for(self.queue.get(), timeout=1.0)
-                
-                # Check duplikasi
-                if self.dedup_store.is_duplicate(event):
-                    self.stats.duplicate_dropped += 1
-                    logger.info(
-                        f"Duplicate dropped: {event.get_dedup_key()} "
-                        f"(total duplicates: {self.stats.duplicate_dropped})"
-                    )
-                    continue
-                
-                # Proses event (idempotent)
-                await self._process_single_event(event)
+                await asyncio.wait_for(self._space_available.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._space_waiters -= 1
+        
+        self._queued_events += count
+        self._queued_bytes += size
+    
+    def _release(self, count: int, size: int):
+        """Lepas kapasitas queue dan bangunkan publisher yang menunggu"""
+        self._queued_events -= count
+        self._queued_bytes -= size
+        if self._space_waiters:
+            self._space_available.set()
+    
+    async def _process_events(self, partition: Partition, worker_id: int = 0):
+        """
+        Background worker untuk memproses event yang sudah di-claim dari queue partisi
+        
+        Worker hanya await saat queue kosong, lalu men-drain batch tanpa
+        timer per event. Worker berhenti saat menerima sentinel dari stop().
+        
+        Args:
+            partition: Partisi yang di-drain worker ini
+            worker_id: Nomor worker di partisi (untuk logging)
+        """
+        name = f"partition {partition.index}, worker {worker_id}"
+        logger.info(f"Event processing loop started ({name})")
+        
+        stopping = False
+        while not stopping:
+            try:
+                # Tunggu hanya jika queue kosong
+                item = await partition.queue.get()
+                if item is _STOP:
+                    partition.queue.task_done()
+                    break
                 
-                # Mark sebagai processed di dedup store
-                if self.dedup_store.mark_processed(event):
-                    self.stats.unique_processed += 1
-                    logger.debug(
-                        f"Event processed: {event.get_dedup_key()} "
-                        f"(total processed: {self.stats.unique_processed})"
-                    )
-                else:
-                    # Race condition: event sudah dimark oleh thread lain
-                    self.stats.duplicate_dropped += 1
-                    logger.warning(f"Race condition detected for: {event.get_dedup_key()}")
+                batch, stopping = await self._collect_batch(
+                    partition, self._register(partition, item)
+                )
+                await self._process_batch(partition, batch)
                 
-            except asyncio.TimeoutError:
-                # Timeout normal, lanjutkan loop
-                continue
             except Exception as e:
                 logger.error(f"Error processing event: {e}", exc_info=True)
         
-        logger.info("Event processing loop stopped")
+        logger.info(f"Event processing loop stopped ({name})")
     
-    async def _process_single_event(self, event: Event):
+    def _register(
+        self, partition: Partition, item: Tuple[float, int, EventRecord]
+    ) -> Tuple[EventRecord, int, Optional[asyncio.Future], asyncio.Future]:
+        """
+        Daftarkan event ke rantai urutan per topic dan catat lag partisi
+        
+        Harus dipanggil langsung setelah dequeue (tanpa await di antaranya)
+        supaya urutan rantai sama dengan urutan queue.
+        
+        Args:
+            partition: Partisi asal event
+            item: Tuple (waktu enqueue, ukuran, event) dari queue partisi
+            
+        Returns:
+            Tuple (event, ukuran, future event sebelumnya di topic yang sama,
+            future event ini)
+        """
+        enqueued_at, size, event = item
+        partition.lag_seconds = time.monotonic() - enqueued_at
+        
+        done = asyncio.get_running_loop().create_future()
+        prev = self._topic_tails.get(event.topic)
+        self._topic_tails[event.topic] = done
+        return event, size, prev, done
+    
+    async def _collect_batch(
+        self, partition: Partition, first: Tuple
+    ) -> Tuple[List[Tuple], bool]:
+        """
+        Drain event yang tersedia di queue sampai batch_size
+        
+        Args:
+            partition: Partisi asal event
+            first: Entry pertama dari batch (hasil _register)
+            
+        Returns:
+            Tuple (list of entry (event, size, prev, done), True jika sentinel
+            stop ikut ter-drain)
+        """
+        batch = [first]
+        lingered = self.batch_timeout_ms <= 0
+        
+        while len(batch) < self.batch_size:
+            try:
+                item = partition.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                if lingered:
+                    break
+                # Satu kali linger per batch, bukan timer per event
+                lingered = True
+                await asyncio.sleep(self.batch_timeout_ms / 1000)
+                continue
+            
+            if item is _STOP:
+                partition.queue.task_done()
+                return batch, True
+            batch.append(self._register(partition, item))
+        
+        return batch, False
+    
+    async def _process_batch(self, partition: Partition, batch: List[Tuple]):
+        """
+        Proses satu batch event yang sudah di-claim (hook batch-aware)
+        
+        Setiap event menunggu event sebelumnya di topic yang sama selesai
+        (bisa sedang diproses worker lain), sehingga urutan per topic terjaga.
+        
+        Args:
+            partition: Partisi asal batch
+            batch: List of entry (event, size, prev, done) dari _register
+        """
+        for event, size, prev, done in batch:
+            try:
+                if prev is not None:
+                    await prev
+                await self._process_single_event(event)
+            except Exception as e:
+                logger.error(f"Error processing event {event.get_dedup_key()}: {e}", exc_info=True)
+            finally:
+                done.set_result(None)
+                if self._topic_tails.get(event.topic) is done:
+                    del self._topic_tails[event.topic]
+                partition.processed += 1
+                partition.queue.task_done()
+                self._release(1, size)
+    
+    async def _process_single_event(self, event: EventRecord):
         """
         Proses single event (business logic)
         
@@ -143,7 +541,7 @@ class EventProcessor:
         - Etc.
         
         Args:
-            event: Event object untuk diproses
+            event: EventRecord untuk diproses
         """
         # Simulasi processing time
         await asyncio.sleep(0.001)
@@ -161,6 +559,10 @@ class EventProcessor:
         """
         Ambil statistik real-time
         
+        Semua sumber berupa counter in-memory (termasuk counter per topic
+        dari dedup store), jadi biayanya O(jumlah topic + partisi) dan tetap
+        bisa dipanggil setelah store ditutup.
+        
         Returns:
             Stats object dengan metrik terkini
         """
@@ -168,23 +570,86 @@ class EventProcessor:
         uptime = (datetime.utcnow() - self.start_time).total_seconds()
         self.stats.uptime_seconds = round(uptime, 2)
         
-        # Update topics
-        self.stats.topics = list(self.dedup_store.get_all_topics())
+        # Counter lifetime yang di-persist dedup store (bertahan setelah restart)
+        counters = self.dedup_store.get_counters()
+        self.stats.received = counters["received"]
+        self.stats.unique_processed = counters["unique_processed"]
+        self.stats.duplicate_dropped = counters["duplicate_dropped"]
+        
+        # Counter per topic (di-maintain bersama insert, tanpa scan tabel)
+        topic_stats = self.dedup_store.get_topic_stats()
+        self.stats.topic_stats = topic_stats
+        self.stats.topics = [t.topic for t in topic_stats]
+        self.stats.stored_events = sum(t.count for t in topic_stats)
+        
+        # Key cache counters
+        cache = self.dedup_store.key_cache
+        if cache is not None:
+            self.stats.cache_hits = cache.hits
+            self.stats.cache_misses = cache.misses
+        
+        # Bloom filter fill ratio dan FP rate terukur (0 jika engine tanpa filter)
+        filter_stats = self.dedup_store.filter_stats()
+        self.stats.bloom_fill_ratio = filter_stats["fill_ratio"]
+        self.stats.bloom_fp_rate = filter_stats["measured_fp_rate"]
+        
+        # Metrik compaction (retention window)
+        retention = self.dedup_store.retention_stats()
+        self.stats.expired_events = retention["expired_events"]
+        self.stats.vacuumed_pages = retention["vacuumed_pages"]
+        self.stats.compaction_seconds = retention["compaction_seconds"]
+        
+        # Depth dan lag per partisi
+        self.stats.partitions = [p.get_stats() for p in self.partitions]
+        self.stats.queue_depth = self.queue_depth()
+        self.stats.queue_bytes = self._queued_bytes
         
         # Calculate duplicate rate
         self.stats.calculate_duplicate_rate()
         
         return self.stats
     
-    def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[Event]:
+    async def get_stats_async(self) -> Stats:
+        """
+        Ambil statistik dari handler async (tidak ada I/O, tidak memblokir loop)
+        
+        Returns:
+            Stats object dengan metrik terkini
+        """
+        return self.get_stats()
+    
+    async def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[EventRecord]:
         """
-        Ambil events berdasarkan topic
+        Ambil events berdasarkan topic (dijalankan di thread reader)
         
         Args:
             topic: Nama topic
             limit: Maksimal events yang dikembalikan
             
         Returns:
-            List of Event objects
+            List of EventRecord objects
+        """
+        return await self.store.get_events_by_topic(topic, limit)
+    
+    async def get_events_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[EventRecord], Optional[str]]:
+        """
+        Ambil satu halaman events berdasarkan topic (keyset pagination)
+        
+        Args:
+            topic: Nama topic
+            limit: Maksimal events per halaman
+            cursor: Cursor halaman sebelumnya (None = halaman pertama)
+            since: Filter timestamp event >= since (epoch seconds)
+            until: Filter timestamp event < until (epoch seconds)
+            
+        Returns:
+            Tuple (list of EventRecord, cursor halaman berikutnya atau None)
         """
-        return self.dedup_store.get_events_by_topic(topic, limit)
+        return await self.store.get_events_page(topic, limit, cursor, since, until)
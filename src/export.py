@@ -0,0 +1,95 @@
+"""
+Export event satu topic secara streaming (NDJSON atau JSON array)
+Event dibaca per chunk dengan keyset pagination dan langsung diserialisasi
+dari row SQLite (atau disalin apa adanya dari slice mmap segment log),
+sehingga memory tetap O(chunk) berapapun ukuran topic
+"""
+import logging
+from typing import AsyncIterator, Optional, Tuple
+from src.storage import DedupBackend
+from src.event_processor import EventProcessor
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def _read_chunk(
+    store: DedupBackend,
+    topic: str,
+    cursor: Optional[str],
+    since: Optional[float],
+    until: Optional[float],
+    chunk_size: int,
+    fmt: str,
+    first: bool
+) -> Tuple[bytes, Optional[str], int]:
+    """
+    Baca satu chunk event dan serialisasi menjadi bytes (dijalankan di thread reader)
+
+    Returns:
+        Tuple (bytes chunk, cursor chunk berikutnya, jumlah event)
+    """
+    lines, next_cursor = store.get_events_json_page(topic, chunk_size, cursor, since, until)
+    if not lines:
+        return b"", next_cursor, 0
+    if fmt == "ndjson":
+        body = b"\n".join([*lines, b""])
+    else:
+        body = b",\n".join(lines)
+        if not first:
+            body = b",\n" + body
+    return body, next_cursor, len(lines)
+
+
+async def stream_export(
+    processor: EventProcessor,
+    topic: str,
+    fmt: str = "ndjson",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    chunk_size: int = 1000
+) -> AsyncIterator[bytes]:
+    """
+    Stream seluruh event satu topic (terbaru dulu)
+
+    Setiap chunk adalah satu query keyset yang pendek, jadi koneksi reader
+    dikembalikan ke pool di antara chunk dan client yang lambat tidak
+    menahan koneksi atau read transaction.
+
+    Args:
+        processor: EventProcessor (sumber AsyncDedupStore)
+        topic: Nama topic
+        fmt: "ndjson" (satu event per baris) atau "json" (array)
+        since: Filter timestamp event >= since (epoch seconds)
+        until: Filter timestamp event < until (epoch seconds)
+        chunk_size: Jumlah row per query
+
+    Yields:
+        Potongan body response
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    if fmt == "json":
+        yield b"["
+    cursor = None
+    first = True
+    exported = 0
+    while True:
+        body, cursor, count = await processor.store.run_reader(
+            _read_chunk, processor.dedup_store, topic, cursor, since, until, chunk_size, fmt, first
+        )
+        if body:
+            yield body
+        exported += count
+        first = first and count == 0
+        if cursor is None:
+            break
+    if fmt == "json":
+        yield b"]\n"
+
+    logger.info(f"Exported {exported} events for topic '{topic}' ({fmt})")
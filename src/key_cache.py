@@ -0,0 +1,105 @@
+"""
+Cache in-process untuk dedup key yang baru dilihat
+Menghindari lookup SQLite untuk retry at-least-once yang datang beberapa detik
+setelah event aslinya
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable
+
+
+class RecentKeyCache:
+    """
+    Bounded LRU cache dengan TTL untuk key (topic, event_id) yang sudah diproses
+
+    Hanya menyimpan key yang pasti ada di dedup store (positive cache),
+    sehingga cache hit selalu berarti duplikasi. Cache miss tetap harus
+    dicek ke store.
+
+    Thread-safe dengan menggunakan threading.Lock.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300.0):
+        """
+        Inisialisasi cache
+
+        Args:
+            max_size: Maksimal jumlah key (LRU eviction jika penuh)
+            ttl_seconds: Umur maksimal key di cache (0 = tanpa TTL)
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def contains(self, key: Hashable) -> bool:
+        """
+        Check apakah key ada di cache (dan belum expired), update hit/miss counter
+
+        Args:
+            key: Dedup key
+
+        Returns:
+            True jika cache hit
+        """
+        with self._lock:
+            inserted_at = self._entries.get(key)
+            if inserted_at is not None:
+                if self.ttl_seconds > 0 and time.monotonic() - inserted_at > self.ttl_seconds:
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True
+
+            self.misses += 1
+            return False
+
+    def add(self, key: Hashable):
+        """
+        Tambahkan key ke cache
+
+        Args:
+            key: Dedup key
+        """
+        self.add_many((key,))
+
+    def add_many(self, keys: Iterable[Hashable]):
+        """
+        Tambahkan beberapa key sekaligus
+
+        Args:
+            keys: Iterable of dedup keys
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._entries[key] = now
+                self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        """
+        Hapus key dari cache jika ada
+
+        Args:
+            key: Dedup key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Hapus semua key (counter hit/miss tidak direset)"""
+        with self._lock:
+            self._entries.clear()
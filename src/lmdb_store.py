@@ -0,0 +1,544 @@
+"""
+Dedup store di atas LMDB (key-value store embedded yang di-mmap)
+Untuk topic bervolume tinggi: cek keanggotaan key langsung di B+tree LMDB
+tanpa lapisan SQL, satu write transaction per batch claim, dan reader
+tanpa lock (MVCC) yang tidak pernah menunggu writer
+"""
+import hashlib
+import json
+import logging
+import math
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Set, Tuple, Union
+from src.models import EventLike, EventRecord, TopicStats
+from src.dedup_store import (
+    COUNTER_NAMES, RetentionPolicy, decode_cursor, dedup_key_hash, encode_cursor, parse_event_ts
+)
+
+try:
+    import lmdb
+except ImportError:  # pragma: no cover - dependency opsional
+    lmdb = None
+
+logger = logging.getLogger(__name__)
+
+# Value event: event_ts (NaN = tidak ada), panjang UTF-8 topic/event_id/
+# timestamp/source, lalu field tersebut diikuti payload JSON apa adanya
+_VALUE = struct.Struct("<dHHHH")
+_COUNTERS_KEY = b"counters"
+
+
+def _topic_prefix(topic: str) -> bytes:
+    """Prefix key event satu topic (hash 128-bit, key LMDB maksimal 511 byte)"""
+    return hashlib.blake2b(topic.encode(), digest_size=16).digest()
+
+
+def _event_key(prefix: bytes, processed_at: str, key_hash: bytes) -> bytes:
+    """
+    Key event: prefix topic + processed_at + NUL + hash key dedup
+
+    processed_at tidak pernah berisi NUL, jadi urutan byte key sama dengan
+    urutan (processed_at, hash key) dan posisi cursor bisa dihitung dari
+    (processed_at, event_id).
+    """
+    return prefix + processed_at.encode() + b"\x00" + key_hash
+
+
+def _split_key(key: bytes) -> Tuple[str, bytes]:
+    """Key event -> (processed_at, hash key dedup)"""
+    processed_at, _, key_hash = key[16:].partition(b"\x00")
+    return processed_at.decode(), key_hash
+
+
+def _encode_value(record: EventRecord) -> bytes:
+    """Serialisasi EventRecord (beserta event_ts untuk filter since/until)"""
+    event_ts = parse_event_ts(record.timestamp)
+    fields = [record.topic.encode(), record.event_id.encode(), record.timestamp.encode(), record.source.encode()]
+    return b"".join([
+        _VALUE.pack(math.nan if event_ts is None else event_ts, *map(len, fields)),
+        *fields,
+        record.payload_json.encode()
+    ])
+
+
+def _decode_value(value: bytes) -> Tuple[float, EventRecord]:
+    """Value event -> (event_ts, EventRecord); payload tetap JSON string"""
+    event_ts, topic_len, id_len, ts_len, source_len = _VALUE.unpack_from(value)
+    start = _VALUE.size
+    id_start = start + topic_len
+    ts_start = id_start + id_len
+    source_start = ts_start + ts_len
+    payload_start = source_start + source_len
+    return event_ts, EventRecord(
+        value[start:id_start].decode(),
+        value[id_start:ts_start].decode(),
+        value[ts_start:source_start].decode(),
+        value[source_start:payload_start].decode(),
+        payload_json=value[payload_start:].decode()
+    )
+
+
+class LmdbDedupStore:
+    """
+    Dedup store dengan LMDB sebagai engine penyimpanan
+
+    Tiga database di satu environment:
+    - keys: hash BLAKE2b 128-bit (topic, event_id) -> kosong (dedup set)
+    - events: prefix topic + processed_at + hash key -> event, urut per topic
+    - meta: counter lifetime dan counter per topic
+
+    claim_many menjalankan insert-if-absent (put tanpa overwrite) untuk satu
+    batch di satu write transaction, bersama counter lifetime dan per topic;
+    batch yang semuanya duplikasi tidak mengotori page sehingga commit-nya
+    tanpa fsync (counter menunggu transaksi berikutnya atau close). Reader
+    membuka read transaction sendiri (snapshot MVCC) tanpa lock store,
+    sehingga /events dan lookup tidak pernah menunggu writer maupun expiry.
+
+    Di dalam satu batch, event urut hash key (bukan event_id); cursor tetap
+    (processed_at, event_id) dengan format yang sama seperti DedupStore.
+    """
+
+    def __init__(
+        self,
+        path: str = "data/dedup.lmdb",
+        map_size: int = 16 * 1024 ** 3,
+        sync: bool = True,
+        pool_size: int = 4,
+        retention: Optional[RetentionPolicy] = None
+    ):
+        """
+        Inisialisasi store (buat environment jika belum ada)
+
+        Args:
+            path: Direktori environment LMDB
+            map_size: Ukuran maksimal database dalam bytes (hanya address space,
+                file tumbuh sesuai isi)
+            sync: True = fsync tiap commit batch; False = fsync saat checkpoint/close
+                (crash proses aman, crash mesin bisa kehilangan batch terakhir)
+            pool_size: Jumlah thread reader untuk AsyncDedupStore
+            retention: RetentionPolicy untuk expiry event lama (default: simpan selamanya)
+
+        Raises:
+            RuntimeError: Jika package lmdb tidak terpasang
+            ValueError: Jika pool_size tidak valid
+        """
+        if lmdb is None:
+            raise RuntimeError("The LMDB storage engine requires the 'lmdb' package")
+        if pool_size < 1:
+            raise ValueError("pool_size must be >= 1")
+
+        self.path = path
+        self.map_size = map_size
+        self.sync = sync
+        self.pool_size = pool_size
+        self.retention = retention or RetentionPolicy()
+        self.key_cache = None
+        self.lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+
+        Path(path).mkdir(parents=True, exist_ok=True)
+        self.env = lmdb.open(
+            path,
+            map_size=map_size,
+            max_dbs=3,
+            sync=sync,
+            metasync=sync,
+            readahead=False,
+            max_readers=max(126, pool_size * 4)
+        )
+        self._keys = self.env.open_db(b"keys")
+        self._events = self.env.open_db(b"events")
+        self._meta = self.env.open_db(b"meta")
+
+        # Counter dari memory; di-persist di transaksi claim/expiry berikutnya
+        self._counters: Dict[str, int] = dict.fromkeys(COUNTER_NAMES, 0)
+        self._counters_dirty = False
+        self._topic_stats: Dict[str, TopicStats] = {}
+        self._load_stats()
+
+        # Metrik compaction
+        self.expired_events = 0
+        self.compaction_seconds = 0.0
+
+        logger.info(
+            f"LmdbDedupStore initialized at {path} ({self.get_total_processed()} keys, "
+            f"map_size: {map_size}, sync: {sync})"
+        )
+
+    @property
+    def closed(self) -> bool:
+        """True jika store sudah di-close"""
+        return self._closed
+
+    def close(self):
+        """Persist counter yang tertunda, fsync, lalu tutup environment"""
+        with self.lock:
+            if self._closed:
+                return
+            if self._counters_dirty:
+                with self.env.begin(write=True) as txn:
+                    self._put_counters(txn, self._counters)
+                self._counters_dirty = False
+            self._closed = True
+            self.env.sync(True)
+            self.env.close()
+        logger.info(f"LmdbDedupStore closed: {self.path}")
+
+    def _load_stats(self):
+        """Load counter lifetime dan counter per topic dari database meta"""
+        with self.env.begin(db=self._meta) as txn:
+            for key, value in txn.cursor():
+                if key == _COUNTERS_KEY:
+                    counters = json.loads(value)
+                    self._counters = {name: counters.get(name, 0) for name in COUNTER_NAMES}
+                else:
+                    stats = TopicStats.model_validate_json(value)
+                    self._topic_stats[stats.topic] = stats
+
+    def _put_counters(self, txn, counters: Dict[str, int]):
+        """Tulis counter lifetime di transaksi txn"""
+        txn.put(_COUNTERS_KEY, json.dumps(counters).encode(), db=self._meta)
+
+    def _put_topic_stats(self, txn, stats: TopicStats):
+        """Tulis (atau hapus jika kosong) counter satu topic di transaksi txn"""
+        key = b"topic:" + _topic_prefix(stats.topic)
+        if stats.count:
+            txn.put(key, stats.model_dump_json().encode(), db=self._meta)
+        else:
+            txn.delete(key, db=self._meta)
+
+    @contextmanager
+    def _read_txn(self):
+        """Read transaction (snapshot MVCC, tanpa lock store)"""
+        if self._closed:
+            raise RuntimeError("DedupStore is closed")
+        with self.env.begin() as txn:
+            yield txn
+
+    # ------------------------------------------------------------------
+    # Write path
+    # ------------------------------------------------------------------
+
+    def is_duplicate(self, event: EventLike) -> bool:
+        """
+        Check apakah event sudah pernah diproses
+
+        Args:
+            event: Event object untuk di-check
+
+        Returns:
+            True jika event adalah duplikasi
+        """
+        with self._read_txn() as txn:
+            return txn.get(dedup_key_hash(event.topic, event.event_id), db=self._keys) is not None
+
+    def claim(self, event: EventLike) -> bool:
+        """Claim satu event (lihat claim_many)"""
+        return self.claim_many([event])[0]
+
+    def claim_many(self, events: List[EventLike]) -> List[bool]:
+        """
+        Claim batch event secara atomik dalam satu write transaction
+
+        Args:
+            events: List of Event/EventRecord objects
+
+        Returns:
+            List of bool sejajar dengan input: True jika event baru, False jika
+            duplikasi (termasuk duplikasi di dalam batch yang sama)
+
+        Raises:
+            RuntimeError: Jika store sudah di-close atau map LMDB penuh
+        """
+        if not events:
+            return []
+        records = [EventRecord.from_event(event) for event in events]
+        hashes = [dedup_key_hash(*record.key) for record in records]
+        with self.lock:
+            if self._closed:
+                raise RuntimeError("DedupStore is closed")
+            processed_at = datetime.utcnow().isoformat()
+            inserted = [False] * len(records)
+            new_per_topic: Dict[str, int] = {}
+            prefixes: Dict[str, bytes] = {}
+            try:
+                with self.env.begin(write=True) as txn:
+                    for i, (record, key_hash) in enumerate(zip(records, hashes)):
+                        if not txn.put(key_hash, b"", db=self._keys, overwrite=False):
+                            continue
+                        inserted[i] = True
+                        prefix = prefixes.get(record.topic)
+                        if prefix is None:
+                            prefix = prefixes[record.topic] = _topic_prefix(record.topic)
+                        txn.put(_event_key(prefix, processed_at, key_hash), _encode_value(record), db=self._events)
+                        new_per_topic[record.topic] = new_per_topic.get(record.topic, 0) + 1
+
+                    new = sum(new_per_topic.values())
+                    counters = {
+                        "received": self._counters["received"] + len(records),
+                        "unique_processed": self._counters["unique_processed"] + new,
+                        "duplicate_dropped": self._counters["duplicate_dropped"] + len(records) - new
+                    }
+                    topic_stats = {}
+                    if new:
+                        # Hanya batch yang menulis event ikut menulis counter,
+                        # batch duplikasi murni tetap commit tanpa page kotor
+                        self._put_counters(txn, counters)
+                        for topic, count in new_per_topic.items():
+                            stats = self._topic_stats.get(topic)
+                            stats = TopicStats(
+                                topic=topic,
+                                count=(stats.count if stats else 0) + count,
+                                first_processed_at=stats.first_processed_at if stats else processed_at,
+                                last_processed_at=processed_at
+                            )
+                            self._put_topic_stats(txn, stats)
+                            topic_stats[topic] = stats
+            except lmdb.MapFullError as e:
+                raise RuntimeError(
+                    f"LMDB map is full (map_size={self.map_size}); increase --lmdb-map-size"
+                ) from e
+
+            with self._stats_lock:
+                self._counters = counters
+                self._counters_dirty = not new
+                self._topic_stats.update(topic_stats)
+            return inserted
+
+    def checkpoint(self, mode: Literal["PASSIVE", "FULL", "RESTART", "TRUNCATE"] = "PASSIVE"):
+        """Fsync environment (berguna jika sync=False); mode diabaikan"""
+        if not self._closed:
+            self.env.sync(True)
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def expire_batch(self, now: Optional[datetime] = None) -> int:
+        """
+        Hapus satu batch event yang sudah lewat retention window
+
+        Event dihapus per topic dari yang tertua (awal range key topic),
+        beserta key dedup-nya, counter per topic ikut di-update di write
+        transaction yang sama.
+
+        Returns:
+            Jumlah event yang dihapus (< batch_size berarti sudah habis)
+        """
+        if not self.retention.enabled:
+            return 0
+        now = now or datetime.utcnow()
+
+        def cutoff(seconds: float) -> Optional[str]:
+            return (now - timedelta(seconds=seconds)).isoformat() if seconds > 0 else None
+
+        global_cutoff = cutoff(self.retention.retention_seconds)
+        overrides = {topic: cutoff(seconds) for topic, seconds in self.retention.topic_retention.items()}
+        with self.lock:
+            if self._closed:
+                return 0
+            started = time.perf_counter()
+            remaining = self.retention.batch_size
+            topic_stats = {}
+            with self.env.begin(write=True) as txn:
+                cursor = txn.cursor(db=self._events)
+                for topic, stats in sorted(self._topic_stats.items()):
+                    if remaining <= 0:
+                        break
+                    topic_cutoff = overrides[topic] if topic in overrides else global_cutoff
+                    if topic_cutoff is None:
+                        continue
+                    prefix = _topic_prefix(topic)
+                    cursor.set_range(prefix)
+                    dropped = 0
+                    while remaining > 0:
+                        key = cursor.key()
+                        if not key.startswith(prefix):
+                            break
+                        processed_at, key_hash = _split_key(key)
+                        if processed_at >= topic_cutoff:
+                            break
+                        txn.delete(key_hash, db=self._keys)
+                        # delete() memindahkan cursor ke key berikutnya
+                        cursor.delete()
+                        dropped += 1
+                        remaining -= 1
+                    if not dropped:
+                        continue
+                    key = cursor.key()
+                    stats = TopicStats(
+                        topic=topic,
+                        count=stats.count - dropped,
+                        first_processed_at=_split_key(key)[0] if key.startswith(prefix) else None,
+                        last_processed_at=stats.last_processed_at
+                    )
+                    self._put_topic_stats(txn, stats)
+                    topic_stats[topic] = stats
+
+            expired = self.retention.batch_size - remaining
+            with self._stats_lock:
+                for topic, stats in topic_stats.items():
+                    if stats.count:
+                        self._topic_stats[topic] = stats
+                    else:
+                        del self._topic_stats[topic]
+            self.expired_events += expired
+            self.compaction_seconds += time.perf_counter() - started
+            if expired:
+                logger.debug(f"Expired {expired} events")
+            return expired
+
+    def vacuum_step(self, pages: Optional[int] = None) -> int:
+        """LMDB memakai ulang page bebas sendiri; tidak ada page yang dikembalikan ke OS"""
+        return 0
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """
+        Expire semua event lama per batch (lihat DedupStore.compact)
+
+        Returns:
+            Total event yang dihapus
+        """
+        total = 0
+        while True:
+            expired = self.expire_batch(now)
+            total += expired
+            if expired < self.retention.batch_size:
+                return total
+
+    def retention_stats(self) -> dict:
+        """Metrik compaction"""
+        return {
+            "expired_events": self.expired_events,
+            "vacuumed_pages": 0,
+            "compaction_seconds": round(self.compaction_seconds, 4)
+        }
+
+    def filter_stats(self) -> dict:
+        """Tidak ada Bloom filter (lookup langsung ke B+tree yang di-mmap)"""
+        return {"fill_ratio": 0.0, "measured_fp_rate": 0.0}
+
+    # ------------------------------------------------------------------
+    # Read path
+    # ------------------------------------------------------------------
+
+    def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[EventRecord]:
+        """Halaman pertama get_events_page"""
+        return self.get_events_page(topic, limit)[0]
+
+    def get_events_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[EventRecord], Optional[str]]:
+        """
+        Satu halaman event topic (terbaru dulu) dengan keyset pagination
+
+        Cursor LMDB diposisikan dengan set_range ke key cursor lalu berjalan
+        mundur, jadi halaman dalam sama murahnya dengan halaman pertama.
+
+        Args:
+            topic: Nama topic
+            limit: Maksimal jumlah event per halaman
+            cursor: Cursor dari halaman sebelumnya (None = halaman pertama)
+            since: Filter timestamp event >= since (epoch seconds)
+            until: Filter timestamp event < until (epoch seconds)
+
+        Returns:
+            Tuple (list of EventRecord, cursor halaman berikutnya atau None)
+
+        Raises:
+            ValueError: Jika cursor tidak valid
+        """
+        before = decode_cursor(cursor) if cursor is not None else None
+        prefix = _topic_prefix(topic)
+        picked: List[Tuple[str, EventRecord]] = []
+        with self._read_txn() as txn:
+            db_cursor = txn.cursor(db=self._events)
+            upper = (
+                _event_key(prefix, before[0], dedup_key_hash(topic, before[1]))
+                if before is not None else prefix + b"\xff"
+            )
+            found = db_cursor.prev() if db_cursor.set_range(upper) else db_cursor.last()
+            while found and len(picked) <= limit:
+                key = db_cursor.key()
+                if not key.startswith(prefix):
+                    break
+                event_ts, record = _decode_value(db_cursor.value())
+                # NaN (timestamp tidak bisa di-parse) tidak pernah lolos filter
+                if (since is None or event_ts >= since) and (until is None or event_ts < until):
+                    picked.append((_split_key(key)[0], record))
+                found = db_cursor.prev()
+
+        next_cursor = None
+        if len(picked) > limit:
+            processed_at, record = picked[limit - 1]
+            next_cursor = encode_cursor(processed_at, record.event_id)
+        return [record for _, record in picked[:limit]], next_cursor
+
+    def get_events_json_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[Union[bytes, memoryview]], Optional[str]]:
+        """
+        Seperti get_events_page, tetapi tiap event sudah berupa JSON
+
+        Raises:
+            ValueError: Jika cursor tidak valid
+        """
+        records, next_cursor = self.get_events_page(topic, limit, cursor, since, until)
+        return [record.to_json().encode() for record in records], next_cursor
+
+    # ------------------------------------------------------------------
+    # Statistik
+    # ------------------------------------------------------------------
+
+    def get_counters(self) -> Dict[str, int]:
+        """Counter lifetime (received, unique_processed, duplicate_dropped)"""
+        with self._stats_lock:
+            return dict(self._counters)
+
+    def get_topic_stats(self) -> List[TopicStats]:
+        """
+        Counter per topic (dari memory)
+
+        Returns:
+            List of TopicStats, urut nama topic
+        """
+        with self._stats_lock:
+            return [stats.model_copy() for _, stats in sorted(self._topic_stats.items())]
+
+    def get_all_topics(self) -> Set[str]:
+        """Semua topic yang punya event tersimpan"""
+        with self._stats_lock:
+            return set(self._topic_stats)
+
+    def get_total_processed(self) -> int:
+        """Jumlah key dedup yang tersimpan"""
+        with self._read_txn() as txn:
+            return txn.stat(self._keys)["entries"]
+
+    def clear(self):
+        """Hapus semua data (untuk testing)"""
+        with self.lock:
+            with self.env.begin(write=True) as txn:
+                for db in (self._keys, self._events, self._meta):
+                    txn.drop(db, delete=False)
+            with self._stats_lock:
+                self._counters = dict.fromkeys(COUNTER_NAMES, 0)
+                self._counters_dirty = False
+                self._topic_stats.clear()
+        logger.info(f"LmdbDedupStore cleared: {self.path}")
@@ -1,11 +1,18 @@
 """
 Main entry point untuk Pub-Sub Log Aggregator
 """
+import argparse
 import asyncio
 import logging
+import os
 import sys
+from typing import List, Optional
 import uvicorn
-from src.dedup_store import DedupStore
+from src.dedup_store import RetentionPolicy, StorageProfile
+from src.sharded_store import ShardedDedupStore, open_dedup_store
+from src.memory_store import MemoryDedupStore
+from src.lmdb_store import LmdbDedupStore
+from src.storage import STORAGE_ENGINES, DedupBackend
 from src.event_processor import EventProcessor
 from src.api import create_app
 
@@ -59,16 +66,303 @@ async def shutdown_event(processor: EventProcessor):
     logger.info("=" * 60)
 
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse konfigurasi dari CLI, dengan default dari environment variable
+    
+    Args:
+        argv: List argumen (default: sys.argv)
+        
+    Returns:
+        Namespace hasil parsing
+    """
+    env = os.getenv
+    parser = argparse.ArgumentParser(description="Pub-Sub Log Aggregator")
+    parser.add_argument(
+        "--storage-engine", default=env("DEDUP_STORAGE_ENGINE", "sqlite"), choices=STORAGE_ENGINES,
+        help="Engine dedup store (memory = tanpa SQLite, opsional snapshot periodik; lmdb = key-value mmap)"
+    )
+    parser.add_argument("--db-path", default=env("DEDUP_DB_PATH", "data/dedup.db"))
+    parser.add_argument("--pool-size", type=int, default=int(env("DEDUP_POOL_SIZE", "4")))
+    parser.add_argument(
+        "--shards", type=int, default=int(env("DEDUP_SHARDS", "1")),
+        help="Jumlah shard SQLite (key di-hash ke shard; ubah dengan python -m src.reshard)"
+    )
+    parser.add_argument("--batch-size", type=int, default=int(env("DEDUP_BATCH_SIZE", "100")))
+    parser.add_argument(
+        "--batch-timeout-ms", type=float, default=float(env("DEDUP_BATCH_TIMEOUT_MS", "0"))
+    )
+    parser.add_argument(
+        "--partitions", type=int, default=int(env("PROCESSOR_PARTITIONS", "4")),
+        help="Jumlah partisi queue (topic di-hash ke partisi)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=int(env("PROCESSOR_WORKERS", "1")),
+        help="Jumlah consumer worker per partisi"
+    )
+    parser.add_argument(
+        "--max-queue-events", type=int, default=int(env("PROCESSOR_MAX_QUEUE_EVENTS", "100000")),
+        help="Maksimal event di queue (0 = unbounded)"
+    )
+    parser.add_argument(
+        "--max-queue-bytes", type=int, default=int(env("PROCESSOR_MAX_QUEUE_BYTES", "0")),
+        help="Maksimal perkiraan bytes di queue (0 = unbounded)"
+    )
+    parser.add_argument(
+        "--enqueue-timeout", type=float, default=float(env("PROCESSOR_ENQUEUE_TIMEOUT", "1.0")),
+        help="Detik /publish menunggu kapasitas sebelum HTTP 429"
+    )
+    parser.add_argument(
+        "--trusted-api-keys", default=env("API_TRUSTED_KEYS", ""),
+        help="API key producer terpercaya (dipisah koma) untuk fast-path validation"
+    )
+    parser.add_argument(
+        "--key-cache-size", type=int, default=int(env("DEDUP_KEY_CACHE_SIZE", "10000"))
+    )
+    parser.add_argument(
+        "--key-cache-ttl", type=float, default=float(env("DEDUP_KEY_CACHE_TTL", "300"))
+    )
+    parser.add_argument(
+        "--bloom-capacity", type=int, default=int(env("DEDUP_BLOOM_CAPACITY", "0")),
+        help="Expected cardinality Bloom filter (0 = nonaktif)"
+    )
+    parser.add_argument(
+        "--bloom-fp-rate", type=float, default=float(env("DEDUP_BLOOM_FP_RATE", "0.01"))
+    )
+    
+    # Retention window dedup dan background compaction
+    retention = parser.add_argument_group("retention")
+    retention.add_argument(
+        "--retention-seconds", type=float, default=float(env("DEDUP_RETENTION_SECONDS", "0")),
+        help="Window dedup global dalam detik (0 = simpan selamanya)"
+    )
+    retention.add_argument(
+        "--topic-retention", default=env("DEDUP_TOPIC_RETENTION", ""),
+        help="Override per topic, format topic=detik dipisah koma (0 = simpan selamanya)"
+    )
+    retention.add_argument(
+        "--compaction-interval", type=float, default=float(env("DEDUP_COMPACTION_INTERVAL", "60"))
+    )
+    retention.add_argument(
+        "--compaction-batch-size", type=int,
+        default=int(env("DEDUP_COMPACTION_BATCH_SIZE", "1000")),
+        help="Event yang dihapus per transaksi"
+    )
+    retention.add_argument(
+        "--vacuum-pages", type=int, default=int(env("DEDUP_VACUUM_PAGES", "1000")),
+        help="Page yang dikembalikan ke OS per putaran compaction (0 = nonaktif)"
+    )
+    
+    # Segment log untuk payload event (opsional)
+    event_log = parser.add_argument_group("event log")
+    event_log.add_argument(
+        "--event-log-dir", default=env("DEDUP_EVENT_LOG_DIR", ""),
+        help="Direktori segment log untuk payload event (kosong = tabel event_log SQLite)"
+    )
+    event_log.add_argument(
+        "--segment-bytes", type=int, default=int(env("DEDUP_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+        help="Kapasitas satu file segment dalam bytes"
+    )
+    event_log.add_argument(
+        "--log-fsync-interval", type=float, default=float(env("DEDUP_LOG_FSYNC_INTERVAL", "0")),
+        help="Detik minimal antar fsync segment (0 = fsync tiap batch sebelum key di-commit)"
+    )
+    
+    # Snapshot engine memory
+    memory = parser.add_argument_group("memory engine")
+    memory.add_argument(
+        "--snapshot-path", default=env("DEDUP_SNAPSHOT_PATH", ""),
+        help="File snapshot engine memory (kosong = tidak persisten)"
+    )
+    memory.add_argument(
+        "--snapshot-interval", type=float, default=float(env("DEDUP_SNAPSHOT_INTERVAL", "0")),
+        help="Detik antar snapshot (0 = hanya saat shutdown)"
+    )
+    
+    # Engine LMDB
+    lmdb_options = parser.add_argument_group("lmdb engine")
+    lmdb_options.add_argument("--lmdb-path", default=env("DEDUP_LMDB_PATH", "data/dedup.lmdb"))
+    lmdb_options.add_argument(
+        "--lmdb-map-size", type=int, default=int(env("DEDUP_LMDB_MAP_SIZE", str(16 * 1024 ** 3))),
+        help="Ukuran maksimal database LMDB dalam bytes (address space, bukan ukuran file)"
+    )
+    lmdb_options.add_argument(
+        "--lmdb-sync", type=int, choices=[0, 1], default=int(env("DEDUP_LMDB_SYNC", "1")),
+        help="1 = fsync tiap commit batch, 0 = fsync saat checkpoint/shutdown"
+    )
+    
+    # Storage profile: preset lalu override per PRAGMA
+    storage = parser.add_argument_group("storage profile")
+    storage.add_argument(
+        "--storage-profile", default=env("DEDUP_STORAGE_PROFILE", "wal"),
+        choices=["wal", "durable", "legacy"]
+    )
+    storage.add_argument("--journal-mode", default=env("DEDUP_JOURNAL_MODE"))
+    storage.add_argument("--synchronous", default=env("DEDUP_SYNCHRONOUS"))
+    storage.add_argument("--cache-size", type=int, default=env("DEDUP_CACHE_SIZE"))
+    storage.add_argument("--mmap-size", type=int, default=env("DEDUP_MMAP_SIZE"))
+    storage.add_argument("--temp-store", default=env("DEDUP_TEMP_STORE"))
+    storage.add_argument("--busy-timeout-ms", type=int, default=env("DEDUP_BUSY_TIMEOUT_MS"))
+    storage.add_argument(
+        "--wal-checkpoint-interval", type=float, default=env("DEDUP_WAL_CHECKPOINT_INTERVAL")
+    )
+    
+    return parser.parse_args(argv)
+
+
+def build_storage_profile(args: argparse.Namespace) -> StorageProfile:
+    """
+    Bangun StorageProfile dari preset dan override CLI/env
+    
+    Args:
+        args: Namespace dari parse_args
+        
+    Returns:
+        StorageProfile tervalidasi
+    """
+    overrides = {
+        "journal_mode": args.journal_mode.upper() if args.journal_mode else None,
+        "synchronous": args.synchronous.upper() if args.synchronous else None,
+        "cache_size": args.cache_size,
+        "mmap_size": args.mmap_size,
+        "temp_store": args.temp_store.upper() if args.temp_store else None,
+        "busy_timeout_ms": args.busy_timeout_ms,
+        "wal_checkpoint_interval": args.wal_checkpoint_interval,
+    }
+    base = StorageProfile.preset(args.storage_profile)
+    return StorageProfile(
+        **{**base.model_dump(), **{k: v for k, v in overrides.items() if v is not None}}
+    )
+
+
+def build_retention_policy(args: argparse.Namespace) -> RetentionPolicy:
+    """
+    Bangun RetentionPolicy dari CLI/env
+    
+    Args:
+        args: Namespace dari parse_args
+        
+    Returns:
+        RetentionPolicy tervalidasi
+        
+    Raises:
+        ValueError: Jika format --topic-retention tidak valid
+    """
+    topic_retention = {}
+    for item in filter(None, (part.strip() for part in args.topic_retention.split(","))):
+        topic, sep, seconds = item.rpartition("=")
+        if not sep or not topic:
+            raise ValueError(f"Invalid topic retention (expected topic=seconds): {item}")
+        topic_retention[topic.strip()] = float(seconds)
+    return RetentionPolicy(
+        retention_seconds=args.retention_seconds,
+        topic_retention=topic_retention,
+        batch_size=args.compaction_batch_size,
+        interval=args.compaction_interval,
+        vacuum_pages=args.vacuum_pages
+    )
+
+
+def build_dedup_store(
+    args: argparse.Namespace, profile: StorageProfile, retention: RetentionPolicy
+) -> DedupBackend:
+    """
+    Buka engine dedup store sesuai --storage-engine
+    
+    Args:
+        args: Namespace dari parse_args
+        profile: StorageProfile (hanya untuk engine sqlite)
+        retention: RetentionPolicy
+        
+    Returns:
+        Engine dedup store
+        
+    Raises:
+        ValueError: Jika layout shard tidak cocok atau snapshot tidak valid
+        RuntimeError: Jika engine lmdb dipilih tanpa package lmdb
+    """
+    if args.storage_engine == "memory":
+        store = MemoryDedupStore(
+            retention=retention,
+            snapshot_path=args.snapshot_path or None,
+            snapshot_interval=args.snapshot_interval,
+            pool_size=args.pool_size
+        )
+        logger.info(
+            f"✓ Memory engine (snapshot: {args.snapshot_path or 'disabled'}, "
+            f"interval {args.snapshot_interval}s)"
+        )
+        return store
+    if args.storage_engine == "lmdb":
+        store = LmdbDedupStore(
+            path=args.lmdb_path,
+            map_size=args.lmdb_map_size,
+            sync=bool(args.lmdb_sync),
+            pool_size=args.pool_size,
+            retention=retention
+        )
+        logger.info(f"✓ LMDB engine: {args.lmdb_path} (sync: {bool(args.lmdb_sync)})")
+        return store
+    
+    store = open_dedup_store(
+        args.db_path,
+        shards=args.shards,
+        pool_size=args.pool_size,
+        profile=profile,
+        key_cache_size=args.key_cache_size,
+        key_cache_ttl=args.key_cache_ttl,
+        bloom_capacity=args.bloom_capacity,
+        bloom_fp_rate=args.bloom_fp_rate,
+        retention=retention,
+        event_log_dir=args.event_log_dir or None,
+        segment_bytes=args.segment_bytes,
+        log_fsync_interval=args.log_fsync_interval
+    )
+    logger.info(f"✓ Storage profile: {profile.model_dump()}")
+    shards = store.shards if isinstance(store, ShardedDedupStore) else [store]
+    if len(shards) > 1:
+        logger.info(f"✓ Sharded dedup store: {len(shards)} shards")
+    if args.event_log_dir:
+        segments = sum(shard.segment_log.segment_count for shard in shards)
+        logger.info(
+            f"✓ Event log: {args.event_log_dir} ({segments} segments, "
+            f"fsync interval {args.log_fsync_interval}s)"
+        )
+    return store
+
+
+def main(argv: Optional[List[str]] = None):
     """Main function untuk menjalankan aplikasi"""
+    args = parse_args(argv)
+    profile = build_storage_profile(args)
+    retention = build_retention_policy(args)
+    
     # Initialize components
-    dedup_store = DedupStore(db_path="data/dedup.db")
-    logger.info(f"✓ Dedup store initialized: {dedup_store.get_total_processed()} events in store")
+    dedup_store = build_dedup_store(args, profile, retention)
+    counters = dedup_store.get_counters()
+    logger.info(
+        f"✓ Dedup store initialized ({args.storage_engine}): {counters['unique_processed']} unique events, "
+        f"{counters['received']} received, {counters['duplicate_dropped']} duplicates dropped"
+    )
+    if retention.enabled:
+        logger.info(f"✓ Retention policy: {retention.model_dump()}")
     
-    processor = EventProcessor(dedup_store)
+    processor = EventProcessor(
+        dedup_store,
+        batch_size=args.batch_size,
+        batch_timeout_ms=args.batch_timeout_ms,
+        num_workers=args.workers,
+        num_partitions=args.partitions,
+        max_queue_events=args.max_queue_events,
+        max_queue_bytes=args.max_queue_bytes,
+        enqueue_timeout=args.enqueue_timeout
+    )
     
     # Create FastAPI app
-    app = create_app(processor)
+    trusted_api_keys = [key.strip() for key in args.trusted_api_keys.split(",") if key.strip()]
+    app = create_app(processor, trusted_api_keys=trusted_api_keys)
+    if trusted_api_keys:
+        logger.info(f"✓ Fast-path validation enabled for {len(trusted_api_keys)} trusted API key(s)")
     
     # Add startup and shutdown events
     @app.on_event("startup")
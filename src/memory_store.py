@@ -0,0 +1,495 @@
+"""
+Dedup store in-memory (tanpa SQLite)
+Untuk deployment ephemeral dengan throughput tinggi dan test yang cepat;
+snapshot periodik opsional ke file agar isi store bertahan setelah restart
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Set, Tuple, Union
+from src.models import EventLike, EventRecord, TopicStats
+from src.dedup_store import COUNTER_NAMES, RetentionPolicy, decode_cursor, encode_cursor, parse_event_ts
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_FORMAT = "dedup-memory-snapshot"
+_SNAPSHOT_VERSION = 1
+
+
+class _TopicEvents:
+    """Event satu topic urut (processed_at, event_id), disimpan per kolom"""
+    __slots__ = ("keys", "records", "event_ts")
+
+    def __init__(self):
+        self.keys: List[Tuple[str, str]] = []
+        self.records: List[EventRecord] = []
+        self.event_ts: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def append(self, processed_at: str, record: EventRecord, event_ts: Optional[float] = None):
+        if event_ts is None:
+            event_ts = parse_event_ts(record.timestamp)
+        self.keys.append((processed_at, record.event_id))
+        self.records.append(record)
+        # NaN (timestamp tidak bisa di-parse) tidak pernah lolos filter since/until
+        self.event_ts.append(math.nan if event_ts is None else event_ts)
+
+    def drop_before(self, cutoff: str, limit: int) -> List[EventRecord]:
+        """Hapus paling banyak limit event tertua dengan processed_at < cutoff"""
+        count = min(bisect_left(self.keys, (cutoff,)), limit)
+        dropped = self.records[:count]
+        for column in (self.keys, self.records, self.event_ts):
+            del column[:count]
+        return dropped
+
+
+class MemoryDedupStore:
+    """
+    Dedup store dengan set key dan list event per topic di memory
+
+    Antarmuka dan semantik sama dengan DedupStore (lihat
+    storage.DedupBackend): claim_many atomik per batch di bawah satu lock,
+    halaman /events urut (processed_at, event_id) terbaru dulu dengan format
+    cursor yang sama, counter lifetime dan per topic, serta retention per
+    batch (termasuk override per topic).
+
+    Tanpa snapshot, semua key hilang saat proses berhenti. Dengan
+    snapshot_path, isi store ditulis atomik (tmp + fsync + rename) tiap
+    snapshot_interval detik, saat checkpoint() dan saat close(), lalu
+    di-load saat start; event yang di-claim setelah snapshot terakhir hilang
+    jika proses crash, sehingga retry-nya diterima lagi sebagai event baru.
+    """
+
+    def __init__(
+        self,
+        retention: Optional[RetentionPolicy] = None,
+        snapshot_path: Optional[str] = None,
+        snapshot_interval: float = 0.0,
+        pool_size: int = 2
+    ):
+        """
+        Inisialisasi store (load snapshot jika ada)
+
+        Args:
+            retention: RetentionPolicy untuk expiry event lama (default: simpan selamanya)
+            snapshot_path: File snapshot (None = murni in-memory)
+            snapshot_interval: Detik antar snapshot di background thread (0 = hanya
+                saat checkpoint/close)
+            pool_size: Jumlah thread reader untuk AsyncDedupStore
+
+        Raises:
+            ValueError: Jika konfigurasi snapshot tidak valid atau file snapshot rusak
+        """
+        if snapshot_interval < 0:
+            raise ValueError("snapshot_interval must be >= 0")
+        if snapshot_interval > 0 and not snapshot_path:
+            raise ValueError("snapshot_interval requires snapshot_path")
+
+        self.retention = retention or RetentionPolicy()
+        self.pool_size = pool_size
+        self.key_cache = None
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._closed = False
+        self._keys: Set[Tuple[str, str]] = set()
+        self._topics: Dict[str, _TopicEvents] = {}
+        self._counters: Dict[str, int] = dict.fromkeys(COUNTER_NAMES, 0)
+        self._last_processed_at = ""
+
+        # Metrik compaction dan snapshot
+        self.expired_events = 0
+        self.compaction_seconds = 0.0
+        self.snapshots = 0
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            self._load_snapshot()
+
+        self._stop = threading.Event()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        if snapshot_interval > 0:
+            self._snapshot_thread = threading.Thread(
+                target=self._snapshot_loop, name="dedup-snapshot", daemon=True
+            )
+            self._snapshot_thread.start()
+
+        logger.info(
+            f"MemoryDedupStore initialized ({len(self._keys)} keys, "
+            f"snapshot: {snapshot_path or 'disabled'})"
+        )
+
+    @property
+    def closed(self) -> bool:
+        """True jika store sudah di-close"""
+        return self._closed
+
+    def close(self):
+        """Hentikan snapshot periodik, tolak operasi berikutnya, lalu tulis snapshot terakhir"""
+        if self._closed:
+            return
+        self._stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        with self.lock:
+            self._closed = True
+        if self.snapshot_path:
+            self.save_snapshot()
+        logger.info("MemoryDedupStore closed")
+
+    def _check_open(self):
+        """Raise jika store sudah di-close (dipanggil dengan lock)"""
+        if self._closed:
+            raise RuntimeError("DedupStore is closed")
+
+    # ------------------------------------------------------------------
+    # Write path
+    # ------------------------------------------------------------------
+
+    def _next_processed_at(self) -> str:
+        """processed_at batch berikutnya, selalu lebih besar dari yang terakhir (urutan list per topic)"""
+        now = datetime.utcnow()
+        if self._last_processed_at and now.isoformat() <= self._last_processed_at:
+            now = datetime.fromisoformat(self._last_processed_at) + timedelta(microseconds=1)
+        self._last_processed_at = now.isoformat()
+        return self._last_processed_at
+
+    def is_duplicate(self, event: EventLike) -> bool:
+        """
+        Check apakah event sudah pernah diproses
+
+        Args:
+            event: Event object untuk di-check
+
+        Returns:
+            True jika event adalah duplikasi
+        """
+        key = EventRecord.from_event(event).key
+        with self.lock:
+            self._check_open()
+            return key in self._keys
+
+    def claim(self, event: EventLike) -> bool:
+        """Claim satu event (lihat claim_many)"""
+        return self.claim_many([event])[0]
+
+    def claim_many(self, events: List[EventLike]) -> List[bool]:
+        """
+        Claim batch event secara atomik (insert-if-absent di bawah satu lock)
+
+        Args:
+            events: List of Event/EventRecord objects
+
+        Returns:
+            List of bool sejajar dengan input: True jika event baru, False jika
+            duplikasi (termasuk duplikasi di dalam batch yang sama)
+        """
+        if not events:
+            return []
+        records = [EventRecord.from_event(event) for event in events]
+        with self.lock:
+            self._check_open()
+            processed_at = self._next_processed_at()
+            keys = self._keys
+            inserted = [False] * len(records)
+            new_records = []
+            for i, record in enumerate(records):
+                if record.key not in keys:
+                    keys.add(record.key)
+                    inserted[i] = True
+                    new_records.append(record)
+
+            # List per topic harus tetap urut (processed_at, event_id)
+            new_records.sort(key=lambda record: record.event_id)
+            topics = self._topics
+            for record in new_records:
+                events_of_topic = topics.get(record.topic)
+                if events_of_topic is None:
+                    events_of_topic = topics[record.topic] = _TopicEvents()
+                events_of_topic.append(processed_at, record)
+
+            self._counters["received"] += len(records)
+            self._counters["unique_processed"] += len(new_records)
+            self._counters["duplicate_dropped"] += len(records) - len(new_records)
+            return inserted
+
+    def checkpoint(self, mode: Literal["PASSIVE", "FULL", "RESTART", "TRUNCATE"] = "PASSIVE"):
+        """Tulis snapshot sekarang (jika snapshot_path diset); mode diabaikan"""
+        if self.snapshot_path:
+            self.save_snapshot()
+
+    # ------------------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------------------
+
+    def save_snapshot(self):
+        """
+        Tulis snapshot isi store secara atomik
+
+        State disalin di bawah lock (salinan list, tanpa serialisasi), lalu
+        ditulis di luar lock sehingga claim tidak menunggu I/O snapshot.
+        """
+        with self._snapshot_lock:
+            started = time.perf_counter()
+            with self.lock:
+                header = {
+                    "format": _SNAPSHOT_FORMAT,
+                    "version": _SNAPSHOT_VERSION,
+                    "counters": dict(self._counters),
+                    "last_processed_at": self._last_processed_at
+                }
+                topics = [
+                    (list(events.keys), list(events.event_ts), list(events.records))
+                    for events in self._topics.values()
+                ]
+
+            path = Path(self.snapshot_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.tmp")
+            count = 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(header) + "\n")
+                for keys, event_ts, records in topics:
+                    for (processed_at, _), ts, record in zip(keys, event_ts, records):
+                        # event_ts ikut disimpan agar load tidak parse ulang timestamp
+                        f.write(json.dumps([
+                            processed_at, None if math.isnan(ts) else ts, record.topic,
+                            record.event_id, record.timestamp, record.source, record.payload_json
+                        ]) + "\n")
+                    count += len(records)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            self.snapshots += 1
+            logger.debug(
+                f"Memory store snapshot saved: {count} events in "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+
+    def _load_snapshot(self):
+        """Load snapshot dari snapshot_path (dipanggil saat init)"""
+        started = time.perf_counter()
+        with open(self.snapshot_path, encoding="utf-8") as f:
+            try:
+                header = json.loads(f.readline())
+                if header.get("format") != _SNAPSHOT_FORMAT or header.get("version") != _SNAPSHOT_VERSION:
+                    raise ValueError("unknown snapshot format")
+                for line in f:
+                    processed_at, event_ts, topic, event_id, timestamp, source, payload_json = json.loads(line)
+                    record = EventRecord(topic, event_id, timestamp, source, payload_json=payload_json)
+                    self._keys.add(record.key)
+                    events_of_topic = self._topics.get(topic)
+                    if events_of_topic is None:
+                        events_of_topic = self._topics[topic] = _TopicEvents()
+                    events_of_topic.append(processed_at, record, event_ts)
+            except (ValueError, TypeError, AttributeError) as e:
+                raise ValueError(f"Invalid memory store snapshot {self.snapshot_path}: {e}") from e
+        self._counters.update({name: header["counters"].get(name, 0) for name in COUNTER_NAMES})
+        self._last_processed_at = header.get("last_processed_at", "")
+        logger.info(
+            f"Memory store snapshot loaded: {len(self._keys)} keys "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    def _snapshot_loop(self):
+        """Background thread: snapshot tiap snapshot_interval detik sampai close"""
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                logger.error(f"Memory store snapshot failed: {e}", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def expire_batch(self, now: Optional[datetime] = None) -> int:
+        """
+        Hapus satu batch event yang sudah lewat retention window
+
+        Returns:
+            Jumlah event yang dihapus (< batch_size berarti sudah habis)
+        """
+        if not self.retention.enabled:
+            return 0
+        now = now or datetime.utcnow()
+
+        def cutoff(seconds: float) -> Optional[str]:
+            return (now - timedelta(seconds=seconds)).isoformat() if seconds > 0 else None
+
+        global_cutoff = cutoff(self.retention.retention_seconds)
+        overrides = {topic: cutoff(seconds) for topic, seconds in self.retention.topic_retention.items()}
+        with self.lock:
+            if self._closed:
+                return 0
+            started = time.perf_counter()
+            remaining = self.retention.batch_size
+            for topic, events_of_topic in list(self._topics.items()):
+                topic_cutoff = overrides[topic] if topic in overrides else global_cutoff
+                if topic_cutoff is None:
+                    continue
+                dropped = events_of_topic.drop_before(topic_cutoff, remaining)
+                for record in dropped:
+                    self._keys.discard(record.key)
+                if not len(events_of_topic):
+                    del self._topics[topic]
+                remaining -= len(dropped)
+                if remaining <= 0:
+                    break
+            expired = self.retention.batch_size - remaining
+            self.expired_events += expired
+            self.compaction_seconds += time.perf_counter() - started
+            return expired
+
+    def vacuum_step(self, pages: Optional[int] = None) -> int:
+        """Tidak ada page yang perlu dikembalikan ke OS"""
+        return 0
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """
+        Expire semua event lama per batch (lihat DedupStore.compact)
+
+        Returns:
+            Total event yang dihapus
+        """
+        total = 0
+        while True:
+            expired = self.expire_batch(now)
+            total += expired
+            if expired < self.retention.batch_size:
+                return total
+
+    def retention_stats(self) -> dict:
+        """Metrik compaction"""
+        return {
+            "expired_events": self.expired_events,
+            "vacuumed_pages": 0,
+            "compaction_seconds": round(self.compaction_seconds, 4)
+        }
+
+    def filter_stats(self) -> dict:
+        """Tidak ada Bloom filter (lookup set sudah O(1))"""
+        return {"fill_ratio": 0.0, "measured_fp_rate": 0.0}
+
+    # ------------------------------------------------------------------
+    # Read path
+    # ------------------------------------------------------------------
+
+    def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[EventRecord]:
+        """Halaman pertama get_events_page"""
+        return self.get_events_page(topic, limit)[0]
+
+    def get_events_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[EventRecord], Optional[str]]:
+        """
+        Satu halaman event topic (terbaru dulu) dengan keyset pagination
+
+        Posisi cursor dicari dengan bisect di list key topic, jadi halaman
+        dalam sama murahnya dengan halaman pertama.
+
+        Args:
+            topic: Nama topic
+            limit: Maksimal jumlah event per halaman
+            cursor: Cursor dari halaman sebelumnya (None = halaman pertama)
+            since: Filter timestamp event >= since (epoch seconds)
+            until: Filter timestamp event < until (epoch seconds)
+
+        Returns:
+            Tuple (list of EventRecord, cursor halaman berikutnya atau None)
+
+        Raises:
+            ValueError: Jika cursor tidak valid
+        """
+        before = decode_cursor(cursor) if cursor is not None else None
+        with self.lock:
+            self._check_open()
+            events_of_topic = self._topics.get(topic)
+            if events_of_topic is None:
+                return [], None
+            keys, event_ts = events_of_topic.keys, events_of_topic.event_ts
+            i = (len(keys) if before is None else bisect_left(keys, before)) - 1
+            picked = []
+            while i >= 0 and len(picked) <= limit:
+                ts = event_ts[i]
+                if (since is None or ts >= since) and (until is None or ts < until):
+                    picked.append(i)
+                i -= 1
+            records = [events_of_topic.records[j] for j in picked[:limit]]
+            next_cursor = encode_cursor(*keys[picked[limit - 1]]) if len(picked) > limit else None
+        return records, next_cursor
+
+    def get_events_json_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[Union[bytes, memoryview]], Optional[str]]:
+        """
+        Seperti get_events_page, tetapi tiap event sudah berupa JSON
+
+        Raises:
+            ValueError: Jika cursor tidak valid
+        """
+        records, next_cursor = self.get_events_page(topic, limit, cursor, since, until)
+        return [record.to_json().encode() for record in records], next_cursor
+
+    # ------------------------------------------------------------------
+    # Statistik
+    # ------------------------------------------------------------------
+
+    def get_counters(self) -> Dict[str, int]:
+        """Counter lifetime (received, unique_processed, duplicate_dropped)"""
+        with self.lock:
+            return dict(self._counters)
+
+    def get_topic_stats(self) -> List[TopicStats]:
+        """
+        Counter per topic
+
+        Returns:
+            List of TopicStats, urut nama topic
+        """
+        with self.lock:
+            return [
+                TopicStats(
+                    topic=topic,
+                    count=len(events_of_topic),
+                    first_processed_at=events_of_topic.keys[0][0],
+                    last_processed_at=events_of_topic.keys[-1][0]
+                )
+                for topic, events_of_topic in sorted(self._topics.items())
+            ]
+
+    def get_all_topics(self) -> Set[str]:
+        """Semua topic yang punya event tersimpan"""
+        with self.lock:
+            return set(self._topics)
+
+    def get_total_processed(self) -> int:
+        """Total event tersimpan"""
+        with self.lock:
+            return len(self._keys)
+
+    def clear(self):
+        """Hapus semua data (untuk testing)"""
+        with self.lock:
+            self._keys.clear()
+            self._topics.clear()
+            self._counters = dict.fromkeys(COUNTER_NAMES, 0)
+        logger.info("MemoryDedupStore cleared")
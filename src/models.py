@@ -2,8 +2,10 @@
 Data models untuk event dan statistik sistem
 """
 from pydantic import BaseModel, Field, field_validator
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
+import json
+from json.encoder import encode_basestring_ascii
 import uuid
 
 
@@ -66,6 +68,114 @@ class Event(BaseModel):
         }
 
 
+class EventRecord:
+    """
+    Representasi internal event yang ringkas (tanpa pydantic)
+
+    Dipakai di seluruh pipeline (queue processor, dedup store, hasil query);
+    konversi dari/ke Event hanya terjadi di boundary API. Dedup key dihitung
+    sekali saat record dibuat, dan payload disimpan sebagai JSON yang sudah
+    diserialisasi (payload_json) sehingga dedup store tidak perlu json.dumps
+    ulang dan hasil query tidak perlu json.loads + validasi ulang.
+
+    Record dari fast path membawa dict payload; serialisasi dilakukan malas
+    saat payload_json pertama kali dibutuhkan (di thread writer saat claim).
+    """
+    __slots__ = ("topic", "event_id", "timestamp", "source", "key", "_payload", "_payload_json")
+
+    def __init__(
+        self,
+        topic: str,
+        event_id: str,
+        timestamp: str,
+        source: str,
+        payload: Optional[Dict[str, Any]] = None,
+        payload_json: Optional[str] = None
+    ):
+        self.topic = topic
+        self.event_id = event_id
+        self.timestamp = timestamp
+        self.source = source
+        self.key = (topic, event_id)
+        self._payload = payload
+        self._payload_json = payload_json
+        if payload is None and payload_json is None:
+            self._payload_json = "{}"
+
+    @classmethod
+    def from_event(cls, event: Union["Event", "EventRecord"]) -> "EventRecord":
+        """
+        Konversi Event (boundary API) menjadi EventRecord
+
+        Args:
+            event: Event model, atau EventRecord (dikembalikan apa adanya)
+
+        Returns:
+            EventRecord
+        """
+        if isinstance(event, EventRecord):
+            return event
+        return cls(event.topic, event.event_id, event.timestamp, event.source, event.payload)
+
+    @property
+    def payload_json(self) -> str:
+        """
+        Payload dalam bentuk JSON (diserialisasi sekali)
+
+        Raises:
+            TypeError: Jika payload berisi tipe non-JSON (mis. bytes)
+            ValueError: Jika payload berisi float non-finite (NaN/Infinity)
+        """
+        if self._payload_json is None:
+            self._payload_json = json.dumps(self._payload, allow_nan=False)
+            # Setelah diserialisasi, dict tidak perlu disimpan lagi di queue
+            self._payload = None
+        return self._payload_json
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        """Payload sebagai dict (di-decode dari payload_json bila perlu)"""
+        if self._payload is not None:
+            return self._payload
+        return json.loads(self._payload_json) if self._payload_json else {}
+
+    def get_dedup_key(self) -> str:
+        """Generate deduplication key berdasarkan (topic, event_id)"""
+        return f"{self.topic}:{self.event_id}"
+
+    def to_json(self) -> str:
+        """
+        Serialisasi record ke JSON object (bentuk sama dengan Event)
+
+        payload_json disisipkan apa adanya, tanpa decode/encode ulang. Field
+        string di-escape langsung dengan encoder C milik json (hasil sama
+        dengan json.dumps, tanpa overhead per pemanggilan dumps).
+        """
+        dumps = encode_basestring_ascii
+        return (
+            f'{{"topic":{dumps(self.topic)},"event_id":{dumps(self.event_id)},'
+            f'"timestamp":{dumps(self.timestamp)},"source":{dumps(self.source)},'
+            f'"payload":{self.payload_json}}}'
+        )
+
+    def to_event(self) -> Event:
+        """Konversi ke model Event untuk response API (tanpa validasi ulang)"""
+        return Event.model_construct(
+            topic=self.topic,
+            event_id=self.event_id,
+            timestamp=self.timestamp,
+            source=self.source,
+            payload=self.payload
+        )
+
+    def __repr__(self) -> str:
+        return f"EventRecord(topic={self.topic!r}, event_id={self.event_id!r})"
+
+
+# Event dari API (model) atau dari pipeline internal (record)
+EventLike = Union[Event, EventRecord]
+
+
 class PublishResponse(BaseModel):
     """Response model untuk endpoint /publish"""
     status: str = Field(..., description="Status hasil publish")
@@ -75,11 +185,45 @@ class PublishResponse(BaseModel):
     message: Optional[str] = Field(None, description="Pesan tambahan")
 
 
+class StreamPublishResponse(BaseModel):
+    """Response model untuk endpoint /publish/stream (NDJSON)"""
+    status: str = Field(..., description="Status hasil publish")
+    lines: int = Field(..., description="Jumlah baris yang dibaca dari stream")
+    received: int = Field(..., description="Jumlah event valid yang diterima")
+    processed: int = Field(..., description="Jumlah event unik yang diproses")
+    duplicates: int = Field(..., description="Jumlah duplikasi yang di-drop")
+    rejected: int = Field(..., description="Jumlah baris yang ditolak (JSON/skema tidak valid)")
+    rejected_lines: List[int] = Field(
+        default_factory=list, description="Nomor baris (1-based) yang ditolak, dibatasi"
+    )
+    message: Optional[str] = Field(None, description="Pesan tambahan")
+
+
 class EventsResponse(BaseModel):
     """Response model untuk endpoint /events"""
     topic: str = Field(..., description="Topic yang di-query")
     count: int = Field(..., description="Jumlah event")
     events: List[Event] = Field(default_factory=list, description="List of events")
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor untuk halaman berikutnya (None jika sudah habis)"
+    )
+
+
+class PartitionStats(BaseModel):
+    """Metrik per partisi queue event processor"""
+    partition: int = Field(..., description="Nomor partisi")
+    depth: int = Field(default=0, description="Event yang menunggu di queue")
+    enqueued: int = Field(default=0, description="Total event yang masuk partisi")
+    processed: int = Field(default=0, description="Total event yang selesai diproses")
+    lag_seconds: float = Field(default=0.0, description="Waktu tunggu event terakhir yang di-dequeue")
+
+
+class TopicStats(BaseModel):
+    """Counter per topic yang di-maintain bersama insert ke dedup store"""
+    topic: str = Field(..., description="Nama topic")
+    count: int = Field(default=0, description="Jumlah event unik yang tersimpan")
+    first_processed_at: Optional[str] = Field(None, description="processed_at event pertama")
+    last_processed_at: Optional[str] = Field(None, description="processed_at event terakhir")
 
 
 class Stats(BaseModel):
@@ -87,12 +231,26 @@ class Stats(BaseModel):
     Model statistik sistem untuk observability
     
     Attributes:
-        received: Total event yang diterima sejak startup
-        unique_processed: Total event unik yang diproses
-        duplicate_dropped: Total duplikasi yang di-drop
+        received: Total event yang diterima (lifetime, di-persist di dedup store)
+        unique_processed: Total event unik yang diproses (lifetime)
+        duplicate_dropped: Total duplikasi yang di-drop (lifetime)
         topics: List of topics yang pernah diproses
         uptime_seconds: Waktu sistem berjalan dalam detik
         duplicate_rate: Rate duplikasi (0.0 - 1.0)
+        cache_hits: Jumlah dedup lookup yang dijawab dari key cache
+        cache_misses: Jumlah dedup lookup yang diteruskan ke SQLite
+        bloom_fill_ratio: Rasio bit Bloom filter yang sudah di-set
+        bloom_fp_rate: False-positive rate Bloom filter yang terukur
+        partitions: Depth dan lag tiap partisi queue
+        queue_depth: Total event yang menunggu di queue
+        queue_bytes: Perkiraan ukuran event di queue (jika limit bytes aktif)
+        rejected_events: Event yang ditolak karena queue penuh (HTTP 429)
+        rejected_requests: Request publish yang ditolak karena queue penuh
+        stored_events: Total event yang tersimpan di dedup store
+        topic_stats: Jumlah event dan rentang processed_at per topic
+        expired_events: Event yang dihapus karena lewat retention window
+        vacuumed_pages: Page database yang dikembalikan ke OS (incremental vacuum)
+        compaction_seconds: Total waktu compaction (expiry + vacuum) menahan lock writer
     """
     received: int = Field(default=0, description="Total events received")
     unique_processed: int = Field(default=0, description="Unique events processed")
@@ -100,6 +258,20 @@ class Stats(BaseModel):
     topics: List[str] = Field(default_factory=list, description="Active topics")
     uptime_seconds: float = Field(default=0.0, description="System uptime")
     duplicate_rate: float = Field(default=0.0, description="Duplicate rate (0.0-1.0)")
+    cache_hits: int = Field(default=0, description="Dedup key cache hits")
+    cache_misses: int = Field(default=0, description="Dedup key cache misses")
+    bloom_fill_ratio: float = Field(default=0.0, description="Bloom filter fill ratio")
+    bloom_fp_rate: float = Field(default=0.0, description="Measured Bloom filter FP rate")
+    partitions: List[PartitionStats] = Field(default_factory=list, description="Per-partition metrics")
+    queue_depth: int = Field(default=0, description="Events waiting in queue")
+    queue_bytes: int = Field(default=0, description="Estimated bytes waiting in queue")
+    rejected_events: int = Field(default=0, description="Events rejected by backpressure")
+    rejected_requests: int = Field(default=0, description="Publish requests rejected by backpressure")
+    stored_events: int = Field(default=0, description="Total events in the dedup store")
+    topic_stats: List[TopicStats] = Field(default_factory=list, description="Per-topic counters")
+    expired_events: int = Field(default=0, description="Events expired by the retention window")
+    vacuumed_pages: int = Field(default=0, description="Pages released by incremental vacuum")
+    compaction_seconds: float = Field(default=0.0, description="Time spent in compaction")
     
     def calculate_duplicate_rate(self):
         """Hitung duplicate rate"""
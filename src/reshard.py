@@ -0,0 +1,174 @@
+"""
+Reshard dedup store secara offline
+Menyalin semua key, event (dengan processed_at aslinya) dan counter lifetime
+dari satu layout shard ke layout baru. Jalankan saat service berhenti:
+
+    python -m src.reshard --db-path data/dedup.db --from-shards 1 --to-shards 4
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Union
+from src.dedup_store import DedupStore, RetentionPolicy, StorageProfile
+from src.sharded_store import ShardedDedupStore, find_layouts, shard_db_path, shard_log_dir
+
+logger = logging.getLogger(__name__)
+
+
+def layout_paths(db_path: str, shards: int, event_log_dir: Optional[str] = None) -> List[str]:
+    """
+    File dan direktori milik satu layout shard
+
+    Args:
+        db_path: Path database tanpa shard
+        shards: Jumlah shard
+        event_log_dir: Direktori segment log (opsional)
+
+    Returns:
+        List path database (+ WAL, shared-memory, snapshot Bloom) dan
+        segment log yang ada di disk
+    """
+    if shards == 1:
+        databases = [db_path]
+        # Direktori log tanpa shard juga berisi subdirektori layout lain:
+        # yang dimiliki layout ini hanya file segment dan LOCK
+        logs = (
+            sorted(str(path) for path in Path(event_log_dir).glob("*.log")) + [str(Path(event_log_dir) / "LOCK")]
+            if event_log_dir else []
+        )
+    else:
+        databases = [shard_db_path(db_path, i, shards) for i in range(shards)]
+        logs = [shard_log_dir(event_log_dir, i, shards) for i in range(shards)] if event_log_dir else []
+    paths = [
+        path
+        for database in databases
+        for path in (database, f"{database}-wal", f"{database}-shm", f"{database}.bloom")
+    ]
+    return [path for path in paths + logs if os.path.exists(path)]
+
+
+def _open_layout(db_path: str, shards: int, **options) -> Union[DedupStore, ShardedDedupStore]:
+    """Buka satu layout tanpa cek layout lain (open_dedup_store menolak layout yang belum ada)"""
+    if shards == 1:
+        return DedupStore(db_path=db_path, **options)
+    return ShardedDedupStore(db_path=db_path, shards=shards, **options)
+
+
+def reshard(
+    db_path: str,
+    from_shards: int,
+    to_shards: int,
+    event_log_dir: Optional[str] = None,
+    segment_bytes: int = 64 * 1024 * 1024,
+    profile: Optional[StorageProfile] = None,
+    batch_size: int = 10000
+) -> int:
+    """
+    Salin isi layout from_shards ke layout to_shards baru
+
+    Event dibaca urut (processed_at, event_id) dari semua shard asal lalu
+    di-import per batch ke shard tujuan, sehingga /events, cursor dan umur
+    retention tidak berubah. Counter lifetime asal ditambahkan ke layout
+    baru. File layout lama tidak dihapus.
+
+    Args:
+        db_path: Path database tanpa shard
+        from_shards: Jumlah shard layout asal
+        to_shards: Jumlah shard layout tujuan (belum boleh ada di disk)
+        event_log_dir: Direktori segment log (None = tabel event_log SQLite)
+        segment_bytes: Kapasitas segment untuk layout baru
+        profile: StorageProfile untuk kedua layout
+        batch_size: Event per transaksi import
+
+    Returns:
+        Jumlah event yang disalin
+
+    Raises:
+        ValueError: Jika layout asal tidak ada atau layout tujuan sudah ada
+    """
+    if from_shards == to_shards:
+        raise ValueError("from_shards and to_shards must differ")
+    layouts = find_layouts(db_path)
+    if from_shards not in layouts:
+        raise ValueError(f"No {from_shards}-shard layout found at {db_path} (found: {layouts})")
+    if to_shards in layouts:
+        raise ValueError(f"A {to_shards}-shard layout already exists at {db_path}")
+    if to_shards == 1 and event_log_dir and any(Path(event_log_dir).glob("*.log")):
+        raise ValueError(f"{event_log_dir} already contains unsharded event log segments")
+
+    options = dict(
+        profile=profile,
+        key_cache_size=0,
+        retention=RetentionPolicy(),
+        event_log_dir=event_log_dir,
+        segment_bytes=segment_bytes
+    )
+    started = time.perf_counter()
+    source = _open_layout(db_path, from_shards, **options)
+    try:
+        target = _open_layout(db_path, to_shards, **options)
+        try:
+            copied = 0
+            batch = []
+            for entry in source.iter_events():
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    copied += target.import_events(batch)
+                    batch = []
+            if batch:
+                copied += target.import_events(batch)
+            target.add_counters(source.get_counters())
+            expected = source.get_total_processed()
+            if copied != expected:
+                logger.warning(f"Copied {copied} events but the source layout reports {expected}")
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+    logger.info(
+        f"Resharded {db_path} from {from_shards} to {to_shards} shard(s): "
+        f"{copied} events in {time.perf_counter() - started:.1f}s"
+    )
+    return copied
+
+
+def main(argv: Optional[List[str]] = None):
+    """CLI reshard (konfigurasi default dari environment seperti src.main)"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    env = os.getenv
+    parser = argparse.ArgumentParser(description="Reshard dedup store (offline)")
+    parser.add_argument("--db-path", default=env("DEDUP_DB_PATH", "data/dedup.db"))
+    parser.add_argument("--from-shards", type=int, default=int(env("DEDUP_SHARDS", "1")))
+    parser.add_argument("--to-shards", type=int, required=True)
+    parser.add_argument("--event-log-dir", default=env("DEDUP_EVENT_LOG_DIR", ""))
+    parser.add_argument(
+        "--segment-bytes", type=int, default=int(env("DEDUP_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+    )
+    parser.add_argument("--batch-size", type=int, default=10000, help="Event per transaksi import")
+    args = parser.parse_args(argv)
+
+    reshard(
+        args.db_path,
+        args.from_shards,
+        args.to_shards,
+        event_log_dir=args.event_log_dir or None,
+        segment_bytes=args.segment_bytes,
+        batch_size=args.batch_size
+    )
+    stale = layout_paths(args.db_path, args.from_shards, args.event_log_dir or None)
+    logger.info(
+        f"Start the service with --shards {args.to_shards}. The old layout is kept; "
+        f"remove it after verifying: {' '.join(stale)}"
+    )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
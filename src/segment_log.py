@@ -0,0 +1,757 @@
+"""
+Event log append-only berbasis file segment (backend opsional DedupStore)
+Payload event ditulis berurutan ke file segment yang di-mmap, sehingga ingest
+tidak menulis row + index SQLite per event dan /events dibaca langsung dari
+slice mmap; SQLite cukup menyimpan dedup key
+"""
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from src.models import EventRecord
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - platform non-POSIX
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# (processed_at, event_ts, record)
+LogEntry = Tuple[str, Optional[float], EventRecord]
+
+# Header record: ukuran total, crc32, event_ts (NaN = tidak ada), panjang UTF-8
+# topic/event_id/processed_at/timestamp/source dan payload. Body berisi field
+# tersebut diikuti JSON event utuh (diakhiri payload + "}"), sehingga export
+# menyalin JSON apa adanya dan EventRecord dibangun tanpa json.loads.
+# crc menutup semua byte setelah field crc.
+_HEADER = struct.Struct("<IIdHHHHHI")
+_HEADER_PREFIX = struct.Struct("<II")
+_HEADER_TAIL = struct.Struct("<dHHHHHI")
+_SUFFIX = ".log"
+
+
+def _epoch(processed_at: str) -> float:
+    """processed_at (ISO8601 UTC tanpa offset) -> epoch seconds"""
+    return datetime.fromisoformat(processed_at).replace(tzinfo=timezone.utc).timestamp()
+
+
+class _Segment:
+    """Satu file segment: di-mmap sepanjang kapasitas, size = akhir data valid"""
+    __slots__ = ("base", "path", "mm", "size", "synced", "last_processed_at", "topic_counts")
+
+    def __init__(self, base: int, path: Path, mm: mmap.mmap):
+        self.base = base
+        self.path = path
+        self.mm = mm
+        self.size = 0
+        self.synced = 0
+        self.last_processed_at: Optional[str] = None
+        self.topic_counts: Dict[str, int] = {}
+
+    def release(self):
+        """Tutup mmap (dibiarkan ke GC jika masih ada slice yang dipegang reader)"""
+        try:
+            self.mm.close()
+        except BufferError:
+            pass
+
+
+class _TopicIndex:
+    """Offset index satu topic, urut (processed_at, event_id) sesuai urutan append"""
+    __slots__ = ("processed", "event_ts", "segment", "offset")
+
+    def __init__(self):
+        self.processed = array("d")
+        self.event_ts = array("d")
+        self.segment = array("Q")
+        self.offset = array("Q")
+
+    def __len__(self) -> int:
+        return len(self.processed)
+
+    def append(self, processed: float, event_ts: float, segment: int, offset: int):
+        self.processed.append(processed)
+        self.event_ts.append(event_ts)
+        self.segment.append(segment)
+        self.offset.append(offset)
+
+    def drop_segment(self, base: int) -> int:
+        """Hapus entry milik segment base (selalu prefix karena segment tertua dihapus dulu)"""
+        count = bisect_right(self.segment, base)
+        for column in (self.processed, self.event_ts, self.segment, self.offset):
+            del column[:count]
+        return count
+
+
+class SegmentLog:
+    """
+    Log event append-only di file segment berukuran tetap
+
+    Record ditulis ke segment aktif (file yang di-preallocate lalu di-mmap),
+    dan segment baru dibuat (roll) jika record berikutnya tidak muat. Setiap
+    record membawa crc32, sehingga record terakhir yang terpotong saat crash
+    terdeteksi dan dipotong saat open. Index per topic (array processed_at,
+    event_ts, segment, offset) disimpan di memory dan dibangun ulang dengan
+    scan sequential saat open.
+
+    Penulisan mengikuti pola transaksi milik DedupStore: append() menulis
+    record, sync() melakukan fsync (msync) sesuai fsync_interval, lalu
+    publish() membuat record terlihat oleh reader setelah transaksi key
+    commit, atau rollback() membuangnya jika transaksi gagal. Posisi akhir
+    log (end) dicatat di transaksi key yang sama, dan open() membuang record
+    di belakang posisi tersebut.
+
+    Hanya satu proses yang boleh membuka direktori log (dijaga flock).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync_interval: float = 0.0
+    ):
+        """
+        Inisialisasi log (file dibuka lewat open)
+
+        Args:
+            directory: Direktori file segment
+            segment_bytes: Kapasitas satu segment dalam bytes
+            fsync_interval: Detik minimal antar fsync (0 = fsync setiap sync(),
+                yaitu setiap batch claim sebelum key di-commit)
+        """
+        if segment_bytes < mmap.ALLOCATIONGRANULARITY:
+            raise ValueError(f"segment_bytes must be >= {mmap.ALLOCATIONGRANULARITY}")
+        if fsync_interval < 0:
+            raise ValueError("fsync_interval must be >= 0")
+
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.syncs = 0
+        self._segments: Dict[int, _Segment] = {}
+        self._detached: Dict[int, _Segment] = {}
+        self._active: Optional[_Segment] = None
+        self._topics: Dict[str, _TopicIndex] = {}
+        self._pending: List[Tuple[_Segment, int, str, str, float]] = []
+        self._pending_start: Optional[Tuple[int, int]] = None
+        self._last_processed_at = ""
+        self._last_epoch: Tuple[str, float] = ("", 0.0)
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        self._lock_file = None
+
+    # ------------------------------------------------------------------
+    # Open / recovery
+    # ------------------------------------------------------------------
+
+    def open(self, committed: Optional[str] = None):
+        """
+        Buka semua segment, bangun index dan potong record yang tidak valid
+
+        Args:
+            committed: Posisi akhir log yang tercatat di transaksi key terakhir
+                (None = terima semua record valid)
+
+        Raises:
+            RuntimeError: Jika direktori sedang dibuka proses lain
+        """
+        started = time.perf_counter()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._acquire_directory_lock()
+
+        limit = self._parse_position(committed) if committed else None
+        bases = sorted(
+            int(path.stem) for path in self.directory.glob(f"*{_SUFFIX}") if path.stem.isdigit()
+        )
+        if limit is not None:
+            orphans = [base for base in bases if base > limit[0]]
+            for base in orphans:
+                self._segment_path(base).unlink()
+            if orphans:
+                logger.warning(f"Removed {len(orphans)} uncommitted event log segment(s)")
+            bases = [base for base in bases if base <= limit[0]]
+
+        for i, base in enumerate(bases):
+            is_last = i == len(bases) - 1
+            end = limit[1] if limit is not None and base == limit[0] else None
+            self._open_segment(base, is_last, end)
+
+        if self._active is None:
+            self._active = self._create_segment(bases[-1] + 1 if bases else 0, self.segment_bytes)
+
+        records = sum(len(index) for index in self._topics.values())
+        logger.info(
+            f"Event log opened at {self.directory}: {len(self._segments)} segment(s), "
+            f"{records} records in {time.perf_counter() - started:.2f}s"
+        )
+
+    def _acquire_directory_lock(self):
+        """Kunci direktori log (flock) agar tidak ada dua writer"""
+        if fcntl is None:
+            return
+        self._lock_file = open(self.directory / "LOCK", "a")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"Event log {self.directory} is already open by another process")
+
+    @staticmethod
+    def _parse_position(position: str) -> Tuple[int, int]:
+        """Parse posisi "segment:offset" """
+        base, _, offset = position.partition(":")
+        return int(base), int(offset)
+
+    def _segment_path(self, base: int) -> Path:
+        return self.directory / f"{base:020d}{_SUFFIX}"
+
+    def _open_segment(self, base: int, is_last: bool, limit: Optional[int]):
+        """
+        Map satu segment yang sudah ada dan index record-nya
+
+        Segment terakhir menjadi segment aktif: sisa file setelah record valid
+        terakhir di-reset ke nol (truncate lalu extend, tetap sparse) sehingga
+        record yang terpotong tidak pernah terbaca lagi.
+        """
+        path = self._segment_path(base)
+        capacity = path.stat().st_size
+        if capacity == 0:
+            # Crash sebelum file sempat di-preallocate
+            path.unlink()
+            return
+
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        segment = _Segment(base, path, mm)
+        end, torn = self._scan(segment, limit)
+
+        if limit is not None and end < limit:
+            logger.warning(
+                f"Event log segment {base} ends at {end}, before committed offset {limit}: "
+                "payloads written after the last fsync were lost"
+            )
+        if torn:
+            logger.warning(f"Truncated event log segment {base} at offset {end} (torn or uncommitted tail)")
+
+        if is_last:
+            mm.close()
+            os.truncate(path, end)
+            os.truncate(path, capacity)
+            with open(path, "r+b") as f:
+                segment.mm = mmap.mmap(f.fileno(), capacity, access=mmap.ACCESS_WRITE)
+            self._active = segment
+        segment.size = segment.synced = end
+        self._segments[base] = segment
+
+    def _scan(self, segment: _Segment, limit: Optional[int]) -> Tuple[int, bool]:
+        """
+        Validasi record dari awal segment dan masukkan ke index
+
+        Returns:
+            Tuple (offset akhir record valid, True jika ada data setelahnya)
+        """
+        mm = segment.mm
+        stop = len(mm) if limit is None else min(limit, len(mm))
+        offset = 0
+        while offset + _HEADER.size <= len(mm):
+            size, crc, event_ts, topic_len, id_len, processed_len, *lengths = _HEADER.unpack_from(mm, offset)
+            if size == 0:
+                return offset, False
+            if (offset + size > stop
+                    or size < _HEADER.size + topic_len + id_len + processed_len + sum(lengths)
+                    or zlib.crc32(mm[offset + _HEADER_PREFIX.size:offset + size]) != crc):
+                return offset, True
+            start = offset + _HEADER.size + topic_len + id_len
+            topic = mm[offset + _HEADER.size:offset + _HEADER.size + topic_len].decode()
+            processed_at = mm[start:start + processed_len].decode()
+            self._index(segment, offset, topic, processed_at, event_ts)
+            offset += size
+        return offset, False
+
+    def _create_segment(self, base: int, capacity: int) -> _Segment:
+        """Buat segment baru (preallocate sparse) dan map untuk ditulis"""
+        path = self._segment_path(base)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, capacity)
+            mm = mmap.mmap(fd, capacity, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+        self._sync_directory()
+        segment = _Segment(base, path, mm)
+        self._segments[base] = segment
+        return segment
+
+    def _sync_directory(self):
+        """fsync direktori agar file segment baru tetap ada setelah crash"""
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:  # pragma: no cover - direktori tidak bisa dibuka (Windows)
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ------------------------------------------------------------------
+    # Write path
+    # ------------------------------------------------------------------
+
+    @property
+    def end(self) -> str:
+        """Posisi akhir log "segment:offset" (termasuk record yang belum di-publish)"""
+        return f"{self._active.base}:{self._active.size}"
+
+    def next_processed_at(self, processed_at: str) -> str:
+        """
+        processed_at untuk batch berikutnya, selalu lebih besar dari yang terakhir
+
+        Index per topic mengandalkan urutan append = urutan (processed_at,
+        event_id), jadi jam yang mundur tidak boleh menghasilkan processed_at
+        yang lebih kecil.
+
+        Args:
+            processed_at: Kandidat processed_at (ISO8601 UTC)
+
+        Returns:
+            processed_at yang dipakai untuk batch
+        """
+        if not self._last_processed_at:
+            return processed_at
+        last = datetime.fromisoformat(self._last_processed_at)
+        if datetime.fromisoformat(processed_at) <= last:
+            return (last + timedelta(microseconds=1)).isoformat()
+        return processed_at
+
+    def append(self, entries: List[LogEntry]):
+        """
+        Tulis record ke segment aktif (belum terlihat reader sampai publish)
+
+        Per topic, entries harus urut (processed_at, event_id) dan lebih besar
+        dari record terakhir topic tersebut.
+
+        Args:
+            entries: List (processed_at, event_ts, record)
+        """
+        if self._pending_start is None:
+            self._pending_start = (self._active.base, self._active.size)
+        for processed_at, event_ts, record in entries:
+            fields = [
+                value.encode()
+                for value in (record.topic, record.event_id, processed_at, record.timestamp, record.source)
+            ]
+            # payload_json dari json.dumps selalu ASCII: panjang str = panjang UTF-8
+            payload = record.payload_json
+            payload_len = len(payload) if payload.isascii() else len(payload.encode())
+            ts = math.nan if event_ts is None else event_ts
+            tail = _HEADER_TAIL.pack(ts, *map(len, fields), payload_len)
+            body = b"".join((tail, *fields, record.to_json().encode()))
+            size = _HEADER_PREFIX.size + len(body)
+            segment = self._active
+            if segment.size + size > len(segment.mm):
+                segment = self._roll(size)
+
+            offset = segment.size
+            mm = segment.mm
+            mm[offset:offset + _HEADER_PREFIX.size] = _HEADER_PREFIX.pack(size, zlib.crc32(body))
+            mm[offset + _HEADER_PREFIX.size:offset + size] = body
+            segment.size = offset + size
+            self._pending.append((segment, offset, record.topic, processed_at, ts))
+            if processed_at > self._last_processed_at:
+                self._last_processed_at = processed_at
+
+    def _roll(self, min_size: int) -> _Segment:
+        """Tutup segment aktif (fsync) dan mulai segment baru"""
+        self._flush(self._active)
+        self._active = self._create_segment(
+            self._active.base + 1, max(self.segment_bytes, min_size)
+        )
+        logger.debug(f"Event log rolled to segment {self._active.base}")
+        return self._active
+
+    def _flush(self, segment: _Segment):
+        """msync bagian segment yang belum durable"""
+        if segment.size <= segment.synced:
+            return
+        start = segment.synced - segment.synced % mmap.ALLOCATIONGRANULARITY
+        segment.mm.flush(start, segment.size - start)
+        segment.synced = segment.size
+        self.syncs += 1
+
+    def sync(self, force: bool = False):
+        """
+        fsync record yang sudah di-append
+
+        Dengan fsync_interval > 0 fsync dilewati jika fsync terakhir masih
+        dalam interval (group commit lintas batch): crash mesin di dalam window
+        itu bisa kehilangan payload yang key-nya sudah commit.
+
+        Args:
+            force: Abaikan fsync_interval
+        """
+        now = time.monotonic()
+        if not force and self.fsync_interval > 0 and now - self._last_sync < self.fsync_interval:
+            return
+        self._flush(self._active)
+        self._last_sync = now
+
+    def publish(self):
+        """Buat record hasil append terlihat oleh reader (setelah transaksi key commit)"""
+        with self._lock:
+            for segment, offset, topic, processed_at, event_ts in self._pending:
+                self._index(segment, offset, topic, processed_at, event_ts)
+        self._pending.clear()
+        self._pending_start = None
+
+    def rollback(self):
+        """Buang record hasil append yang belum di-publish (transaksi key gagal)"""
+        if self._pending_start is None:
+            return
+        base, size = self._pending_start
+        while self._active.base > base:
+            dropped = self._segments.pop(self._active.base)
+            dropped.release()
+            dropped.path.unlink()
+            self._active = self._segments[max(self._segments)]
+        segment = self._active
+        # Nolkan agar record yang dibuang tidak terbaca lagi saat recovery
+        segment.mm[size:segment.size] = bytes(segment.size - size)
+        segment.size = size
+        segment.synced = min(segment.synced, size)
+        self._pending.clear()
+        self._pending_start = None
+
+    def _index(self, segment: _Segment, offset: int, topic: str, processed_at: str, event_ts: float):
+        """Tambahkan record ke index topic (dipanggil dengan lock index atau saat open)"""
+        cached, epoch = self._last_epoch
+        if processed_at != cached:
+            epoch = _epoch(processed_at)
+            self._last_epoch = (processed_at, epoch)
+        index = self._topics.get(topic)
+        if index is None:
+            index = self._topics[topic] = _TopicIndex()
+        index.append(epoch, event_ts, segment.base, offset)
+        segment.topic_counts[topic] = segment.topic_counts.get(topic, 0) + 1
+        if segment.last_processed_at is None or processed_at > segment.last_processed_at:
+            segment.last_processed_at = processed_at
+        if processed_at > self._last_processed_at:
+            self._last_processed_at = processed_at
+
+    # ------------------------------------------------------------------
+    # Read path
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _fields(segment: _Segment, offset: int) -> Tuple[str, str, str, int, int]:
+        """Baca (topic, event_id, processed_at, awal JSON, akhir record) dari record"""
+        mm = segment.mm
+        size, _, _, topic_len, id_len, processed_len, ts_len, source_len, _ = _HEADER.unpack_from(mm, offset)
+        start = offset + _HEADER.size
+        id_start = start + topic_len
+        processed_start = id_start + id_len
+        ts_start = processed_start + processed_len
+        return (
+            mm[start:id_start].decode(),
+            mm[id_start:processed_start].decode(),
+            mm[processed_start:ts_start].decode(),
+            ts_start + ts_len + source_len,
+            offset + size
+        )
+
+    @staticmethod
+    def _record(segment: _Segment, offset: int) -> EventRecord:
+        """Bangun EventRecord dari record (payload tetap JSON string, tanpa json.loads)"""
+        mm = segment.mm
+        size, _, _, topic_len, id_len, processed_len, ts_len, source_len, payload_len = (
+            _HEADER.unpack_from(mm, offset)
+        )
+        start = offset + _HEADER.size
+        id_start = start + topic_len
+        ts_start = id_start + id_len + processed_len
+        source_start = ts_start + ts_len
+        payload_end = offset + size - 1
+        return EventRecord(
+            mm[start:id_start].decode(),
+            mm[id_start:id_start + id_len].decode(),
+            mm[ts_start:source_start].decode(),
+            mm[source_start:source_start + source_len].decode(),
+            payload_json=mm[payload_end - payload_len:payload_end].decode()
+        )
+
+    def _position(self, index: _TopicIndex, processed_at: str, event_id: str) -> int:
+        """Posisi entry pertama dengan (processed_at, event_id) >= key (bisect)"""
+        target = _epoch(processed_at)
+        lo = bisect_left(index.processed, target)
+        hi = bisect_right(index.processed, target, lo)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            segment = self._segments[index.segment[mid]]
+            if self._fields(segment, index.offset[mid])[1] < event_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _select(
+        self,
+        topic: str,
+        limit: int,
+        before: Optional[Tuple[str, str]],
+        since: Optional[float],
+        until: Optional[float]
+    ) -> Tuple[List[Tuple[_Segment, int]], Optional[Tuple[str, str]]]:
+        """
+        Pilih record satu halaman (terbaru dulu) dari index (dipanggil dengan lock index)
+
+        Returns:
+            Tuple (list (segment, offset), key (processed_at, event_id) record
+            terakhir jika masih ada halaman berikutnya, atau None)
+        """
+        index = self._topics.get(topic)
+        if index is None:
+            return [], None
+        i = (len(index) if before is None else self._position(index, *before)) - 1
+        picked = []
+        event_ts = index.event_ts
+        while i >= 0 and len(picked) <= limit:
+            ts = event_ts[i]
+            # event_ts NaN (timestamp tidak bisa di-parse) tidak lolos filter
+            if (since is None or ts >= since) and (until is None or ts < until):
+                picked.append(i)
+            i -= 1
+
+        located = [(self._segments[index.segment[i]], index.offset[i]) for i in picked[:limit]]
+        if len(picked) <= limit:
+            return located, None
+        _, event_id, processed_at, _, _ = self._fields(*located[-1])
+        return located, (processed_at, event_id)
+
+    def read(
+        self,
+        topic: str,
+        limit: int,
+        before: Optional[Tuple[str, str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[EventRecord], Optional[Tuple[str, str]]]:
+        """
+        Ambil event satu topic, terbaru dulu
+
+        Args:
+            topic: Nama topic
+            limit: Maksimal jumlah event
+            before: Hanya event dengan (processed_at, event_id) < key ini
+            since: Filter timestamp event >= since (epoch seconds)
+            until: Filter timestamp event < until (epoch seconds)
+
+        Returns:
+            Tuple (list EventRecord, (processed_at, event_id) event terakhir
+            jika masih ada halaman berikutnya, atau None)
+
+        Raises:
+            ValueError: Jika processed_at di before tidak valid
+        """
+        with self._lock:
+            located, last = self._select(topic, limit, before, since, until)
+            return [self._record(segment, offset) for segment, offset in located], last
+
+    def read_json(
+        self,
+        topic: str,
+        limit: int,
+        before: Optional[Tuple[str, str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[memoryview], Optional[Tuple[str, str]]]:
+        """
+        Seperti read, tetapi hasilnya JSON event sebagai slice memoryview
+        langsung ke mmap segment (tanpa copy)
+
+        Slice tetap valid walaupun segment-nya kemudian dihapus retention.
+        """
+        with self._lock:
+            located, last = self._select(topic, limit, before, since, until)
+            views = []
+            for segment, offset in located:
+                _, _, _, start, end = self._fields(segment, offset)
+                views.append(memoryview(segment.mm)[start:end])
+            return views, last
+
+    def read_keyed(
+        self,
+        topic: str,
+        limit: int,
+        before: Optional[Tuple[str, str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        as_json: bool = False
+    ) -> Tuple[List[Tuple[str, str, Union[EventRecord, memoryview]]], bool]:
+        """
+        Seperti read (atau read_json jika as_json), tetapi tiap event disertai
+        key (processed_at, event_id) sehingga halaman beberapa log bisa di-merge
+
+        Returns:
+            Tuple (list (processed_at, event_id, event), True jika masih ada
+            halaman berikutnya)
+        """
+        with self._lock:
+            located, last = self._select(topic, limit, before, since, until)
+            entries = []
+            for segment, offset in located:
+                _, event_id, processed_at, start, end = self._fields(segment, offset)
+                event = memoryview(segment.mm)[start:end] if as_json else self._record(segment, offset)
+                entries.append((processed_at, event_id, event))
+            return entries, last is not None
+
+    def topic_summary(self, topics: Optional[Iterable[str]] = None) -> Dict[str, Tuple[int, str, str]]:
+        """
+        Ringkasan isi log per topic
+
+        Args:
+            topics: Topic yang diringkas (default: semua); topic tanpa record dilewati
+
+        Returns:
+            Dict topic -> (jumlah record, processed_at pertama, processed_at terakhir)
+        """
+        with self._lock:
+            summary = {}
+            for topic in self._topics if topics is None else topics:
+                index = self._topics.get(topic)
+                if index is None or not len(index):
+                    continue
+                first = self._fields(self._segments[index.segment[0]], index.offset[0])[2]
+                last = self._fields(self._segments[index.segment[-1]], index.offset[-1])[2]
+                summary[topic] = (len(index), first, last)
+            return summary
+
+    def iter_entries(self) -> Iterator[LogEntry]:
+        """
+        Iterasi semua record yang terlihat (urut append, yaitu urut
+        (processed_at, event_id))
+
+        Yields:
+            Tuple (processed_at, event_ts, record)
+        """
+        for segment in list(self._segments.values()):
+            offset = 0
+            while offset < segment.size:
+                _, _, processed_at, _, end = self._fields(segment, offset)
+                event_ts = _HEADER.unpack_from(segment.mm, offset)[2]
+                yield (
+                    processed_at,
+                    None if math.isnan(event_ts) else event_ts,
+                    self._record(segment, offset)
+                )
+                offset = end
+
+    def _segment_keys(self, segment: _Segment, offset: int, end: int) -> Iterator[Tuple[str, str]]:
+        while offset < end:
+            topic, event_id, _, _, offset = self._fields(segment, offset)
+            yield topic, event_id
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def detach_expired(self, cutoff: str) -> Optional[Tuple[int, Dict[str, int]]]:
+        """
+        Lepas segment tertua dari index jika semua record-nya lebih tua dari cutoff
+
+        Segment aktif tidak pernah di-expire. Setelah dilepas, record segment
+        tidak lagi terlihat reader; file dihapus lewat remove_segment setelah
+        key-nya dihapus dari dedup store.
+
+        Args:
+            cutoff: Batas processed_at (ISO8601)
+
+        Returns:
+            Tuple (base segment, jumlah record per topic), atau None
+        """
+        with self._lock:
+            segment = self._segments[min(self._segments)]
+            if (segment is self._active or segment.last_processed_at is None
+                    or segment.last_processed_at >= cutoff):
+                return None
+            for topic in segment.topic_counts:
+                index = self._topics[topic]
+                index.drop_segment(segment.base)
+                if not len(index):
+                    del self._topics[topic]
+            del self._segments[segment.base]
+            self._detached[segment.base] = segment
+            return segment.base, dict(segment.topic_counts)
+
+    def segment_keys(self, base: int, offset: int, limit: int) -> Tuple[List[Tuple[str, str]], Optional[int]]:
+        """
+        Baca (topic, event_id) dari segment yang sudah dilepas, per batch
+
+        Args:
+            base: Base segment dari detach_expired
+            offset: Offset awal (0 untuk batch pertama)
+            limit: Maksimal jumlah key
+
+        Returns:
+            Tuple (list key, offset batch berikutnya atau None jika habis)
+        """
+        segment = self._detached[base]
+        keys = []
+        while offset < segment.size and len(keys) < limit:
+            topic, event_id, _, _, offset = self._fields(segment, offset)
+            keys.append((topic, event_id))
+        return keys, offset if offset < segment.size else None
+
+    def remove_segment(self, base: int):
+        """Hapus file segment yang sudah dilepas"""
+        segment = self._detached.pop(base)
+        segment.release()
+        segment.path.unlink()
+        logger.debug(f"Removed expired event log segment {base}")
+
+    @property
+    def segment_count(self) -> int:
+        """Jumlah segment yang terlihat reader"""
+        return len(self._segments)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def clear(self):
+        """Hapus semua segment dan mulai log kosong"""
+        with self._lock:
+            for segment in [*self._segments.values(), *self._detached.values()]:
+                segment.release()
+                segment.path.unlink()
+            self._segments.clear()
+            self._detached.clear()
+            self._topics.clear()
+            self._pending.clear()
+            self._pending_start = None
+            self._last_processed_at = ""
+            self._active = self._create_segment(0, self.segment_bytes)
+
+    def close(self):
+        """fsync segment aktif, unmap semua segment dan lepas lock direktori"""
+        with self._lock:
+            if self._active is not None:
+                self._flush(self._active)
+            for segment in [*self._segments.values(), *self._detached.values()]:
+                segment.release()
+            self._segments.clear()
+            self._detached.clear()
+            self._topics.clear()
+            self._active = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
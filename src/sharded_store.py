@@ -0,0 +1,515 @@
+"""
+Dedup store yang di-shard ke beberapa file SQLite
+Key (topic, event_id) di-hash ke salah satu shard; tiap shard adalah
+DedupStore lengkap dengan koneksi writer dan lock sendiri, sehingga claim
+batch besar di-commit paralel per shard
+"""
+import heapq
+import logging
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Literal, Optional, Set, Tuple, Union
+from src.models import EventLike, EventRecord, TopicStats
+from src.key_cache import RecentKeyCache
+from src.dedup_store import (
+    COUNTER_NAMES,
+    DedupStore,
+    RetentionPolicy,
+    StorageProfile,
+    decode_cursor,
+    dedup_key_hash,
+    encode_cursor,
+)
+from src.segment_log import LogEntry
+
+logger = logging.getLogger(__name__)
+
+
+def shard_db_path(db_path: str, index: int, shards: int) -> str:
+    """
+    Path file SQLite satu shard
+
+    Jumlah shard ikut di nama file (dedup.shard0of4.db), sehingga layout
+    berbeda tidak pernah berbagi file dan reshard bisa menulis layout baru di
+    samping layout lama.
+
+    Args:
+        db_path: Path database tanpa shard (mis. data/dedup.db)
+        index: Nomor shard
+        shards: Jumlah shard
+
+    Returns:
+        Path file shard
+    """
+    path = Path(db_path)
+    return str(path.with_name(f"{path.stem}.shard{index}of{shards}{path.suffix}"))
+
+
+def shard_log_dir(event_log_dir: str, index: int, shards: int) -> str:
+    """Direktori segment log satu shard (subdirektori event_log_dir)"""
+    return str(Path(event_log_dir) / f"shard{index}of{shards}")
+
+
+def find_layouts(db_path: str) -> List[int]:
+    """
+    Cari layout shard yang sudah ada di disk untuk db_path
+
+    Args:
+        db_path: Path database tanpa shard
+
+    Returns:
+        List jumlah shard yang punya file (1 = db_path itu sendiri), urut naik
+    """
+    path = Path(db_path)
+    layouts: Set[int] = set()
+    # File kosong (mis. dibuat tempfile) belum berisi database
+    if path.exists() and path.stat().st_size > 0:
+        layouts.add(1)
+    pattern = re.compile(rf"{re.escape(path.stem)}\.shard\d+of(\d+){re.escape(path.suffix)}")
+    for candidate in path.parent.glob(f"{path.stem}.shard*of*{path.suffix}"):
+        match = pattern.fullmatch(candidate.name)
+        if match:
+            layouts.add(int(match.group(1)))
+    return sorted(layouts)
+
+
+def open_dedup_store(db_path: str, shards: int = 1, **kwargs) -> Union[DedupStore, "ShardedDedupStore"]:
+    """
+    Buka dedup store dengan jumlah shard tertentu
+
+    Menolak start jika data di disk memakai layout shard lain (key akan
+    di-route ke file yang salah dan duplikasi lolos); gunakan
+    python -m src.reshard untuk memindahkan data lebih dulu.
+
+    Args:
+        db_path: Path database tanpa shard
+        shards: Jumlah shard (1 = DedupStore biasa di db_path)
+        **kwargs: Argumen DedupStore lainnya
+
+    Returns:
+        DedupStore (shards = 1) atau ShardedDedupStore
+
+    Raises:
+        ValueError: Jika shards < 1 atau data ada di layout shard lain
+    """
+    if shards < 1:
+        raise ValueError("shards must be >= 1")
+    layouts = find_layouts(db_path)
+    others = [n for n in layouts if n != shards]
+    if others and shards not in layouts:
+        raise ValueError(
+            f"{db_path} has data in a {others[-1]}-shard layout; run "
+            f"python -m src.reshard --db-path {db_path} --from-shards {others[-1]} "
+            f"--to-shards {shards} first"
+        )
+    if others:
+        logger.warning(f"Ignoring stale shard layout(s) {others} at {db_path} (left over from reshard)")
+    if shards == 1:
+        return DedupStore(db_path=db_path, **kwargs)
+    return ShardedDedupStore(db_path=db_path, shards=shards, **kwargs)
+
+
+class ShardedDedupStore:
+    """
+    DedupStore yang dibagi ke beberapa shard SQLite berdasarkan hash key
+
+    Antarmuka sama dengan DedupStore. Key (topic, event_id) di-route dengan
+    dedup_key_hash, sehingga satu key (termasuk duplikasinya) selalu ke
+    shard yang sama dan dedup per shard sudah benar secara global.
+    claim_many memecah batch per shard lalu menjalankan claim_many tiap
+    shard paralel di thread pool; SQLite melepas GIL selama statement dan
+    commit, jadi transaksi shard benar-benar berjalan bersamaan.
+
+    Batch atomik per shard, bukan lintas shard: jika satu shard gagal, key
+    di shard lain yang sudah commit tetap tersimpan dan retry publisher
+    melihatnya sebagai duplikasi.
+
+    Query per topic di-fan-out ke semua shard dengan cursor yang sama lalu
+    di-merge urut (processed_at, event_id), sehingga format cursor dan
+    urutan halaman sama dengan DedupStore tanpa shard. Counter dan statistik
+    adalah gabungan semua shard. Key cache dipakai bersama; Bloom filter
+    per shard (capacity dibagi rata).
+    """
+
+    def __init__(
+        self,
+        db_path: str = "data/dedup.db",
+        shards: int = 4,
+        pool_size: int = 4,
+        profile: Optional[StorageProfile] = None,
+        key_cache_size: int = 10000,
+        key_cache_ttl: float = 300.0,
+        bloom_capacity: int = 0,
+        bloom_fp_rate: float = 0.01,
+        retention: Optional[RetentionPolicy] = None,
+        event_log_dir: Optional[str] = None,
+        segment_bytes: int = 64 * 1024 * 1024,
+        log_fsync_interval: float = 0.0
+    ):
+        """
+        Inisialisasi semua shard
+
+        Args:
+            db_path: Path database tanpa shard; file shard dinamai dengan
+                shard_db_path
+            shards: Jumlah shard
+            pool_size: Jumlah koneksi reader per shard
+            event_log_dir: Direktori segment log (satu subdirektori per shard)
+            Argumen lain sama dengan DedupStore (bloom_capacity untuk total key)
+        """
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
+
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.retention = retention or RetentionPolicy()
+        self.key_cache: Optional[RecentKeyCache] = (
+            RecentKeyCache(key_cache_size, key_cache_ttl) if key_cache_size > 0 else None
+        )
+        self.shards: List[DedupStore] = []
+        try:
+            for index in range(shards):
+                shard = DedupStore(
+                    db_path=shard_db_path(db_path, index, shards),
+                    pool_size=pool_size,
+                    profile=profile,
+                    key_cache_size=0,
+                    bloom_capacity=math.ceil(bloom_capacity / shards),
+                    bloom_fp_rate=bloom_fp_rate,
+                    retention=self.retention,
+                    event_log_dir=shard_log_dir(event_log_dir, index, shards) if event_log_dir else None,
+                    segment_bytes=segment_bytes,
+                    log_fsync_interval=log_fsync_interval
+                )
+                # Satu key selalu di shard yang sama, jadi cache bisa dipakai bersama
+                shard.key_cache = self.key_cache
+                self.shards.append(shard)
+        except BaseException:
+            for shard in self.shards:
+                shard.close()
+            raise
+        self.profile = self.shards[0].profile
+
+        # Satu thread writer per shard; reader sebanyak total koneksi reader
+        self._writers = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="dedup-shard-writer")
+        self._readers = ThreadPoolExecutor(
+            max_workers=shards * pool_size, thread_name_prefix="dedup-shard-reader"
+        )
+
+        logger.info(f"ShardedDedupStore initialized at {db_path} ({shards} shards)")
+
+    def shard_for(self, topic: str, event_id: str) -> int:
+        """
+        Nomor shard untuk key (stabil lintas restart)
+
+        Args:
+            topic: Nama topic
+            event_id: Identifier event
+
+        Returns:
+            Index shard
+        """
+        return int.from_bytes(dedup_key_hash(topic, event_id)[:8], "little") % len(self.shards)
+
+    def _run_all(self, executor: ThreadPoolExecutor, calls: List[Tuple[Callable, tuple]]) -> list:
+        """
+        Jalankan beberapa panggilan shard paralel dan tunggu semuanya selesai
+
+        Panggilan pertama dijalankan di thread caller (hemat satu hand-off).
+        Exception pertama di-raise setelah semua panggilan selesai, sehingga
+        tidak ada transaksi shard yang masih berjalan saat caller menerima error.
+        """
+        futures = [executor.submit(fn, *args) for fn, args in calls[1:]]
+        fn, args = calls[0]
+        try:
+            first = fn(*args)
+        finally:
+            wait(futures)
+        return [first, *(future.result() for future in futures)]
+
+    def _group(self, records: List[EventRecord]) -> Dict[int, List[int]]:
+        """Kelompokkan posisi record per shard (urutan input dipertahankan)"""
+        groups: Dict[int, List[int]] = {}
+        for i, record in enumerate(records):
+            groups.setdefault(self.shard_for(*record.key), []).append(i)
+        return groups
+
+    @property
+    def closed(self) -> bool:
+        """True jika store sudah di-close"""
+        return self.shards[0].closed
+
+    @property
+    def bloom(self):
+        """Bloom filter shard pertama (None jika nonaktif); statistik gabungan lewat filter_stats"""
+        return self.shards[0].bloom
+
+    def close(self):
+        """Tutup semua shard lalu matikan thread pool"""
+        for shard in self.shards:
+            shard.close()
+        self._writers.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        logger.info(f"ShardedDedupStore closed: {self.db_path}")
+
+    # ------------------------------------------------------------------
+    # Write path
+    # ------------------------------------------------------------------
+
+    def is_duplicate(self, event: EventLike) -> bool:
+        """DedupStore.is_duplicate pada shard milik key event"""
+        record = EventRecord.from_event(event)
+        return self.shards[self.shard_for(*record.key)].is_duplicate(record)
+
+    def claim(self, event: EventLike) -> bool:
+        """DedupStore.claim pada shard milik key event"""
+        record = EventRecord.from_event(event)
+        return self.shards[self.shard_for(*record.key)].claim(record)
+
+    def claim_many(self, events: List[EventLike]) -> List[bool]:
+        """
+        Claim batch event: satu transaksi per shard, shard di-commit paralel
+
+        Args:
+            events: List of Event/EventRecord objects
+
+        Returns:
+            List of bool sejajar dengan input (lihat DedupStore.claim_many)
+        """
+        if not events:
+            return []
+        records = [EventRecord.from_event(event) for event in events]
+        groups = self._group(records)
+        results = self._run_all(self._writers, [
+            (self.shards[index].claim_many, ([records[i] for i in positions],))
+            for index, positions in groups.items()
+        ])
+        inserted = [False] * len(records)
+        for positions, claimed in zip(groups.values(), results):
+            for i, is_new in zip(positions, claimed):
+                inserted[i] = is_new
+        return inserted
+
+    def mark_processed(self, event: EventLike) -> bool:
+        """Alias claim (lihat DedupStore.mark_processed)"""
+        return self.claim(event)
+
+    def mark_processed_many(self, events: List[EventLike]) -> List[bool]:
+        """Alias claim_many"""
+        return self.claim_many(events)
+
+    def import_events(self, entries: List[LogEntry]) -> int:
+        """
+        DedupStore.import_events, di-route per shard (paralel)
+
+        Args:
+            entries: List (processed_at, event_ts, record) urut (processed_at, event_id)
+
+        Returns:
+            Jumlah event yang di-insert
+        """
+        if not entries:
+            return 0
+        groups = self._group([record for _, _, record in entries])
+        return sum(self._run_all(self._writers, [
+            (self.shards[index].import_events, ([entries[i] for i in positions],))
+            for index, positions in groups.items()
+        ]))
+
+    def iter_events(self) -> Iterator[LogEntry]:
+        """Iterasi event semua shard, di-merge urut (processed_at, event_id)"""
+        return heapq.merge(
+            *(shard.iter_events() for shard in self.shards),
+            key=lambda entry: (entry[0], entry[2].event_id)
+        )
+
+    def add_counters(self, deltas: Dict[str, int]):
+        """Tambahkan ke counter lifetime (disimpan di shard pertama; counter dijumlah lintas shard)"""
+        self.shards[0].add_counters(deltas)
+
+    def checkpoint(self, mode: Literal["PASSIVE", "FULL", "RESTART", "TRUNCATE"] = "PASSIVE"):
+        """WAL checkpoint di semua shard"""
+        self._run_all(self._writers, [(shard.checkpoint, (mode,)) for shard in self.shards])
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def expire_batch(self, now: Optional[datetime] = None) -> int:
+        """
+        Satu batch expiry di setiap shard (paralel)
+
+        Jika ada shard yang masih menyisakan event lama, shard itu menghapus
+        retention.batch_size event sehingga totalnya >= batch_size; loop
+        "ulangi selama hasil >= batch_size" (compact, AsyncDedupStore.compact)
+        tetap berhenti hanya setelah semua shard habis.
+
+        Returns:
+            Total event yang dihapus di semua shard
+        """
+        return sum(self._run_all(self._writers, [(shard.expire_batch, (now,)) for shard in self.shards]))
+
+    def vacuum_step(self, pages: Optional[int] = None) -> int:
+        """Incremental vacuum di setiap shard; return total page yang dibebaskan"""
+        return sum(self._run_all(self._writers, [(shard.vacuum_step, (pages,)) for shard in self.shards]))
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """
+        Satu putaran compaction di semua shard (lihat DedupStore.compact)
+
+        Returns:
+            Total event yang dihapus
+        """
+        total = 0
+        while True:
+            expired = self.expire_batch(now)
+            total += expired
+            if expired < self.retention.batch_size:
+                break
+        self.vacuum_step()
+        return total
+
+    def retention_stats(self) -> dict:
+        """Metrik compaction gabungan semua shard"""
+        stats = [shard.retention_stats() for shard in self.shards]
+        return {
+            "expired_events": sum(s["expired_events"] for s in stats),
+            "vacuumed_pages": sum(s["vacuumed_pages"] for s in stats),
+            "compaction_seconds": round(sum(s["compaction_seconds"] for s in stats), 4)
+        }
+
+    def filter_stats(self) -> dict:
+        """Statistik Bloom filter gabungan (fill ratio rata-rata, FP rate dari total lookup)"""
+        if self.bloom is None:
+            return {"fill_ratio": 0.0, "measured_fp_rate": 0.0}
+        negatives = false_positives = 0
+        for shard in self.shards:
+            with shard.lock:
+                negatives += shard.bloom_negatives
+                false_positives += shard.bloom_false_positives
+        absent_lookups = negatives + false_positives
+        return {
+            "fill_ratio": round(sum(shard.bloom.fill_ratio() for shard in self.shards) / len(self.shards), 4),
+            "measured_fp_rate": round(false_positives / absent_lookups if absent_lookups else 0.0, 4)
+        }
+
+    # ------------------------------------------------------------------
+    # Read path
+    # ------------------------------------------------------------------
+
+    def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[EventRecord]:
+        """Halaman pertama get_events_page"""
+        return self.get_events_page(topic, limit)[0]
+
+    def get_events_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[EventRecord], Optional[str]]:
+        """
+        Satu halaman event topic dari semua shard (lihat DedupStore.get_events_page)
+
+        Raises:
+            ValueError: Jika cursor tidak valid
+        """
+        return self._merged_page(topic, limit, cursor, since, until, as_json=False)
+
+    def get_events_json_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[Union[bytes, memoryview]], Optional[str]]:
+        """
+        Seperti get_events_page, tetapi tiap event sudah berupa JSON
+
+        Raises:
+            ValueError: Jika cursor tidak valid
+        """
+        return self._merged_page(topic, limit, cursor, since, until, as_json=True)
+
+    def _merged_page(self, topic, limit, cursor, since, until, as_json) -> Tuple[list, Optional[str]]:
+        """
+        Fan-out halaman ke semua shard lalu merge urut (processed_at, event_id) DESC
+
+        Setiap shard mengembalikan paling banyak limit event setelah cursor,
+        jadi limit event teratas hasil merge pasti lengkap. Halaman berikutnya
+        ada jika hasil merge lebih dari limit atau salah satu shard masih
+        punya event.
+        """
+        if self.closed:
+            raise RuntimeError("DedupStore is closed")
+        before = decode_cursor(cursor) if cursor is not None else None
+        try:
+            pages = self._run_all(self._readers, [
+                (shard.get_events_keyed, (topic, limit, before, since, until, as_json))
+                for shard in self.shards
+            ])
+        except ValueError as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+        merged = list(islice(
+            heapq.merge(*(entries for entries, _ in pages), key=itemgetter(0, 1), reverse=True),
+            limit
+        ))
+        has_more = any(more for _, more in pages) or sum(len(entries) for entries, _ in pages) > limit
+        next_cursor = encode_cursor(*merged[-1][:2]) if has_more and merged else None
+        return [event for _, _, event in merged], next_cursor
+
+    # ------------------------------------------------------------------
+    # Statistik
+    # ------------------------------------------------------------------
+
+    def get_counters(self) -> Dict[str, int]:
+        """Counter lifetime (jumlah semua shard)"""
+        totals = dict.fromkeys(COUNTER_NAMES, 0)
+        for shard in self.shards:
+            for name, value in shard.get_counters().items():
+                totals[name] += value
+        return totals
+
+    def get_topic_stats(self) -> List[TopicStats]:
+        """
+        Counter per topic gabungan semua shard
+
+        Returns:
+            List of TopicStats, urut nama topic
+        """
+        merged: Dict[str, TopicStats] = {}
+        for shard in self.shards:
+            for stats in shard.get_topic_stats():
+                current = merged.get(stats.topic)
+                if current is None:
+                    merged[stats.topic] = stats
+                    continue
+                current.count += stats.count
+                current.first_processed_at = min(
+                    filter(None, (current.first_processed_at, stats.first_processed_at)), default=None
+                )
+                current.last_processed_at = max(
+                    filter(None, (current.last_processed_at, stats.last_processed_at)), default=None
+                )
+        return [stats for _, stats in sorted(merged.items())]
+
+    def get_all_topics(self) -> Set[str]:
+        """Semua topic di semua shard"""
+        return set().union(*(shard.get_all_topics() for shard in self.shards))
+
+    def get_total_processed(self) -> int:
+        """Total event tersimpan di semua shard"""
+        return sum(shard.get_total_processed() for shard in self.shards)
+
+    def clear(self):
+        """Hapus semua data di semua shard (untuk testing)"""
+        for shard in self.shards:
+            shard.clear()
@@ -0,0 +1,91 @@
+"""
+Antarmuka storage backend untuk dedup store
+EventProcessor, AsyncDedupStore dan export hanya memakai operasi di protokol
+ini, sehingga engine penyimpanan bisa diganti tanpa mengubah pipeline
+"""
+from datetime import datetime
+from typing import Dict, List, Literal, Optional, Protocol, Set, Tuple, Union, runtime_checkable
+from src.models import EventLike, EventRecord, TopicStats
+from src.key_cache import RecentKeyCache
+from src.dedup_store import RetentionPolicy
+
+# Engine yang bisa dipilih lewat --storage-engine / DEDUP_STORAGE_ENGINE
+STORAGE_ENGINES = ("sqlite", "memory", "lmdb")
+
+
+@runtime_checkable
+class DedupBackend(Protocol):
+    """
+    Operasi yang wajib disediakan engine dedup store
+
+    Semantik mengikuti DedupStore (engine SQLite): claim_many atomik per
+    batch dan sejajar dengan input, halaman /events urut (processed_at,
+    event_id) terbaru dulu dengan cursor opaque, counter lifetime dan per
+    topic dari memory, expiry per batch sesuai retention. Method dipanggil
+    dari thread (lihat AsyncDedupStore), jadi engine harus thread-safe.
+
+    Attributes:
+        retention: RetentionPolicy engine (compaction aktif jika enabled)
+        pool_size: Jumlah thread reader yang masuk akal untuk engine ini
+        key_cache: Cache key yang baru diproses (None jika engine tidak memakainya)
+    """
+    retention: RetentionPolicy
+    pool_size: int
+    key_cache: Optional[RecentKeyCache]
+
+    @property
+    def closed(self) -> bool: ...
+
+    def close(self): ...
+
+    def clear(self): ...
+
+    # Write path
+    def claim(self, event: EventLike) -> bool: ...
+
+    def claim_many(self, events: List[EventLike]) -> List[bool]: ...
+
+    def is_duplicate(self, event: EventLike) -> bool: ...
+
+    def checkpoint(self, mode: Literal["PASSIVE", "FULL", "RESTART", "TRUNCATE"] = "PASSIVE"): ...
+
+    # Query per topic
+    def get_events_by_topic(self, topic: str, limit: int = 1000) -> List[EventRecord]: ...
+
+    def get_events_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[EventRecord], Optional[str]]: ...
+
+    def get_events_json_page(
+        self,
+        topic: str,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[Union[bytes, memoryview]], Optional[str]]: ...
+
+    # Statistik
+    def get_counters(self) -> Dict[str, int]: ...
+
+    def get_topic_stats(self) -> List[TopicStats]: ...
+
+    def get_all_topics(self) -> Set[str]: ...
+
+    def get_total_processed(self) -> int: ...
+
+    def filter_stats(self) -> dict: ...
+
+    # Retention
+    def expire_batch(self, now: Optional[datetime] = None) -> int: ...
+
+    def vacuum_step(self, pages: Optional[int] = None) -> int: ...
+
+    def compact(self, now: Optional[datetime] = None) -> int: ...
+
+    def retention_stats(self) -> dict: ...
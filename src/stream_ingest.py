@@ -0,0 +1,331 @@
+"""
+Ingestion streaming NDJSON (newline-delimited JSON)
+Body request dibaca per chunk, di-decompress dan di-parse per baris lalu
+di-submit ke processor per batch kecil, sehingga memory tetap terbatas
+berapapun ukuran body
+"""
+import logging
+import zlib
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from pydantic import ValidationError
+from src.models import EventRecord
+from src.event_processor import EventProcessor, QueueFullError
+from src.wire import validate_event_json
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependency opsional
+    zstandard = None
+
+# Batas output decompress per langkah (mencegah decompression bomb)
+_DECOMPRESS_STEP = 64 * 1024
+
+
+class UnsupportedEncodingError(ValueError):
+    """Content-Encoding tidak didukung (atau dependency-nya tidak terpasang)"""
+
+
+class CorruptBodyError(ValueError):
+    """Body terkompresi rusak atau terpotong"""
+
+
+class StreamInterruptedError(Exception):
+    """
+    Stream dihentikan di tengah jalan karena processor menolak batch (backpressure)
+
+    Attributes:
+        cause: QueueFullError dari processor
+        result: Counter stream sampai batch terakhir yang diterima
+        resume_from_line: Nomor baris pertama yang belum diterima (untuk retry)
+    """
+
+    def __init__(self, cause: QueueFullError, result: Dict, resume_from_line: int):
+        super().__init__(str(cause))
+        self.cause = cause
+        self.result = result
+        self.resume_from_line = resume_from_line
+
+
+class _GzipDecoder:
+    """Decoder gzip/deflate incremental dengan output dibatasi per langkah"""
+
+    def __init__(self, wbits: int):
+        self._wbits = wbits
+        self._obj = zlib.decompressobj(wbits)
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        try:
+            yield from self._decode(data)
+        except zlib.error as e:
+            raise CorruptBodyError(f"Invalid compressed body: {e}") from e
+
+    def _decode(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            yield self._obj.decompress(data, _DECOMPRESS_STEP)
+            data = self._obj.unconsumed_tail
+            if self._obj.eof and self._obj.unused_data:
+                # Multi-member gzip (mis. hasil concat beberapa file .gz)
+                data = self._obj.unused_data
+                self._obj = zlib.decompressobj(self._wbits)
+
+    def flush(self) -> Iterator[bytes]:
+        # Argumen length di zlib flush() hanya ukuran buffer awal, bukan batas
+        # output: sisa input dikuras dulu lewat decompress bertahap, flush()
+        # baru dipanggil setelah tidak ada input tertunda
+        yield from self.decode(self._obj.unconsumed_tail)
+        if not self._obj.eof:
+            raise CorruptBodyError("Invalid compressed body: truncated stream")
+        yield self._obj.flush()
+
+
+class _NeedInput(Exception):
+    """Input zstd yang sudah diterima habis sebelum body selesai"""
+
+
+class _PendingInput:
+    """Sumber input stream_reader zstd yang diisi per chunk body"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.finished = False
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.buffer:
+            if self.finished:
+                return b""
+            # Bukan EOF: stream_reader menganggap b"" sebagai akhir input
+            raise _NeedInput()
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class _ZstdDecoder:
+    """Decoder zstd incremental dengan output dibatasi per langkah (membutuhkan package zstandard)"""
+
+    def __init__(self):
+        self._input = _PendingInput()
+        self._reader = zstandard.ZstdDecompressor().stream_reader(
+            self._input, read_size=_DECOMPRESS_STEP, read_across_frames=True
+        )
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        self._input.buffer += data
+        return self._drain()
+
+    def _drain(self) -> Iterator[bytes]:
+        # read1 hanya membaca sumber saat belum ada output, jadi _NeedInput
+        # tidak pernah membuang output yang sudah di-decompress
+        try:
+            while True:
+                piece = self._reader.read1(_DECOMPRESS_STEP)
+                if not piece:
+                    return
+                yield piece
+        except _NeedInput:
+            return
+        except zstandard.ZstdError as e:
+            raise CorruptBodyError(f"Invalid compressed body: {e}") from e
+
+    def flush(self) -> Iterator[bytes]:
+        self._input.finished = True
+        return self._drain()
+
+
+class _IdentityDecoder:
+    """Body tanpa kompresi"""
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        return iter((data,))
+
+    def flush(self) -> Iterator[bytes]:
+        return iter(())
+
+
+def make_decoder(content_encoding: Optional[str]):
+    """
+    Buat decoder untuk Content-Encoding request
+
+    Args:
+        content_encoding: Nilai header Content-Encoding (None/identity/gzip/deflate/zstd)
+
+    Returns:
+        Decoder dengan method decode(bytes) dan flush(), keduanya iterator
+        potongan output berukuran maksimal _DECOMPRESS_STEP
+
+    Raises:
+        UnsupportedEncodingError: Jika encoding tidak didukung (zstd tanpa
+            package zstandard juga ditolak, dipetakan ke 415)
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return _IdentityDecoder()
+    if encoding in ("gzip", "x-gzip"):
+        return _GzipDecoder(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _GzipDecoder(zlib.MAX_WBITS)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise UnsupportedEncodingError("zstd encoding requires the 'zstandard' package")
+        return _ZstdDecoder()
+    raise UnsupportedEncodingError(f"Unsupported Content-Encoding: {content_encoding}")
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str] = None,
+    max_line_bytes: int = 1024 * 1024
+) -> AsyncIterator[Optional[bytes]]:
+    """
+    Decompress dan pecah body menjadi baris
+
+    Buffer hanya menyimpan satu baris yang belum lengkap. Baris yang lebih
+    panjang dari max_line_bytes dibuang sampai newline berikutnya dan
+    dilaporkan sebagai None (sehingga nomor baris tetap konsisten).
+
+    Args:
+        chunks: Async iterator chunk body mentah
+        content_encoding: Header Content-Encoding
+        max_line_bytes: Panjang maksimal satu baris
+
+    Yields:
+        Isi baris (tanpa newline), atau None untuk baris yang terlalu panjang
+    """
+    decoder = make_decoder(content_encoding)
+    buffer = bytearray()
+    oversized = False
+
+    def split(piece: bytes):
+        nonlocal buffer, oversized
+        start = 0
+        while True:
+            newline = piece.find(b"\n", start)
+            if newline < 0:
+                break
+            if oversized:
+                yield None
+            else:
+                buffer += piece[start:newline]
+                yield bytes(buffer)
+            buffer = bytearray()
+            oversized = False
+            start = newline + 1
+        if not oversized:
+            buffer += piece[start:]
+            if len(buffer) > max_line_bytes:
+                buffer = bytearray()
+                oversized = True
+
+    async for chunk in chunks:
+        for piece in decoder.decode(chunk):
+            for line in split(piece):
+                yield line
+    for piece in decoder.flush():
+        for line in split(piece):
+            yield line
+
+    if oversized:
+        yield None
+    elif buffer:
+        yield bytes(buffer)
+
+
+async def ingest_ndjson(
+    processor: EventProcessor,
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str] = None,
+    batch_size: int = 500,
+    max_line_bytes: int = 1024 * 1024,
+    max_rejected_lines: int = 1000,
+    trusted: bool = False
+) -> Dict:
+    """
+    Parse stream NDJSON dan submit event ke processor per batch
+
+    Satu baris = satu event JSON. Baris kosong diabaikan, baris yang tidak
+    valid (JSON rusak, skema Event tidak cocok, terlalu panjang) ditolak
+    tanpa menggagalkan stream. Batch di-submit sebelum chunk berikutnya
+    dibaca, sehingga backpressure processor ikut menahan pembacaan body.
+
+    Args:
+        processor: EventProcessor tujuan
+        chunks: Async iterator chunk body mentah
+        content_encoding: Header Content-Encoding
+        batch_size: Jumlah event per submit ke processor
+        max_line_bytes: Panjang maksimal satu baris
+        max_rejected_lines: Maksimal nomor baris ditolak yang dicatat di response
+        trusted: Validasi fast path untuk producer terpercaya
+
+    Returns:
+        Dict dengan lines, received, processed, duplicates, rejected dan rejected_lines
+
+    Raises:
+        UnsupportedEncodingError: Jika Content-Encoding tidak didukung
+        CorruptBodyError: Jika body terkompresi rusak
+        StreamInterruptedError: Jika processor menolak batch (queue penuh)
+    """
+    result = {
+        "lines": 0,
+        "received": 0,
+        "processed": 0,
+        "duplicates": 0,
+        "rejected": 0,
+        "rejected_lines": []
+    }
+    batch: List[EventRecord] = []
+    batch_first_line = 1
+
+    def reject(line_no: int):
+        result["rejected"] += 1
+        if len(result["rejected_lines"]) < max_rejected_lines:
+            result["rejected_lines"].append(line_no)
+
+    async def flush():
+        nonlocal batch
+        if not batch:
+            return
+        try:
+            submitted = await processor.submit_events(batch)
+        except QueueFullError as e:
+            raise StreamInterruptedError(e, result, batch_first_line) from e
+        result["received"] += submitted["received"]
+        result["processed"] += submitted["processed"]
+        result["duplicates"] += submitted["duplicates"]
+        batch = []
+
+    async for line in iter_lines(chunks, content_encoding, max_line_bytes):
+        result["lines"] += 1
+        line_no = result["lines"]
+        if not batch:
+            batch_first_line = line_no
+
+        if line is None:
+            reject(line_no)
+            continue
+        if not line.strip():
+            continue
+
+        try:
+            record = EventRecord.from_event(validate_event_json(line, trusted))
+            # NaN/Infinity lolos parser JSON tapi tidak bisa disimpan sebagai JSON valid
+            record.payload_json
+        except (ValidationError, ValueError):
+            # JSON rusak juga dilaporkan sebagai ValidationError (json_invalid)
+            reject(line_no)
+            continue
+        batch.append(record)
+
+        if len(batch) >= batch_size:
+            await flush()
+
+    await flush()
+
+    logger.info(
+        f"NDJSON stream ingested: {result['lines']} lines, {result['processed']} queued, "
+        f"{result['duplicates']} duplicates, {result['rejected']} rejected"
+    )
+    return result
@@ -0,0 +1,224 @@
+"""
+Wire format dan content negotiation untuk endpoint publish/query
+Mendukung JSON (default) dan MessagePack (lebih ringkas dan lebih murah
+di-encode/decode untuk batch besar)
+"""
+import math
+from typing import Any, Dict, List, Optional, Union
+from fastapi import Response
+from pydantic import StringConstraints, TypeAdapter
+from typing_extensions import Annotated, NotRequired, TypedDict
+from src.models import Event, EventRecord
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependency opsional
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_ALIASES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+# Validasi body publish tanpa melewati json.loads + model per field di FastAPI
+publish_adapter: TypeAdapter = TypeAdapter(Union[Event, List[Event]])
+
+# Bentuk ISO8601 (tanggal, jam opsional, offset opsional). Hanya mengecek format,
+# bukan rentang nilai seperti datetime.fromisoformat
+ISO8601_PATTERN = (
+    r"^\d{4}-\d{2}-\d{2}"
+    r"(?:[T ]\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:Z|[+-]\d{2}(?::?\d{2})?)?)?$"
+)
+
+_Name = Annotated[str, StringConstraints(min_length=1, max_length=255)]
+
+
+class _TrustedEvent(TypedDict):
+    """Skema Event untuk fast path: seluruh constraint dicek di pydantic-core (tanpa validator Python)"""
+    topic: _Name
+    event_id: Annotated[str, StringConstraints(min_length=1, max_length=255, pattern=r"\S")]
+    timestamp: Annotated[str, StringConstraints(pattern=ISO8601_PATTERN)]
+    source: _Name
+    payload: NotRequired[Dict[str, Any]]
+
+
+# Fast path untuk producer terpercaya: satu TypeAdapter atas seluruh batch,
+# hasilnya dict yang dibungkus EventRecord (tanpa model Event per item)
+trusted_publish_adapter: TypeAdapter = TypeAdapter(Union[_TrustedEvent, List[_TrustedEvent]])
+trusted_event_adapter: TypeAdapter = TypeAdapter(_TrustedEvent)
+
+
+class UnsupportedMediaTypeError(ValueError):
+    """Media type tidak didukung (atau dependency-nya tidak terpasang)"""
+
+
+class InvalidBodyError(ValueError):
+    """Body MessagePack rusak (tidak bisa di-decode) atau berisi tipe non-JSON"""
+
+
+def _media_type(header: Optional[str]) -> str:
+    """Ambil media type tanpa parameter (charset dsb) dalam lowercase"""
+    return (header or "").split(";", 1)[0].strip().lower()
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    """
+    Check apakah header Content-Type/Accept berisi media type MessagePack
+
+    Args:
+        content_type: Nilai header
+
+    Returns:
+        True jika MessagePack
+    """
+    return _media_type(content_type) in _MSGPACK_ALIASES
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """
+    Check apakah client meminta response MessagePack lewat header Accept
+
+    Args:
+        accept: Nilai header Accept (boleh berisi beberapa media type)
+
+    Returns:
+        True jika salah satu media type di Accept adalah MessagePack
+    """
+    return any(is_msgpack(part) for part in (accept or "").split(","))
+
+
+def _require_msgpack():
+    if msgpack is None:
+        raise UnsupportedMediaTypeError("MessagePack support requires the 'msgpack' package")
+
+
+def _check_json_value(value: Any, path: str = "$"):
+    """
+    Pastikan hasil decode MessagePack hanya berisi tipe yang bisa direpresentasikan JSON
+
+    MessagePack punya tipe tanpa padanan JSON (bin, ext, timestamp) dan map
+    dengan key non-string. Tanpa cek ini payload lolos validasi Dict[str, Any]
+    lalu gagal di json.dumps saat claim, sehingga seluruh batch hilang.
+
+    Args:
+        value: Nilai hasil msgpack.unpackb
+        path: Lokasi nilai untuk pesan error
+
+    Raises:
+        InvalidBodyError: Jika ada nilai yang tidak bisa direpresentasikan JSON
+    """
+    if value is None or isinstance(value, (str, bool, int)):
+        return
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise InvalidBodyError(f"Invalid MessagePack body: non-finite float at {path}")
+        return
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            _check_json_value(item, f"{path}[{i}]")
+        return
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise InvalidBodyError(
+                    f"Invalid MessagePack body: map key at {path} must be a string, got {type(key).__name__}"
+                )
+            _check_json_value(item, f"{path}.{key}")
+        return
+    # bytes (bin), msgpack.ExtType (ext), msgpack.Timestamp
+    raise InvalidBodyError(
+        f"Invalid MessagePack body: {type(value).__name__} value at {path} is not representable as JSON"
+    )
+
+
+def _construct(data: Union[dict, List[dict]]) -> Union[EventRecord, List[EventRecord]]:
+    """Bungkus dict yang sudah tervalidasi fast path menjadi EventRecord"""
+    if isinstance(data, list):
+        return [EventRecord(**item) for item in data]
+    return EventRecord(**data)
+
+
+def validate_event_json(data: bytes, trusted: bool = False) -> Union[Event, EventRecord]:
+    """
+    Validasi satu event JSON (satu baris NDJSON)
+
+    Args:
+        data: JSON satu event
+        trusted: Gunakan fast path (regex timestamp, tanpa validator Python)
+
+    Returns:
+        Event, atau EventRecord untuk fast path
+
+    Raises:
+        pydantic.ValidationError: Jika event tidak valid
+    """
+    if trusted:
+        return EventRecord(**trusted_event_adapter.validate_json(data))
+    return Event.model_validate_json(data)
+
+
+def decode_publish_body(
+    body: bytes,
+    content_type: Optional[str],
+    trusted: bool = False
+) -> Union[Event, EventRecord, List[Event], List[EventRecord]]:
+    """
+    Decode dan validasi body /publish sesuai Content-Type
+
+    Validasi memakai model Event yang sama untuk JSON dan MessagePack. Dengan
+    trusted=True, batch divalidasi lewat fast path: constraint yang sama
+    (panjang field, event_id tidak kosong) tetapi timestamp hanya dicek
+    bentuknya dengan regex ISO8601, dan hasilnya EventRecord ringan.
+
+    Args:
+        body: Body request mentah
+        content_type: Header Content-Type
+        trusted: Gunakan fast path untuk producer terpercaya
+
+    Returns:
+        Single Event atau List of Events (EventRecord untuk fast path)
+
+    Raises:
+        UnsupportedMediaTypeError: Jika Content-Type tidak didukung
+        InvalidBodyError: Jika body MessagePack rusak atau berisi tipe tanpa padanan
+            JSON (bin, ext, float non-finite, key map non-string)
+        pydantic.ValidationError: Jika body tidak valid
+    """
+    adapter = trusted_publish_adapter if trusted else publish_adapter
+    media_type = _media_type(content_type)
+    if media_type in ("", JSON_MEDIA_TYPE) or media_type.endswith("+json"):
+        events = adapter.validate_json(body)
+    elif media_type in _MSGPACK_ALIASES:
+        _require_msgpack()
+        try:
+            data = msgpack.unpackb(body, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            # ExtraData/FormatError turunan ValueError, body terpotong -> UnpackException
+            raise InvalidBodyError(f"Invalid MessagePack body: {e}") from e
+        _check_json_value(data)
+        events = adapter.validate_python(data)
+    else:
+        raise UnsupportedMediaTypeError(f"Unsupported Content-Type: {content_type}")
+    return _construct(events) if trusted else events
+
+
+def encode_response(model, accept: Optional[str]) -> Response:
+    """
+    Encode model response sesuai header Accept
+
+    Args:
+        model: Pydantic model response
+        accept: Header Accept dari request
+
+    Returns:
+        Response JSON (default) atau MessagePack
+
+    Raises:
+        UnsupportedMediaTypeError: Jika MessagePack diminta tapi tidak tersedia
+    """
+    if wants_msgpack(accept):
+        _require_msgpack()
+        return Response(
+            content=msgpack.packb(model.model_dump(mode="python"), use_bin_type=True),
+            media_type=MSGPACK_MEDIA_TYPE
+        )
+    return Response(content=model.model_dump_json(), media_type=JSON_MEDIA_TYPE)
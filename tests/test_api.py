@@ -19,8 +19,10 @@ def temp_db():
     
     yield db_path
     
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    # Hapus juga file WAL/shared-memory
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.unlink(path)
 
 
 @pytest.fixture
@@ -166,6 +168,33 @@ def test_get_stats(client):
     assert "topics" in data
     assert "uptime_seconds" in data
     assert "duplicate_rate" in data
+    assert "cache_hits" in data
+    assert "cache_misses" in data
+    assert data["partitions"][0]["partition"] == 0
+    assert data["stored_events"] == 0
+    assert data["topic_stats"] == []
+
+
+def test_stats_per_topic_counts(client):
+    """Test: /stats mengembalikan jumlah event per topic"""
+    events = [
+        {
+            "topic": f"stats-{i % 2}",
+            "event_id": f"evt-{i}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "test"
+        }
+        for i in range(5)
+    ]
+    assert client.post("/publish", json=events + events[:1]).status_code == 200
+    
+    data = client.get("/stats").json()
+    assert data["stored_events"] == 5
+    assert data["received"] == 6
+    assert data["unique_processed"] == 5
+    assert data["duplicate_dropped"] == 1
+    assert sorted(data["topics"]) == ["stats-0", "stats-1"]
+    assert {t["topic"]: t["count"] for t in data["topic_stats"]} == {"stats-0": 3, "stats-1": 2}
 
 
 def test_invalid_event_schema(client):
@@ -185,3 +214,509 @@ def test_empty_event_list(client):
     """Test: Empty event list ditolak"""
     response = client.post("/publish", json=[])
     assert response.status_code == 400
+
+
+def test_publish_counts_concurrent_publishers(client):
+    """Test: Count processed/duplicates akurat untuk publisher paralel dengan key sama"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    events = [
+        {
+            "topic": "concurrent-publish",
+            "event_id": f"evt-{i}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "test",
+            "payload": {"index": i}
+        }
+        for i in range(50)
+    ]
+    
+    def publish(_):
+        response = client.post("/publish", json=events)
+        assert response.status_code == 200
+        return response.json()
+    
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(publish, range(8)))
+    
+    assert sum(r["received"] for r in results) == 8 * 50
+    assert sum(r["processed"] for r in results) == 50
+    assert sum(r["duplicates"] for r in results) == 7 * 50
+    
+    stats = client.get("/stats").json()
+    assert stats["unique_processed"] == 50
+    assert stats["duplicate_dropped"] == 7 * 50
+
+
+def test_publish_returns_429_when_queue_full(temp_db):
+    """Test: /publish mengembalikan 429 + Retry-After saat queue penuh"""
+    store = DedupStore(db_path=temp_db)
+    proc = EventProcessor(store, max_queue_events=5, enqueue_timeout=0, retry_after=2.5)
+    client = TestClient(create_app(proc))
+    
+    # Processor belum di-start, jadi queue tidak pernah di-drain
+    events = [
+        {
+            "topic": "bp",
+            "event_id": f"evt-{i}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "test",
+            "payload": {}
+        }
+        for i in range(10)
+    ]
+    
+    assert client.post("/publish", json=events[:5]).status_code == 200
+    
+    response = client.post("/publish", json=events[5:7])
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    
+    response = client.post("/publish", json=events)
+    assert response.status_code == 413
+    
+    stats = client.get("/stats").json()
+    assert stats["rejected_requests"] == 2
+    assert stats["queue_depth"] == 5
+    store.close()
+
+
+def _ndjson(events):
+    """Helper: encode list of dict menjadi body NDJSON"""
+    import json
+    return "".join(json.dumps(e) + "\n" for e in events).encode()
+
+
+def test_publish_stream_ndjson(client):
+    """Test: /publish/stream memproses NDJSON dan melaporkan baris yang ditolak"""
+    import json
+    
+    lines = [
+        json.dumps({
+            "topic": "stream",
+            "event_id": f"evt-{i}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "test",
+            "payload": {"index": i}
+        })
+        for i in range(5)
+    ]
+    lines.insert(2, "{not json")
+    lines.insert(4, "")
+    lines.append(json.dumps({"topic": "stream", "event_id": "no-timestamp", "source": "test"}))
+    lines.append(lines[0])  # duplikasi
+    body = "\n".join(lines).encode()  # baris terakhir tanpa newline
+    
+    response = client.post(
+        "/publish/stream", content=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["lines"] == 9
+    assert data["received"] == 6
+    assert data["processed"] == 5
+    assert data["duplicates"] == 1
+    assert data["rejected"] == 2
+    assert data["rejected_lines"] == [3, 8]
+    
+    events = client.get("/events?topic=stream").json()
+    assert events["count"] == 5
+
+
+def test_publish_stream_gzip(client):
+    """Test: /publish/stream menerima body gzip yang dikirim per chunk"""
+    import gzip
+    
+    events = [
+        {
+            "topic": "stream-gzip",
+            "event_id": f"evt-{i}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "test",
+            "payload": {"data": "x" * 100}
+        }
+        for i in range(2000)
+    ]
+    compressed = gzip.compress(_ndjson(events))
+    
+    def chunks():
+        for i in range(0, len(compressed), 997):
+            yield compressed[i:i + 997]
+    
+    response = client.post(
+        "/publish/stream", content=chunks(), headers={"Content-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["received"] == 2000
+    assert data["processed"] == 2000
+    assert data["rejected"] == 0
+
+
+def test_publish_stream_bad_encoding(client):
+    """Test: Content-Encoding tidak dikenal -> 415, gzip rusak -> 400"""
+    response = client.post(
+        "/publish/stream", content=b"{}\n", headers={"Content-Encoding": "br"}
+    )
+    assert response.status_code == 415
+    
+    response = client.post(
+        "/publish/stream", content=b"definitely not gzip", headers={"Content-Encoding": "gzip"}
+    )
+    assert response.status_code == 400
+    
+    response = client.post("/publish/stream", content=b"\n\n")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "deflate", "zstd"])
+def test_stream_decoder_output_bounded(encoding):
+    """Test: Output decompress dibatasi per langkah (decompression bomb), body terpotong ditolak"""
+    import zlib
+    from src.stream_ingest import make_decoder, CorruptBodyError, _DECOMPRESS_STEP
+    
+    raw = b"\0" * (20 * 1024 * 1024)
+    if encoding == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        compressed = zstandard.ZstdCompressor().compress(raw) + zstandard.ZstdCompressor().compress(b"tail")
+        raw += b"tail"
+    else:
+        wbits = 16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS
+        obj = zlib.compressobj(wbits=wbits)
+        compressed = obj.compress(raw) + obj.flush()
+    
+    decoder = make_decoder(encoding)
+    total = 0
+    for i in range(0, len(compressed), 4096):
+        for piece in decoder.decode(compressed[i:i + 4096]):
+            assert len(piece) <= _DECOMPRESS_STEP
+            total += len(piece)
+    for piece in decoder.flush():
+        assert len(piece) <= _DECOMPRESS_STEP
+        total += len(piece)
+    assert total == len(raw)
+    
+    if encoding != "zstd":
+        decoder = make_decoder(encoding)
+        with pytest.raises(CorruptBodyError):
+            for _ in decoder.decode(compressed[:len(compressed) // 2]):
+                pass
+            for _ in decoder.flush():
+                pass
+
+
+def test_publish_stream_zstd(client):
+    """Test: /publish/stream menerima body zstd (415 jika zstandard tidak terpasang)"""
+    try:
+        import zstandard
+    except ImportError:
+        response = client.post(
+            "/publish/stream", content=b"{}\n", headers={"Content-Encoding": "zstd"}
+        )
+        assert response.status_code == 415
+        return
+    
+    events = [
+        {
+            "topic": "stream-zstd",
+            "event_id": f"evt-{i}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "test",
+            "payload": {"data": "x" * 100}
+        }
+        for i in range(500)
+    ]
+    response = client.post(
+        "/publish/stream",
+        content=zstandard.ZstdCompressor().compress(_ndjson(events)),
+        headers={"Content-Encoding": "zstd"}
+    )
+    assert response.status_code == 200
+    assert response.json()["processed"] == 500
+    
+    response = client.post(
+        "/publish/stream", content=b"definitely not zstd", headers={"Content-Encoding": "zstd"}
+    )
+    assert response.status_code == 400
+
+
+def test_publish_stream_429_reports_resume_line(temp_db):
+    """Test: Stream yang terkena backpressure melaporkan baris untuk melanjutkan"""
+    store = DedupStore(db_path=temp_db)
+    proc = EventProcessor(store, max_queue_events=600, enqueue_timeout=0)
+    client = TestClient(create_app(proc))
+    
+    events = [
+        {
+            "topic": "stream-bp",
+            "event_id": f"evt-{i}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "test",
+            "payload": {}
+        }
+        for i in range(1200)
+    ]
+    
+    # Batch default 500: batch pertama masuk, batch kedua ditolak
+    response = client.post("/publish/stream", content=_ndjson(events))
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    detail = response.json()["detail"]
+    assert detail["processed"] == 500
+    assert detail["resume_from_line"] == 501
+    store.close()
+
+
+def test_publish_and_query_msgpack(client):
+    """Test: /publish menerima MessagePack dan /events mengembalikan MessagePack"""
+    msgpack = pytest.importorskip("msgpack")
+    
+    events = [
+        {
+            "topic": "msgpack",
+            "event_id": f"evt-{i}",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "test",
+            "payload": {"index": i, "tags": ["a", "b"]}
+        }
+        for i in range(3)
+    ]
+    
+    response = client.post(
+        "/publish",
+        content=msgpack.packb(events + events[:1]),
+        headers={"Content-Type": "application/msgpack", "Accept": "application/msgpack"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    data = msgpack.unpackb(response.content)
+    assert data["received"] == 4
+    assert data["processed"] == 3
+    assert data["duplicates"] == 1
+    
+    response = client.get("/events?topic=msgpack", headers={"Accept": "application/msgpack"})
+    assert response.status_code == 200
+    data = msgpack.unpackb(response.content)
+    assert data["count"] == 3
+    assert sorted(e["event_id"] for e in data["events"]) == ["evt-0", "evt-1", "evt-2"]
+    assert data["events"][0]["payload"]["tags"] == ["a", "b"]
+    
+    # Tanpa Accept msgpack tetap JSON
+    assert client.get("/events?topic=msgpack").json()["count"] == 3
+
+
+def test_publish_msgpack_validation(client):
+    """Test: Validasi MessagePack sama dengan JSON (422), body rusak/tipe asing ditolak"""
+    msgpack = pytest.importorskip("msgpack")
+    
+    invalid_event = {
+        "topic": "test",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "source": "test"
+    }
+    response = client.post(
+        "/publish",
+        content=msgpack.packb(invalid_event),
+        headers={"Content-Type": "application/msgpack"}
+    )
+    assert response.status_code == 422
+    assert any(err["loc"][:3] == ["body", "Event", "event_id"] for err in response.json()["detail"])
+    
+    response = client.post(
+        "/publish", content=b"\xc1\xc1", headers={"Content-Type": "application/msgpack"}
+    )
+    assert response.status_code == 400
+    
+    response = client.post("/publish", content=b"<event/>", headers={"Content-Type": "text/xml"})
+    assert response.status_code == 415
+
+
+def test_publish_msgpack_non_json_payload_rejected(client):
+    """Test: bin/ext/NaN di payload ditolak 4xx sebelum di-claim, tanpa menghilangkan batch lain"""
+    msgpack = pytest.importorskip("msgpack")
+    
+    def event(event_id, payload):
+        return {
+            "topic": "msgpack-types",
+            "event_id": event_id,
+            "timestamp": "2025-10-22T10:00:00Z",
+            "source": "test",
+            "payload": payload
+        }
+    
+    headers = {"Content-Type": "application/msgpack"}
+    for payload in (
+        {"b": b"\x00\x01"},
+        {"ext": msgpack.ExtType(5, b"x")},
+        {"nested": [{"b": bytearray(b"y")}]},
+        {"nan": float("nan")},
+        {1: "int key"},
+    ):
+        body = msgpack.packb([event("ok", {}), event("bad", payload)], use_bin_type=True, strict_types=False)
+        response = client.post("/publish", content=body, headers=headers)
+        assert response.status_code == 400, payload
+        assert "MessagePack" in response.json()["detail"]
+    
+    # Tidak ada event dari batch yang ditolak yang ter-claim
+    response = client.post("/publish", content=msgpack.packb(event("ok", {"n": 1})), headers=headers)
+    assert response.json()["processed"] == 1
+    
+    # JSON dengan NaN lolos parser, tapi ditolak sebelum di-claim
+    response = client.post(
+        "/publish",
+        content=b'{"topic":"json-nan","event_id":"e1","timestamp":"2025-10-22T10:00:00Z",'
+                b'"source":"test","payload":{"x":NaN}}',
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 422
+    assert client.get("/events?topic=json-nan").json()["count"] == 0
+    
+    body = (
+        b'{"topic":"json-nan","event_id":"e2","timestamp":"2025-10-22T10:00:00Z","source":"t","payload":{"x":NaN}}\n'
+        b'{"topic":"json-nan","event_id":"e3","timestamp":"2025-10-22T10:00:00Z","source":"t","payload":{"x":1}}\n'
+    )
+    response = client.post("/publish/stream", content=body)
+    assert response.status_code == 200
+    assert response.json()["rejected_lines"] == [1]
+    assert response.json()["processed"] == 1
+
+
+def test_publish_trusted_fast_path(processor):
+    """Test: API key terpercaya memakai fast path dengan constraint yang sama"""
+    client = TestClient(create_app(processor, trusted_api_keys=["shipper-key"]))
+    trusted = {"X-API-Key": "shipper-key"}
+    
+    events = [
+        {
+            "topic": "trusted",
+            "event_id": f"evt-{i}",
+            "timestamp": "2025-10-22T10:00:00.123+07:00",
+            "source": "shipper",
+            "payload": {"index": i}
+        }
+        for i in range(10)
+    ]
+    response = client.post("/publish", json=events, headers=trusted)
+    assert response.status_code == 200
+    assert response.json()["processed"] == 10
+    
+    stored = client.get("/events?topic=trusted").json()
+    assert stored["count"] == 10
+    assert stored["events"][0]["payload"]["index"] in range(10)
+    
+    # Constraint skema tetap berlaku di fast path
+    bad = dict(events[0], event_id="evt-bad", timestamp="yesterday")
+    response = client.post("/publish", json=bad, headers=trusted)
+    assert response.status_code == 422
+    response = client.post("/publish", json=dict(events[0], event_id="  "), headers=trusted)
+    assert response.status_code == 422
+    response = client.post("/publish", json=[dict(events[0], topic="")], headers=trusted)
+    assert response.status_code == 422
+    
+    # Fast path hanya cek bentuk timestamp; path normal tetap cek nilainya
+    odd = dict(events[0], event_id="evt-month-13", timestamp="2025-13-01T00:00:00Z")
+    assert client.post("/publish", json=odd, headers={"X-API-Key": "other"}).status_code == 422
+    assert client.post("/publish", json=odd, headers=trusted).status_code == 200
+
+
+def test_publish_stream_trusted_fast_path(processor):
+    """Test: /publish/stream dengan API key terpercaya menolak baris invalid yang sama"""
+    client = TestClient(create_app(processor, trusted_api_keys=["shipper-key"]))
+    events = [
+        {
+            "topic": "trusted-stream",
+            "event_id": f"evt-{i}",
+            "timestamp": "2025-10-22T10:00:00Z",
+            "source": "shipper",
+        }
+        for i in range(3)
+    ]
+    events.insert(1, {"topic": "trusted-stream", "event_id": "x", "timestamp": "bad", "source": "s"})
+    
+    response = client.post(
+        "/publish/stream", content=_ndjson(events), headers={"X-API-Key": "shipper-key"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["processed"] == 3
+    assert data["rejected_lines"] == [2]
+
+
+def test_get_events_cursor_pagination(client):
+    """Test: /events mengembalikan next_cursor sampai topic habis"""
+    events = [
+        {
+            "topic": "paged-api",
+            "event_id": f"evt-{i:03d}",
+            "timestamp": f"2025-10-22T10:{i:02d}:00Z",
+            "source": "test"
+        }
+        for i in range(25)
+    ]
+    assert client.post("/publish", json=events).status_code == 200
+    
+    seen = []
+    params = {"topic": "paged-api", "limit": 10}
+    while True:
+        data = client.get("/events", params=params).json()
+        seen.extend(e["event_id"] for e in data["events"])
+        if data["next_cursor"] is None:
+            break
+        params["cursor"] = data["next_cursor"]
+    assert sorted(seen) == sorted(e["event_id"] for e in events)
+    
+    data = client.get("/events", params={
+        "topic": "paged-api", "since": "2025-10-22T10:05:00Z", "until": "2025-10-22T17:10:00+07:00"
+    }).json()
+    assert data["count"] == 5
+    
+    assert client.get("/events", params={"topic": "paged-api", "cursor": "@@"}).status_code == 400
+    assert client.get("/events", params={"topic": "paged-api", "since": "soon"}).status_code == 400
+
+
+def test_get_events_bad_cursor_segment_log(tmp_path):
+    """Test: Cursor dengan processed_at bukan datetime -> 400 (bukan 500) di backend segment log"""
+    from src.dedup_store import encode_cursor
+    store = DedupStore(db_path=str(tmp_path / "dedup.db"), event_log_dir=str(tmp_path / "events"))
+    with TestClient(create_app(EventProcessor(store))) as client:
+        event = {"topic": "seg", "event_id": "evt-1", "timestamp": "2025-10-22T10:00:00Z", "source": "test"}
+        assert client.post("/publish", json=event).status_code == 200
+        
+        response = client.get("/events", params={"topic": "seg", "cursor": encode_cursor("not-a-date", "x")})
+        assert response.status_code == 400
+        assert "Invalid cursor" in response.json()["detail"]
+
+
+def test_export_events_streaming(client):
+    """Test: /events/export mengalirkan seluruh topic sebagai NDJSON / JSON array"""
+    import json
+    
+    events = [
+        {
+            "topic": "export",
+            "event_id": f"evt-{i:04d}",
+            "timestamp": "2025-10-22T10:00:00Z",
+            "source": "test",
+            "payload": {"index": i, "text": "quote \" and unicode é"}
+        }
+        for i in range(2500)
+    ]
+    for i in range(0, len(events), 500):
+        assert client.post("/publish", json=events[i:i + 500]).status_code == 200
+    
+    with client.stream("GET", "/events/export", params={"topic": "export"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+    assert len(lines) == 2500
+    assert {line["event_id"] for line in lines} == {e["event_id"] for e in events}
+    assert lines[0]["payload"]["text"] == "quote \" and unicode é"
+    
+    response = client.get("/events/export", params={"topic": "export", "format": "json"})
+    assert response.status_code == 200
+    assert len(response.json()) == 2500
+    
+    response = client.get("/events/export", params={"topic": "empty", "format": "json"})
+    assert response.json() == []
+    
+    assert client.get("/events/export", params={"topic": "export", "format": "xml"}).status_code == 422
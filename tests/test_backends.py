@@ -0,0 +1,301 @@
+"""
+Conformance test storage backend
+Suite yang sama dijalankan terhadap setiap engine dedup store
+"""
+import pytest
+import threading
+from src.models import Event
+from src.dedup_store import DedupStore, RetentionPolicy, encode_cursor, parse_event_ts
+from src.sharded_store import ShardedDedupStore
+from src.memory_store import MemoryDedupStore
+from src.lmdb_store import LmdbDedupStore
+from src.storage import DedupBackend
+from src.event_processor import EventProcessor
+from datetime import datetime, timedelta
+
+
+# nama engine -> (factory(tmp_path, **kwargs), persisten setelah close)
+ENGINES = {
+    "sqlite": (lambda tmp_path, **kw: DedupStore(db_path=str(tmp_path / "dedup.db"), **kw), True),
+    "sqlite-sharded": (
+        lambda tmp_path, **kw: ShardedDedupStore(db_path=str(tmp_path / "dedup.db"), shards=3, **kw), True
+    ),
+    "sqlite-segment-log": (
+        lambda tmp_path, **kw: DedupStore(
+            db_path=str(tmp_path / "dedup.db"), event_log_dir=str(tmp_path / "events"), segment_bytes=4096, **kw
+        ),
+        True
+    ),
+    "lmdb": (lambda tmp_path, **kw: LmdbDedupStore(path=str(tmp_path / "dedup.lmdb"), map_size=2 ** 26, **kw), True),
+    "memory": (lambda tmp_path, **kw: MemoryDedupStore(**kw), False),
+    "memory-snapshot": (
+        lambda tmp_path, **kw: MemoryDedupStore(snapshot_path=str(tmp_path / "snapshot.jsonl"), **kw), True
+    ),
+}
+
+
+@pytest.fixture(params=sorted(ENGINES))
+def engine(request, tmp_path):
+    """Factory engine (dipanggil ulang untuk simulasi restart) dan flag persisten"""
+    if request.param == "lmdb":
+        pytest.importorskip("lmdb")
+    factory, persistent = ENGINES[request.param]
+    return (lambda **kw: factory(tmp_path, **kw)), persistent
+
+
+def make_events(batch, count=30):
+    """Event lintas 3 topic dengan timestamp berbeda per jam"""
+    return [
+        Event(
+            topic=("orders", "clicks", "audit")[i % 3],
+            event_id=f"evt-{i:02d}-{batch}",
+            timestamp=f"2025-10-22T{10 + i % 4:02d}:00:00Z",
+            source="test",
+            payload={"batch": batch, "i": i}
+        )
+        for i in range(count)
+    ]
+
+
+def walk(store, topic, limit, **filters):
+    """Ambil seluruh event_id topic lewat cursor pagination"""
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = store.get_events_page(topic, limit=limit, cursor=cursor, **filters)
+        seen.extend(event.event_id for event in page)
+        if cursor is None:
+            return seen
+
+
+def test_engine_implements_protocol(engine):
+    """Test: Engine memenuhi protokol DedupBackend"""
+    open_store, _ = engine
+    store = open_store()
+    assert isinstance(store, DedupBackend)
+    assert store.pool_size >= 1
+    assert not store.closed
+    store.close()
+    assert store.closed
+
+
+def test_claim_semantics(engine):
+    """Test: claim_many atomik per batch, sejajar dengan input, duplikasi di dalam batch ditolak"""
+    open_store, _ = engine
+    store = open_store()
+    events = make_events(0)
+    assert store.claim_many([]) == []
+    assert store.claim_many(events[:10] + events[:2]) == [True] * 10 + [False] * 2
+    assert store.claim_many(events) == [False] * 10 + [True] * 20
+    assert store.claim(events[0]) is False
+    assert store.claim(make_events(1)[0]) is True
+    assert store.is_duplicate(events[29])
+    assert not store.is_duplicate(make_events(2)[0])
+
+    assert store.get_counters() == {"received": 44, "unique_processed": 31, "duplicate_dropped": 13}
+    assert store.get_total_processed() == 31
+    assert store.get_all_topics() == {"orders", "clicks", "audit"}
+    stats = {t.topic: t for t in store.get_topic_stats()}
+    assert [t.topic for t in store.get_topic_stats()] == ["audit", "clicks", "orders"]
+    assert (stats["orders"].count, stats["clicks"].count, stats["audit"].count) == (11, 10, 10)
+    assert stats["orders"].first_processed_at <= stats["orders"].last_processed_at
+    store.close()
+
+
+def test_claim_many_concurrent_threads(engine):
+    """Test: Claim paralel dari banyak thread, tiap key diterima tepat satu kali"""
+    open_store, _ = engine
+    store = open_store()
+    events = make_events(0, 200)
+    results = []
+    def claim(offset):
+        results.extend(store.claim_many(events[offset:] + events[:offset]))
+
+    threads = [threading.Thread(target=claim, args=(i * 50,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 200
+    assert store.get_total_processed() == 200
+    store.close()
+
+
+def test_pagination_order_cursor_and_filters(engine):
+    """Test: Halaman terbaru dulu, cursor tidak melompati event, filter timestamp event"""
+    open_store, _ = engine
+    store = open_store()
+    for batch in range(3):
+        store.claim_many(make_events(batch))
+
+    # Batch terakhir dulu; urutan di dalam batch milik engine (shard punya
+    # processed_at sendiri), tapi stabil antar ukuran halaman
+    order = walk(store, "orders", 1000)
+    assert sorted(order) == sorted(f"evt-{i:02d}-{batch}" for batch in range(3) for i in range(0, 30, 3))
+    assert [event_id[-1] for event_id in order] == ["2"] * 10 + ["1"] * 10 + ["0"] * 10
+    assert walk(store, "orders", 4) == walk(store, "orders", 1) == order
+    assert [e.event_id for e in store.get_events_by_topic("orders", limit=5)] == order[:5]
+
+    window = {
+        "since": parse_event_ts("2025-10-22T11:00:00Z"),
+        "until": parse_event_ts("2025-10-22T13:00:00Z")
+    }
+    assert walk(store, "orders", 3, **window) == [
+        event_id for event_id in order if int(event_id.split("-")[1]) % 4 in (1, 2)
+    ]
+
+    records, cursor = store.get_events_page("clicks", limit=5)
+    lines, json_cursor = store.get_events_json_page("clicks", limit=5)
+    assert [bytes(line) for line in lines] == [record.to_json().encode() for record in records]
+    assert cursor == json_cursor
+    assert records[0].to_event().payload["batch"] == 2
+
+    assert store.get_events_page("unknown") == ([], None)
+    with pytest.raises(ValueError):
+        store.get_events_page("clicks", cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        store.get_events_page("clicks", cursor=encode_cursor("not-a-date", "x"))
+    store.close()
+
+
+def test_retention_compaction(engine):
+    """Test: Expiry per batch sampai semua event lama habis, key-nya bebas lagi"""
+    open_store, _ = engine
+    store = open_store(retention=RetentionPolicy(retention_seconds=60, batch_size=4))
+    events = make_events(0)
+    for i in range(0, 30, 5):
+        store.claim_many(events[i:i + 5])
+    assert store.compact() == 0
+
+    # Segment log hanya membuang segment yang sudah sealed, engine lain semua event
+    later = datetime.utcnow() + timedelta(minutes=5)
+    expired = store.expire_batch(later) + store.compact(later)
+    assert expired > 0
+    assert store.get_total_processed() == 30 - expired
+    assert store.retention_stats()["expired_events"] == expired
+    assert sum(t.count for t in store.get_topic_stats()) == 30 - expired
+    assert store.vacuum_step() >= 0
+
+    # Key yang expired boleh diterima lagi, yang tersisa tetap duplikasi
+    assert store.claim_many(events).count(True) == expired
+    store.close()
+
+
+def test_clear_and_closed_store(engine):
+    """Test: clear menghapus semua data; operasi setelah close ditolak"""
+    open_store, _ = engine
+    store = open_store()
+    store.claim_many(make_events(0))
+    store.clear()
+    assert store.get_total_processed() == 0
+    assert store.get_all_topics() == set()
+    assert store.claim(make_events(0)[0])
+
+    store.close()
+    store.close()
+    with pytest.raises(RuntimeError):
+        store.claim_many(make_events(1))
+    with pytest.raises(RuntimeError):
+        store.get_events_page("orders")
+
+
+def test_restart_keeps_keys_and_counters(engine):
+    """Test: Engine persisten menolak duplikasi setelah restart; engine memory mulai kosong"""
+    open_store, persistent = engine
+    store = open_store()
+    store.claim_many(make_events(0))
+    store.checkpoint()
+    counters = store.get_counters()
+    pages = walk(store, "orders", 7)
+    store.close()
+
+    store = open_store()
+    if persistent:
+        assert store.get_counters() == counters
+        assert walk(store, "orders", 7) == pages
+        assert store.claim_many(make_events(0)) == [False] * 30
+        # processed_at setelah restart tetap lebih baru dari event lama
+        store.claim_many(make_events(1))
+        assert walk(store, "orders", 1000)[10:] == pages
+    else:
+        assert store.get_total_processed() == 0
+        assert store.claim_many(make_events(0)) == [True] * 30
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_processor_on_engine(engine):
+    """Test: EventProcessor, stats dan /events bekerja di atas setiap engine"""
+    open_store, _ = engine
+    store = open_store()
+    processor = EventProcessor(store, num_partitions=2)
+    await processor.start()
+
+    result = await processor.submit_events(make_events(0) + make_events(0)[:10])
+    assert result["processed"] == 30
+    assert result["duplicates"] == 10
+    await processor.drain()
+
+    stats = processor.get_stats()
+    assert stats.unique_processed == 30
+    assert stats.duplicate_dropped == 10
+    assert stats.stored_events == 30
+    assert set(stats.topics) == {"orders", "clicks", "audit"}
+    page, cursor = await processor.get_events_page("orders", limit=4)
+    assert len(page) == 4 and cursor is not None
+
+    await processor.stop()
+    assert store.closed
+
+
+def test_memory_snapshot_periodic_and_invalid(tmp_path):
+    """Test: Snapshot periodik ditulis di background; snapshot rusak ditolak saat load"""
+    path = tmp_path / "snapshot.jsonl"
+    with pytest.raises(ValueError):
+        MemoryDedupStore(snapshot_interval=1.0)
+
+    store = MemoryDedupStore(snapshot_path=str(path), snapshot_interval=0.05)
+    store.claim_many(make_events(0))
+    deadline = datetime.utcnow() + timedelta(seconds=5)
+    while store.snapshots == 0 and datetime.utcnow() < deadline:
+        threading.Event().wait(0.02)
+    assert store.snapshots > 0
+
+    # Tanpa close (simulasi crash): snapshot terakhir tetap bisa di-load
+    restored = MemoryDedupStore(snapshot_path=str(path))
+    assert restored.claim_many(make_events(0)) == [False] * 30
+    restored.close()
+    store.close()
+    assert not (tmp_path / "snapshot.jsonl.tmp").exists()
+
+    path.write_text('{"format": "something-else"}\n')
+    with pytest.raises(ValueError, match="snapshot"):
+        MemoryDedupStore(snapshot_path=str(path))
+
+
+def test_lmdb_readers_not_blocked_by_writer(tmp_path):
+    """Test: Reader LMDB membaca snapshot terakhir tanpa menunggu writer yang sedang memegang lock"""
+    pytest.importorskip("lmdb")
+    store = LmdbDedupStore(path=str(tmp_path / "dedup.lmdb"), map_size=2 ** 26, sync=False)
+    store.claim_many(make_events(0))
+    results = {}
+    def read():
+        results["page"] = store.get_events_page("orders", limit=100)[0]
+        results["duplicate"] = store.is_duplicate(make_events(0)[0])
+        results["total"] = store.get_total_processed()
+
+    # Writer (claim/expiry) ditahan: reader tetap selesai
+    with store.lock:
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+    assert len(results["page"]) == 10
+    assert results["duplicate"] and results["total"] == 30
+
+    # Counter batch duplikasi murni ditunda lalu di-persist saat close
+    assert store.claim_many(make_events(0)) == [False] * 30
+    store.close()
+    restored = LmdbDedupStore(path=str(tmp_path / "dedup.lmdb"), map_size=2 ** 26)
+    assert restored.get_counters() == {"received": 60, "unique_processed": 30, "duplicate_dropped": 30}
+    restored.close()
@@ -5,8 +5,8 @@ import pytest
 import tempfile
 import os
 from src.models import Event
-from src.dedup_store import DedupStore
-from datetime import datetime
+from src.dedup_store import DedupStore, RetentionPolicy
+from datetime import datetime, timedelta
 
 
 @pytest.fixture
@@ -18,8 +18,10 @@ def temp_db():
     yield db_path
     
     # Cleanup
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    # Hapus juga file WAL/shared-memory
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.unlink(path)
 
 
 @pytest.fixture
@@ -191,3 +193,411 @@ def test_batch_processing(dedup_store):
     assert unique_count == 10
     assert duplicate_count == 5
     assert dedup_store.get_total_processed() == 10
+
+
+def test_mark_processed_many(dedup_store):
+    """Test: Group commit mengembalikan flag insert per event"""
+    events = [
+        Event(
+            topic="group",
+            event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={"index": i}
+        )
+        for i in [0, 1, 2, 1]  # evt-1 duplikat di dalam batch
+    ]
+    
+    dedup_store.mark_processed(events[0])
+    
+    results = dedup_store.mark_processed_many(events)
+    assert results == [False, True, True, False]
+    assert dedup_store.get_total_processed() == 3
+    assert dedup_store.mark_processed_many([]) == []
+
+
+def test_key_cache_lru_and_ttl():
+    """Test: RecentKeyCache evict LRU dan expire berdasarkan TTL"""
+    from src.key_cache import RecentKeyCache
+    import time
+    
+    cache = RecentKeyCache(max_size=2, ttl_seconds=0)
+    cache.add_many([("t", "a"), ("t", "b")])
+    assert cache.contains(("t", "a"))  # a jadi most-recently-used
+    cache.add(("t", "c"))  # evict b
+    
+    assert not cache.contains(("t", "b"))
+    assert cache.contains(("t", "a"))
+    assert cache.contains(("t", "c"))
+    assert (cache.hits, cache.misses) == (3, 1)
+    
+    short = RecentKeyCache(max_size=10, ttl_seconds=0.01)
+    short.add(("t", "a"))
+    time.sleep(0.02)
+    assert not short.contains(("t", "a"))
+    assert len(short) == 0
+
+
+def test_key_cache_in_front_of_store(dedup_store, sample_event):
+    """Test: Duplicate check memakai key cache dan tetap koheren dengan clear"""
+    cache = dedup_store.key_cache
+    assert cache is not None
+    
+    assert not dedup_store.is_duplicate(sample_event)  # miss -> SQLite
+    dedup_store.mark_processed(sample_event)  # claim: miss -> INSERT
+    assert dedup_store.is_duplicate(sample_event)  # hit
+    assert not dedup_store.claim(sample_event)  # hit, tanpa INSERT
+    assert (cache.hits, cache.misses) == (2, 2)
+    
+    dedup_store.clear()
+    assert not dedup_store.is_duplicate(sample_event)
+    assert cache.misses == 3
+
+
+def test_key_cache_disabled(temp_db, sample_event):
+    """Test: Key cache bisa dinonaktifkan"""
+    store = DedupStore(db_path=temp_db, key_cache_size=0)
+    assert store.key_cache is None
+    
+    store.mark_processed(sample_event)
+    assert store.is_duplicate(sample_event)
+    store.close()
+
+
+def test_bloom_filter_no_false_negatives():
+    """Test: Bloom filter tidak pernah false negative dan FP rate mendekati target"""
+    from src.bloom import BloomFilter
+    
+    bloom = BloomFilter(capacity=5000, fp_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"present-{i}".encode())
+    
+    assert all(bloom.might_contain(f"present-{i}".encode()) for i in range(5000))
+    
+    false_positives = sum(bloom.might_contain(f"absent-{i}".encode()) for i in range(10000))
+    assert false_positives / 10000 < 0.03
+    assert 0.3 < bloom.fill_ratio() < 0.7
+
+
+def test_bloom_filter_skips_sqlite_on_miss(temp_db, sample_event):
+    """Test: Definite miss dari Bloom filter dijawab tanpa SQLite"""
+    store = DedupStore(db_path=temp_db, bloom_capacity=1000, key_cache_size=0)
+    
+    assert not store.is_duplicate(sample_event)
+    assert store.bloom_negatives == 1
+    
+    store.mark_processed(sample_event)
+    assert store.is_duplicate(sample_event)
+    
+    stats = store.filter_stats()
+    assert stats["fill_ratio"] > 0
+    assert stats["measured_fp_rate"] == 0.0
+    
+    store.clear()
+    assert not store.is_duplicate(sample_event)
+    # Satu miss dari claim (mark_processed) ikut terhitung
+    assert store.bloom_negatives == 3
+    store.close()
+
+
+def test_claim_many_concurrent_publishers(dedup_store):
+    """Test: claim_many atomik, publisher paralel dengan key yang sama tidak double count"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    events = [
+        Event(
+            topic="claim",
+            event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={"index": i}
+        )
+        for i in range(200)
+    ]
+    
+    def publish(offset):
+        # Tiap publisher mengirim semua key dengan urutan berbeda
+        batch = events[offset:] + events[:offset]
+        return sum(dedup_store.claim_many(batch))
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        claimed = list(pool.map(publish, range(0, 200, 25)))
+    
+    assert sum(claimed) == 200
+    assert dedup_store.get_total_processed() == 200
+
+
+def test_keyset_pagination_walks_topic_once(dedup_store):
+    """Test: Cursor pagination mengembalikan setiap event tepat sekali, terbaru dulu"""
+    # Tiga batch: event dalam satu batch punya processed_at yang sama
+    for batch in range(3):
+        dedup_store.claim_many([
+            Event(
+                topic="paged",
+                event_id=f"evt-{batch}-{i:02d}",
+                timestamp=datetime.utcnow().isoformat() + "Z",
+                source="test"
+            )
+            for i in range(10)
+        ])
+    dedup_store.claim(Event(topic="other", event_id="x", timestamp="2025-01-01T00:00:00Z", source="t"))
+    
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page, cursor = dedup_store.get_events_page("paged", limit=7, cursor=cursor)
+        seen.extend(event.event_id for event in page)
+        pages += 1
+        if cursor is None:
+            break
+    
+    assert pages == 5
+    assert len(seen) == 30
+    assert len(set(seen)) == 30
+    # Batch terakhir muncul lebih dulu
+    assert all(event_id.startswith("evt-2-") for event_id in seen[:10])
+    
+    with pytest.raises(ValueError):
+        dedup_store.get_events_page("paged", cursor="not-a-cursor")
+
+
+def test_events_since_until_filter(dedup_store):
+    """Test: Filter since/until berdasarkan timestamp event (lintas format offset)"""
+    from src.dedup_store import parse_event_ts
+    
+    timestamps = [
+        "2025-10-22T09:00:00Z",
+        "2025-10-22T10:00:00+00:00",
+        "2025-10-22T17:30:00+07:00",  # 10:30 UTC
+        "2025-10-22T11:00:00",
+    ]
+    dedup_store.claim_many([
+        Event(topic="window", event_id=f"evt-{i}", timestamp=ts, source="test")
+        for i, ts in enumerate(timestamps)
+    ])
+    
+    page, _ = dedup_store.get_events_page(
+        "window",
+        since=parse_event_ts("2025-10-22T10:00:00Z"),
+        until=parse_event_ts("2025-10-22T11:00:00Z")
+    )
+    assert sorted(event.event_id for event in page) == ["evt-1", "evt-2"]
+    
+    page, _ = dedup_store.get_events_page("window", since=parse_event_ts("2025-10-22T10:45:00Z"))
+    assert [event.event_id for event in page] == ["evt-3"]
+
+
+def test_topic_stats_maintained_with_inserts(dedup_store):
+    """Test: Counter per topic ikut bertambah hanya untuk event yang benar-benar baru"""
+    def make(topic, i):
+        return Event(
+            topic=topic, event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z", source="test"
+        )
+    
+    dedup_store.claim_many([make("a", i) for i in range(5)] + [make("b", i) for i in range(2)])
+    dedup_store.claim_many([make("a", i) for i in range(3, 8)])  # 2 duplikat, 3 baru
+    
+    stats = {t.topic: t for t in dedup_store.get_topic_stats()}
+    assert stats["a"].count == 8
+    assert stats["b"].count == 2
+    assert stats["a"].first_processed_at <= stats["a"].last_processed_at
+    assert dedup_store.get_total_processed() == 10
+    
+    # Counter di tabel sama dengan isi tabel event
+    with dedup_store._reader() as conn:
+        rows = dict(conn.execute("SELECT topic, event_count FROM topic_stats").fetchall())
+        actual = dict(conn.execute(
+            "SELECT topic, COUNT(*) FROM event_log GROUP BY topic"
+        ).fetchall())
+    assert rows == actual == {"a": 8, "b": 2}
+    
+    dedup_store.clear()
+    assert dedup_store.get_topic_stats() == []
+
+
+def test_retention_expires_old_events(temp_db):
+    """Test: Event yang lewat retention window dihapus dan key-nya bisa di-claim lagi"""
+    store = DedupStore(
+        db_path=temp_db,
+        retention=RetentionPolicy(
+            retention_seconds=3600, topic_retention={"audit": 0, "clicks": 60}, batch_size=3
+        )
+    )
+    
+    def make(topic, i):
+        return Event(
+            topic=topic, event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z", source="test"
+        )
+    
+    store.claim_many(
+        [make("orders", i) for i in range(5)]
+        + [make("audit", i) for i in range(2)]
+        + [make("clicks", i) for i in range(4)]
+    )
+    
+    # 2 menit kemudian: hanya clicks (window 60 detik) yang expired
+    assert store.compact(now=datetime.utcnow() + timedelta(minutes=2)) == 4
+    assert {t.topic: t.count for t in store.get_topic_stats()} == {"orders": 5, "audit": 2}
+    
+    # 2 jam kemudian: orders ikut expired (per batch 3 event), audit disimpan selamanya
+    later = datetime.utcnow() + timedelta(hours=2)
+    assert store.expire_batch(now=later) == 3
+    assert store.expire_batch(now=later) == 2
+    assert store.expire_batch(now=later) == 0
+    assert {t.topic: t.count for t in store.get_topic_stats()} == {"audit": 2}
+    assert store.retention_stats()["expired_events"] == 9
+    
+    # Key yang expired (termasuk yang masih di key cache) diterima lagi sebagai event baru
+    assert store.claim_many([make("orders", 0), make("audit", 0)]) == [True, False]
+    
+    with store._reader() as conn:
+        rows = dict(conn.execute("SELECT topic, event_count FROM topic_stats").fetchall())
+        actual = dict(conn.execute(
+            "SELECT topic, COUNT(*) FROM event_log GROUP BY topic"
+        ).fetchall())
+    assert rows == actual == {"audit": 2, "orders": 1}
+    store.close()
+
+
+def test_retention_expiry_uses_processed_at_index(dedup_store):
+    """Test: Query expiry global dilayani index idx_processed_at (tanpa full scan)"""
+    with dedup_store._reader() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(
+            """
+            EXPLAIN QUERY PLAN
+            SELECT id, topic, event_id FROM event_log
+            WHERE processed_at < ? AND topic NOT IN (?)
+            ORDER BY processed_at LIMIT ?
+            """,
+            ("2025-10-22T10:00:00", "audit", 1000)
+        ))
+    assert "idx_processed_at" in plan
+
+
+def _walk_pages(store, topic, limit, **filters):
+    """Ambil seluruh event topic lewat cursor pagination"""
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = store.get_events_page(topic, limit=limit, cursor=cursor, **filters)
+        seen.extend(event.event_id for event in page)
+        if cursor is None:
+            return seen
+
+
+def test_segment_log_pages_match_sqlite_backend(temp_db, tmp_path):
+    """Test: Segment log mengembalikan halaman, cursor dan filter yang sama dengan tabel SQLite"""
+    from src.dedup_store import parse_event_ts
+    
+    table_store = DedupStore(db_path=temp_db)
+    log_store = DedupStore(
+        db_path=str(tmp_path / "log.db"), event_log_dir=str(tmp_path / "log"), segment_bytes=8192
+    )
+    for batch in range(4):
+        events = [
+            Event(
+                topic="paged" if i % 3 else "other",
+                event_id=f"evt-{(i * 7) % 20:02d}-{batch}",
+                timestamp=f"2025-10-22T{10 + i % 4:02d}:00:00Z",
+                source="test",
+                payload={"batch": batch, "i": i}
+            )
+            for i in range(20)
+        ]
+        assert table_store.claim_many(events) == log_store.claim_many(events)
+    
+    for topic in ("paged", "other"):
+        assert _walk_pages(log_store, topic, 7) == _walk_pages(table_store, topic, 7)
+    window = {
+        "since": parse_event_ts("2025-10-22T11:00:00Z"),
+        "until": parse_event_ts("2025-10-22T13:00:00Z")
+    }
+    assert _walk_pages(log_store, "paged", 4, **window) == _walk_pages(table_store, "paged", 4, **window)
+    assert log_store.segment_log.segment_count > 1
+    
+    # Record dibaca ulang utuh dari segment, JSON-nya sama dengan backend SQLite
+    [record] = log_store.get_events_by_topic("paged", limit=1)
+    assert record.payload == table_store.get_events_by_topic("paged", limit=1)[0].payload
+    lines, _ = log_store.get_events_json_page("paged", limit=3)
+    assert [bytes(line) for line in lines] == table_store.get_events_json_page("paged", limit=3)[0]
+    assert log_store.get_topic_stats()[0].count == table_store.get_topic_stats()[0].count
+    
+    with pytest.raises(ValueError):
+        log_store.get_events_page("paged", cursor="not-a-cursor")
+    
+    # Payload tidak pernah masuk tabel event_log
+    with log_store._reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM event_log").fetchone()[0] == 0
+    
+    log_store.clear()
+    assert log_store.get_events_by_topic("paged") == []
+    assert log_store.claim(events[0])
+    table_store.close()
+    log_store.close()
+
+
+def test_segment_log_retention_removes_whole_segments(tmp_path):
+    """Test: Retention segment log menghapus segment utuh beserta key-nya, segment aktif disimpan"""
+    store = DedupStore(
+        db_path=str(tmp_path / "dedup.db"),
+        event_log_dir=str(tmp_path / "log"),
+        segment_bytes=8192,
+        retention=RetentionPolicy(retention_seconds=60, batch_size=50)
+    )
+    
+    def make(i):
+        return Event(
+            topic="orders", event_id=f"evt-{i:03d}",
+            timestamp="2025-10-22T10:00:00Z", source="test", payload={"pad": "x" * 100}
+        )
+    
+    for start in range(0, 200, 20):
+        store.claim_many([make(i) for i in range(start, start + 20)])
+    segments = store.segment_log.segment_count
+    assert segments > 2
+    
+    # Belum lewat window: tidak ada yang dihapus
+    assert store.compact() == 0
+    
+    expired = store.compact(now=datetime.utcnow() + timedelta(minutes=5))
+    remaining = store.get_total_processed()
+    assert expired > 0
+    assert expired + remaining == 200
+    assert store.segment_log.segment_count == 1
+    assert len(list((tmp_path / "log").glob("*.log"))) == 1
+    
+    # Event yang tersisa adalah yang terbaru, key yang expired bisa di-claim lagi
+    seen = _walk_pages(store, "orders", 100)
+    assert seen == [f"evt-{i:03d}" for i in range(199, 199 - remaining, -1)]
+    assert store.claim(make(0))
+    assert not store.claim(make(199))
+    assert store.retention_stats()["expired_events"] == expired
+    
+    with pytest.raises(ValueError):
+        DedupStore(
+            db_path=str(tmp_path / "other.db"),
+            event_log_dir=str(tmp_path / "other"),
+            retention=RetentionPolicy(retention_seconds=60, topic_retention={"audit": 0})
+        )
+    store.close()
+
+
+def test_bloom_filter_consulted_by_claim_many(temp_db):
+    """Test: claim_many memakai Bloom filter sehingga statistik filter terisi oleh traffic nyata"""
+    store = DedupStore(db_path=temp_db, bloom_capacity=1000, key_cache_size=0)
+    events = [
+        Event(topic="bloom", event_id=f"evt-{i}", timestamp="2025-10-22T10:00:00Z", source="test", payload={})
+        for i in range(20)
+    ]
+    
+    # Duplikasi di dalam batch tetap ditolak walau key pertama definite miss
+    assert store.claim_many(events[:10] + events[:3]) == [True] * 10 + [False] * 3
+    assert store.bloom_negatives == 10
+    assert store.claim_many(events) == [False] * 10 + [True] * 10
+    assert store.bloom_negatives + store.bloom_false_positives == 20
+    assert store.get_total_processed() == 20
+    assert 0.0 <= store.filter_stats()["measured_fp_rate"] <= 1.0
+    store.close()
@@ -6,7 +6,7 @@ import tempfile
 import os
 import time
 from src.models import Event
-from src.dedup_store import DedupStore
+from src.dedup_store import DedupStore, StorageProfile
 from src.event_processor import EventProcessor
 from datetime import datetime
 import asyncio
@@ -20,8 +20,10 @@ def temp_db():
     
     yield db_path
     
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    # Hapus juga file WAL/shared-memory
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.unlink(path)
 
 
 @pytest.fixture
@@ -194,7 +196,7 @@ async def test_batch_processing_performance(processor):
         
         start = time.time()
         await processor.submit_events(events)
-        await asyncio.sleep(1)  # Wait for processing
+        await processor.drain()  # Wait for processing
         end = time.time()
         
         elapsed_ms = (end - start) * 1000
@@ -237,3 +239,1145 @@ def test_memory_efficiency(temp_db):
     
     # Performance harus tetap reasonable
     assert throughput >= 100, f"Throughput degraded: {throughput:.0f} events/sec"
+
+
+def test_pooled_connection_per_event_cost(temp_db):
+    """
+    Test: Biaya per event dengan koneksi pooled vs connect-per-call
+    
+    Baseline "before" mensimulasikan pola lama: sqlite3.connect baru untuk
+    setiap is_duplicate dan mark_processed.
+    """
+    import sqlite3
+    import json
+    from src.dedup_store import dedup_key_hash
+    
+    store = DedupStore(db_path=temp_db, pool_size=2)
+    num_events = 500
+    
+    def make_event(prefix, i):
+        return Event(
+            topic="pool-perf",
+            event_id=f"{prefix}-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={"index": i}
+        )
+    
+    # Before: connect-per-call
+    start = time.perf_counter()
+    for i in range(num_events):
+        event = make_event("before", i)
+        key_hash = dedup_key_hash(event.topic, event.event_id)
+        conn = sqlite3.connect(temp_db)
+        conn.execute("SELECT 1 FROM dedup_keys WHERE key_hash = ?", (key_hash,)).fetchone()
+        conn.close()
+        conn = sqlite3.connect(temp_db)
+        with conn:
+            conn.execute("INSERT INTO dedup_keys (key_hash) VALUES (?)", (key_hash,))
+            conn.execute(
+                "INSERT INTO event_log "
+                "(topic, event_id, timestamp, source, payload, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (event.topic, event.event_id, event.timestamp, event.source,
+                 json.dumps(event.payload), datetime.utcnow().isoformat())
+            )
+        conn.close()
+    before_us = (time.perf_counter() - start) / num_events * 1e6
+    
+    # After: pooled connections
+    start = time.perf_counter()
+    for i in range(num_events):
+        event = make_event("after", i)
+        if not store.is_duplicate(event):
+            store.mark_processed(event)
+    after_us = (time.perf_counter() - start) / num_events * 1e6
+    
+    # Lookup-only path (tanpa fsync) menunjukkan overhead connect paling jelas
+    probe = make_event("after", 0)
+    start = time.perf_counter()
+    for _ in range(num_events):
+        conn = sqlite3.connect(temp_db)
+        conn.execute(
+            "SELECT 1 FROM dedup_keys WHERE key_hash = ?",
+            (dedup_key_hash(probe.topic, probe.event_id),)
+        ).fetchone()
+        conn.close()
+    lookup_before_us = (time.perf_counter() - start) / num_events * 1e6
+    
+    start = time.perf_counter()
+    for _ in range(num_events):
+        store.is_duplicate(probe)
+    lookup_after_us = (time.perf_counter() - start) / num_events * 1e6
+    
+    print(f"\n=== Connection Pool Per-Event Cost ===")
+    print(f"check+mark connect-per-call: {before_us:8.1f}us/event")
+    print(f"check+mark pooled:           {after_us:8.1f}us/event")
+    print(f"lookup connect-per-call:     {lookup_before_us:8.1f}us/event")
+    print(f"lookup pooled:               {lookup_after_us:8.1f}us/event")
+    
+    # Baseline menulis langsung ke tabel (di luar counter store), jadi hitung via SQL
+    with store._reader() as conn:
+        stored = conn.execute("SELECT COUNT(*) FROM event_log").fetchone()[0]
+    assert stored == num_events * 2
+    assert lookup_after_us < lookup_before_us, "Pooled lookup should beat connect-per-call"
+    
+    store.close()
+    assert store.closed
+
+
+@pytest.mark.asyncio
+async def test_processor_stop_closes_store(temp_db):
+    """Test: EventProcessor.stop() menutup koneksi dedup store"""
+    store = DedupStore(db_path=temp_db)
+    proc = EventProcessor(store)
+    await proc.start()
+    await proc.stop()
+    
+    assert store.closed
+    
+    # Stats tetap bisa dibaca setelah stop
+    stats = proc.get_stats()
+    assert stats.received == 0
+
+
+def _concurrent_read_write(db_path, profile, batches=40, batch_size=50, readers=3):
+    """Jalankan writer dan beberapa reader secara bersamaan, kembalikan metrik"""
+    import threading
+    
+    store = DedupStore(db_path=db_path, pool_size=readers, profile=profile)
+    
+    # Seed supaya reader punya data untuk discan
+    store.mark_processed_many([
+        Event(
+            topic="rw-perf",
+            event_id=f"seed-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={"data": "x" * 200}
+        )
+        for i in range(2000)
+    ])
+    
+    done = threading.Event()
+    read_ops = [0] * readers
+    write_latencies = []
+    
+    def reader(idx):
+        # Pola baca /stats dan GET /events
+        while not done.is_set():
+            store.get_total_processed()
+            store.get_events_by_topic("rw-perf", limit=50)
+            read_ops[idx] += 1
+    
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    
+    start = time.perf_counter()
+    for b in range(batches):
+        events = [
+            Event(
+                topic="rw-perf",
+                event_id=f"evt-{b}-{i}",
+                timestamp=datetime.utcnow().isoformat() + "Z",
+                source="test",
+                payload={"data": "x" * 200}
+            )
+            for i in range(batch_size)
+        ]
+        t0 = time.perf_counter()
+        store.mark_processed_many(events)
+        write_latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    
+    done.set()
+    for t in threads:
+        t.join()
+    
+    total = store.get_total_processed()
+    store.close()
+    
+    write_latencies.sort()
+    return {
+        "total": total,
+        "write_eps": batches * batch_size / elapsed,
+        "write_p99_ms": write_latencies[int(len(write_latencies) * 0.99) - 1] * 1000,
+        "read_ops": sum(read_ops) / elapsed,
+    }
+
+
+def test_concurrent_read_write_wal_vs_rollback(tmp_path):
+    """
+    Test: Reader (GET /events, /stats) tidak lagi memblokir writer dengan WAL
+    
+    Membandingkan profile legacy (rollback journal) dengan profile WAL
+    di bawah beban baca-tulis bersamaan.
+    """
+    legacy = _concurrent_read_write(
+        str(tmp_path / "legacy.db"), StorageProfile.preset("legacy")
+    )
+    wal = _concurrent_read_write(
+        str(tmp_path / "wal.db"), StorageProfile.preset("wal")
+    )
+    
+    print(f"\n=== Concurrent Read/Write ===")
+    for name, m in (("legacy", legacy), ("wal", wal)):
+        print(
+            f"{name:6s}: writes {m['write_eps']:8.0f} events/s, "
+            f"write p99 {m['write_p99_ms']:7.2f}ms, reads {m['read_ops']:6.0f} queries/s"
+        )
+    
+    assert legacy["total"] == wal["total"] == 2000 + 40 * 50
+
+
+@pytest.mark.parametrize("preset,blocked", [("legacy", True), ("wal", False)])
+def test_open_reader_blocks_writer_only_without_wal(tmp_path, preset, blocked):
+    """Test: Read transaction yang sedang terbuka hanya memblokir writer di rollback journal"""
+    import sqlite3
+    
+    profile = StorageProfile.preset(preset).model_copy(update={"busy_timeout_ms": 100})
+    store = DedupStore(db_path=str(tmp_path / f"{preset}.db"), profile=profile)
+    
+    def make_event(i):
+        return Event(
+            topic="lock-test",
+            event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={}
+        )
+    
+    store.mark_processed_many([make_event(i) for i in range(3)])
+    
+    # Reader memegang snapshot (mis. query /events yang belum selesai)
+    with store._reader() as conn:
+        cursor = conn.execute("SELECT topic FROM event_log")
+        cursor.fetchone()
+        
+        if blocked:
+            with pytest.raises(sqlite3.OperationalError, match="locked"):
+                store.mark_processed_many([make_event(3)])
+        else:
+            assert store.mark_processed_many([make_event(3)]) == [True]
+        
+        cursor.close()
+    
+    store.close()
+
+
+def test_storage_profile_pragmas_applied(temp_db):
+    """Test: PRAGMA dari StorageProfile diterapkan ke koneksi"""
+    profile = StorageProfile(synchronous="FULL", mmap_size=1 << 20, busy_timeout_ms=1234)
+    store = DedupStore(db_path=temp_db, profile=profile)
+    
+    with store._reader() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0].upper() == "WAL"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    
+    store.checkpoint("TRUNCATE")
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_throughput(tmp_path):
+    """Test: Throughput consumer untuk 1/4/16 worker"""
+    num_events = 1600
+    topics = 32
+    results = {}
+    
+    print("\n=== Worker Pool Throughput ===")
+    
+    for workers in (1, 4, 16):
+        store = DedupStore(db_path=str(tmp_path / f"workers-{workers}.db"))
+        proc = EventProcessor(store, batch_size=16, batch_timeout_ms=2, num_workers=workers)
+        await proc.start()
+        
+        events = [
+            Event(
+                topic=f"topic-{i % topics}",
+                event_id=f"evt-{i}",
+                timestamp=datetime.utcnow().isoformat() + "Z",
+                source="test",
+                payload={"index": i}
+            )
+            for i in range(num_events)
+        ]
+        
+        start = time.perf_counter()
+        await proc.submit_events(events)
+        await proc.drain()
+        elapsed = time.perf_counter() - start
+        await proc.stop()
+        
+        results[workers] = num_events / elapsed
+        print(f"{workers:2d} workers: {results[workers]:8.0f} events/second")
+    
+    assert results[4] > results[1]
+    assert results[16] > results[1]
+
+
+@pytest.mark.asyncio
+async def test_memory_flat_under_sustained_overload(temp_db):
+    """
+    Test: Dengan bounded queue, memory tetap flat saat publisher terus
+    mengirim lebih cepat dari kemampuan consumer (overload)
+    """
+    import tracemalloc
+    from src.event_processor import QueueFullError
+    
+    class SlowProcessor(EventProcessor):
+        async def _process_single_event(self, event):
+            await asyncio.sleep(0.005)
+    
+    proc = SlowProcessor(
+        DedupStore(db_path=temp_db, key_cache_size=1000),
+        max_queue_events=500,
+        enqueue_timeout=0
+    )
+    await proc.start()
+    
+    def make_batch(round_no):
+        return [
+            Event(
+                topic=f"overload-{i % 8}",
+                event_id=f"evt-{round_no}-{i}",
+                timestamp=datetime.utcnow().isoformat() + "Z",
+                source="test",
+                payload={"data": "x" * 500}
+            )
+            for i in range(200)
+        ]
+    
+    async def overload(rounds, start_round):
+        for r in range(start_round, start_round + rounds):
+            try:
+                await proc.submit_events(make_batch(r))
+            except QueueFullError:
+                pass
+            await asyncio.sleep(0)
+    
+    tracemalloc.start()
+    await overload(50, 0)  # warmup: queue terisi penuh
+    warm, _ = tracemalloc.get_traced_memory()
+    
+    await overload(200, 50)
+    end, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    stats = proc.get_stats()
+    print(f"\n=== Sustained Overload ===")
+    print(f"Attempted: {250 * 200} events, rejected: {stats.rejected_events}")
+    print(f"Max queue depth: {proc.max_queue_events}, current depth: {stats.queue_depth}")
+    print(f"Memory after warmup: {warm / 1024:.0f} KiB, end: {end / 1024:.0f} KiB, "
+          f"peak: {peak / 1024:.0f} KiB")
+    
+    assert stats.queue_depth <= proc.max_queue_events
+    assert stats.rejected_events > 200 * 200 * 0.5
+    # 4x lebih banyak event dikirim setelah warmup, memory tidak ikut naik
+    assert end - warm < 1024 * 1024, "Memory grew under overload"
+    
+    await proc.stop()
+
+
+@pytest.mark.asyncio
+async def test_health_latency_during_large_ingest(temp_db):
+    """
+    Test: /health tetap responsif (p99) selama batch besar di-claim,
+    karena operasi SQLite berjalan di thread writer, bukan di event loop
+    """
+    import httpx
+    from src.api import create_app
+    
+    store = DedupStore(db_path=temp_db, profile=StorageProfile.preset("durable"))
+    proc = EventProcessor(store)
+    await proc.start()
+    app = create_app(proc)
+    
+    events = [
+        Event(
+            topic=f"ingest-{i % 8}",
+            event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={"data": "x" * 200}
+        )
+        for i in range(30000)
+    ]
+    
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url="http://test") as client:
+        ingest = asyncio.create_task(proc.submit_events(events))
+        ingest_start = time.perf_counter()
+        
+        while not ingest.done():
+            t0 = time.perf_counter()
+            response = await client.get("/health")
+            latencies.append(time.perf_counter() - t0)
+            assert response.status_code == 200
+            await asyncio.sleep(0.002)
+        
+        ingest_elapsed = time.perf_counter() - ingest_start
+        result = await ingest
+    
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000
+    
+    print(f"\n=== /health Latency During Ingest ===")
+    print(f"Ingest of {len(events)} events: {ingest_elapsed * 1000:.0f}ms")
+    print(f"/health samples: {len(latencies)}, p50: {p50:.2f}ms, p99: {p99:.2f}ms")
+    
+    assert result["processed"] == len(events)
+    # Loop tidak terblokir selama claim: banyak sampel /health selama ingest
+    assert len(latencies) >= 10
+    assert p99 < ingest_elapsed * 1000 / 2, "/health stalled behind SQLite ingest"
+    
+    await proc.stop()
+
+
+@pytest.mark.asyncio
+async def test_stream_ingest_memory_bounded(temp_db):
+    """
+    Test: Ingestion NDJSON streaming tidak mem-buffer seluruh body,
+    peak memory jauh lebih kecil dari ukuran body
+    """
+    import json
+    import tracemalloc
+    from src.stream_ingest import ingest_ndjson
+    
+    proc = EventProcessor(
+        DedupStore(db_path=temp_db, key_cache_size=1000),
+        num_partitions=8,
+        max_queue_events=500,
+        enqueue_timeout=30.0
+    )
+    await proc.start()
+    
+    total = 20000
+    line_template = json.dumps({
+        "topic": "stream-{topic}",
+        "event_id": "evt-{i}",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "source": "test",
+        "payload": {"data": "x" * 500}
+    }) + "\n"
+    body_size = 0
+    
+    async def body(first=0, count=total):
+        # Body di-generate per chunk 100 baris, tidak pernah ada utuh di memory
+        nonlocal body_size
+        chunk = []
+        for i in range(first, first + count):
+            chunk.append(line_template.replace("{topic}", str(i % 8)).replace("{i}", str(i)))
+            if len(chunk) == 100:
+                data = "".join(chunk).encode()
+                body_size += len(data)
+                yield data
+                chunk = []
+        if chunk:
+            data = "".join(chunk).encode()
+            body_size += len(data)
+            yield data
+    
+    # Warmup supaya alokasi satu kali (import, schema, thread) tidak terhitung
+    await ingest_ndjson(proc, body(total, 1000))
+    body_size = 0
+    
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = await ingest_ndjson(proc, body())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    print(f"\n=== NDJSON Stream Ingest ===")
+    print(f"Body: {body_size / 1024 / 1024:.1f} MiB, {total} events in {elapsed:.2f}s")
+    print(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB")
+    
+    assert result["processed"] == total
+    assert result["rejected"] == 0
+    # Yang hidup bersamaan hanya batch parser + isi queue (bounded), bukan body
+    assert peak < body_size / 2, "Stream ingest buffered the whole body"
+    
+    await proc.stop()
+
+
+def test_wire_format_size_and_cpu():
+    """
+    Benchmark: ukuran request dan CPU server per event, JSON vs MessagePack
+    (decode + validasi body /publish, encode response /events)
+    """
+    msgpack = pytest.importorskip("msgpack")
+    import json
+    from src.models import EventsResponse
+    from src.wire import decode_publish_body, encode_response
+    
+    raw = [
+        {
+            "topic": f"wire-{i % 8}",
+            "event_id": f"evt-{i:08d}",
+            "timestamp": "2025-10-22T10:00:00Z",
+            "source": "bench",
+            "payload": {"user_id": i, "action": "click", "score": i * 0.5, "tags": ["a", "b", "c"]}
+        }
+        for i in range(5000)
+    ]
+    bodies = {
+        "json": (json.dumps(raw).encode(), "application/json"),
+        "msgpack": (msgpack.packb(raw), "application/msgpack"),
+    }
+    response_model = EventsResponse(
+        topic="wire", count=len(raw), events=decode_publish_body(*bodies["json"])
+    )
+    
+    print(f"\n=== Wire Format ({len(raw)} events) ===")
+    results = {}
+    for name, (body, content_type) in bodies.items():
+        rounds = 5
+        start = time.process_time()
+        for _ in range(rounds):
+            events = decode_publish_body(body, content_type)
+        decode_us = (time.process_time() - start) / rounds / len(raw) * 1e6
+        
+        start = time.process_time()
+        for _ in range(rounds):
+            encoded = encode_response(response_model, content_type).body
+        encode_us = (time.process_time() - start) / rounds / len(raw) * 1e6
+        
+        assert len(events) == len(raw)
+        results[name] = len(body)
+        print(f"{name:8s}: request {len(body) / len(raw):6.1f} B/event, "
+              f"response {len(encoded) / len(raw):6.1f} B/event, "
+              f"decode+validate {decode_us:5.2f} us/event, encode {encode_us:5.2f} us/event")
+    
+    assert results["msgpack"] < results["json"]
+
+
+def test_validation_cost_trusted_vs_full():
+    """
+    Microbenchmark: biaya validasi per event, path normal (model Event penuh +
+    validator fromisoformat) vs fast path producer terpercaya
+    """
+    import json
+    from src.wire import decode_publish_body
+    
+    raw = [
+        {
+            "topic": f"validate-{i % 8}",
+            "event_id": f"evt-{i:08d}",
+            "timestamp": "2025-10-22T10:00:00.123456Z",
+            "source": "bench",
+            "payload": {"user_id": i, "action": "click"}
+        }
+        for i in range(10000)
+    ]
+    body = json.dumps(raw).encode()
+    
+    def cost(trusted):
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            events = decode_publish_body(body, "application/json", trusted=trusted)
+            best = min(best, time.perf_counter() - start)
+        assert len(events) == len(raw)
+        assert events[-1].event_id == raw[-1]["event_id"]
+        return best / len(raw) * 1e6
+    
+    full_us = cost(False)
+    trusted_us = cost(True)
+    
+    print(f"\n=== Validation Cost ({len(raw)} events) ===")
+    print(f"Full model validation: {full_us:.2f} us/event")
+    print(f"Trusted fast path:     {trusted_us:.2f} us/event ({full_us / trusted_us:.1f}x)")
+    
+    assert trusted_us < full_us
+
+
+@pytest.mark.asyncio
+async def test_memory_per_queued_event(temp_db):
+    """
+    Test: Memory per event di queue processor, model Event (sebelum) vs
+    EventRecord dengan payload JSON pra-serialisasi (sesudah)
+    """
+    import gc
+    import tracemalloc
+    from src.models import EventRecord
+    
+    count = 10000
+    
+    def make_events():
+        return [
+            Event(
+                topic=f"mem-{i % 8}",
+                event_id=f"evt-{i:08d}",
+                timestamp="2025-10-22T10:00:00Z",
+                source="bench",
+                payload={"user_id": i, "action": "click", "tags": ["a", "b"]}
+            )
+            for i in range(count)
+        ]
+    
+    def traced(build):
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        kept = build()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return kept, (after - before) / count
+    
+    events = make_events()
+    
+    # Sebelum: model Event penuh yang disimpan di queue
+    _, model_bytes = traced(lambda: [
+        Event(topic=e.topic, event_id=e.event_id, timestamp=e.timestamp,
+              source=e.source, payload=dict(e.payload))
+        for e in events
+    ])
+    
+    # Sesudah: record di queue processor setelah di-claim (payload sudah JSON)
+    proc = EventProcessor(DedupStore(db_path=temp_db), num_partitions=4)
+    
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    await proc.submit_events(events)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Termasuk tuple queue dan entry key cache, jadi perkiraan atas
+    record_bytes = (after - before) / count
+    
+    assert proc.queue_depth() == count
+    queued = proc.partitions[0].queue.get_nowait()[2]
+    assert isinstance(queued, EventRecord)
+    assert queued.payload["tags"] == ["a", "b"]
+    
+    print(f"\n=== Memory per Queued Event ({count} events) ===")
+    print(f"Event model (before): {model_bytes:.0f} B/event")
+    print(f"EventRecord (after):  {record_bytes:.0f} B/event")
+    
+    assert record_bytes < model_bytes
+    proc.dedup_store.close()
+
+
+def test_keyset_pagination_deep_pages(temp_db):
+    """
+    Benchmark: Halaman dalam dengan cursor sama murahnya dengan halaman
+    pertama pada topic berisi 1 juta event (dibandingkan OFFSET)
+    """
+    from src.dedup_store import encode_cursor
+    
+    store = DedupStore(db_path=temp_db)
+    total = 1_000_000
+    
+    start = time.perf_counter()
+    with store.lock, store._writer as conn:
+        conn.executemany(
+            """
+            INSERT INTO event_log
+            (topic, event_id, timestamp, source, payload, processed_at, event_ts)
+            VALUES ('big', ?, '2025-10-22T10:00:00Z', 'bench', '{}', ?, 1761127200.0)
+            """,
+            (
+                (f"evt-{i:08d}", f"2025-10-22T10:{(i // 10000) % 60:02d}:{(i // 100) % 60:02d}.{i % 100:06d}")
+                for i in range(total)
+            )
+        )
+    print(f"\n=== Keyset Pagination ({total} rows) ===")
+    print(f"Seed: {time.perf_counter() - start:.1f}s")
+    
+    def timed(fn, rounds=5):
+        best = float("inf")
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - t0)
+        return result, best * 1000
+    
+    (first, cursor), first_ms = timed(lambda: store.get_events_page("big", limit=100))
+    assert len(first) == 100 and cursor is not None
+    
+    # Posisi cursor di kedalaman ~900k row
+    depth = 900_000
+    with store._reader() as conn:
+        processed_at, event_id = conn.execute(
+            "SELECT processed_at, event_id FROM event_log WHERE topic = 'big' "
+            "ORDER BY processed_at DESC, event_id DESC LIMIT 1 OFFSET ?", (depth - 1,)
+        ).fetchone()
+    deep_cursor = encode_cursor(processed_at, event_id)
+    
+    (deep, _), deep_ms = timed(lambda: store.get_events_page("big", limit=100, cursor=deep_cursor))
+    assert len(deep) == 100
+    
+    def offset_page():
+        with store._reader() as conn:
+            return conn.execute(
+                "SELECT topic, event_id, timestamp, source, payload FROM event_log "
+                "WHERE topic = 'big' ORDER BY processed_at DESC, event_id DESC LIMIT 100 OFFSET ?",
+                (depth,)
+            ).fetchall()
+    
+    offset_rows, offset_ms = timed(offset_page, rounds=2)
+    assert [r[1] for r in offset_rows] == [e.event_id for e in deep]
+    
+    print(f"First page (cursor):        {first_ms:.2f}ms")
+    print(f"Page at depth {depth} (cursor): {deep_ms:.2f}ms")
+    print(f"Page at depth {depth} (OFFSET): {offset_ms:.2f}ms")
+    
+    assert deep_ms < offset_ms / 10
+    assert deep_ms < first_ms * 5 + 2
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_export_memory_constant(temp_db):
+    """
+    Test: Export seluruh topic secara streaming memakai memory O(chunk),
+    bukan O(jumlah event) seperti query yang di-materialize
+    """
+    import tracemalloc
+    from src.export import stream_export
+    
+    store = DedupStore(db_path=temp_db)
+    total = 200_000
+    with store.lock, store._writer as conn:
+        conn.executemany(
+            """
+            INSERT INTO event_log
+            (topic, event_id, timestamp, source, payload, processed_at, event_ts)
+            VALUES ('export', ?, '2025-10-22T10:00:00Z', 'bench', ?, ?, 1761127200.0)
+            """,
+            (
+                (f"evt-{i:08d}", f'{{"index": {i}, "data": "{"x" * 100}"}}', f"2025-10-22T10:00:00.{i:06d}")
+                for i in range(total)
+            )
+        )
+    proc = EventProcessor(store)
+    
+    tracemalloc.start()
+    start = time.perf_counter()
+    exported_bytes = 0
+    lines = 0
+    async for chunk in stream_export(proc, "export"):
+        exported_bytes += len(chunk)
+        lines += chunk.count(b"\n")
+    elapsed = time.perf_counter() - start
+    _, stream_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    
+    materialized = store.get_events_by_topic("export", limit=total)
+    _, list_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    print(f"\n=== Topic Export ({total} events, {exported_bytes / 1024 / 1024:.1f} MiB) ===")
+    print(f"Streaming export: {elapsed:.2f}s, {total / elapsed:.0f} events/s, "
+          f"peak {stream_peak / 1024 / 1024:.1f} MiB")
+    print(f"Materialized list: peak {list_peak / 1024 / 1024:.1f} MiB")
+    
+    assert lines == total
+    assert len(materialized) == total
+    assert stream_peak < exported_bytes / 10
+    store.close()
+
+
+def test_stats_cost_independent_of_table_size(temp_db):
+    """
+    Benchmark: get_stats membaca counter per topic, bukan SELECT DISTINCT
+    atas seluruh tabel, jadi biayanya tidak naik seiring jumlah event
+    """
+    from src.models import EventRecord
+    
+    store = DedupStore(db_path=temp_db)
+    proc = EventProcessor(store)
+    
+    def timed_stats(rounds=50):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            stats = proc.get_stats()
+        return stats, (time.perf_counter() - start) / rounds * 1000
+    
+    def seed(start_index, count):
+        for b in range(start_index, start_index + count, 5000):
+            store.claim_many([
+                EventRecord(f"stats-{i % 20}", f"evt-{i}", "2025-10-22T10:00:00Z", "bench")
+                for i in range(b, b + 5000)
+            ])
+    
+    seed(0, 10_000)
+    small, small_ms = timed_stats()
+    assert small.stored_events == 10_000
+    seed(10_000, 190_000)
+    large, large_ms = timed_stats()
+    
+    with store._reader() as conn:
+        t0 = time.perf_counter()
+        conn.execute("SELECT DISTINCT topic FROM event_log").fetchall()
+        distinct_ms = (time.perf_counter() - t0) * 1000
+    
+    print(f"\n=== /stats Cost ===")
+    print(f"get_stats with 10k events:  {small_ms:.3f}ms")
+    print(f"get_stats with 200k events: {large_ms:.3f}ms")
+    print(f"SELECT DISTINCT topic (200k, old path): {distinct_ms:.2f}ms")
+    
+    assert large.stored_events == 200_000
+    assert len(large.topic_stats) == 20
+    assert large_ms < max(small_ms * 3, 1.0)
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_compaction_does_not_stall_ingest(temp_db):
+    """
+    Benchmark: expiry 200k event berjalan per batch pendek, sehingga claim
+    yang masuk selama compaction tetap dilayani di antara batch
+    """
+    from datetime import timedelta
+    from src.dedup_store import RetentionPolicy
+    from src.models import EventRecord
+    from src.async_store import AsyncDedupStore
+    
+    store = DedupStore(
+        db_path=temp_db,
+        retention=RetentionPolicy(
+            retention_seconds=3600, topic_retention={"new": 0}, batch_size=1000
+        )
+    )
+    for b in range(0, 200_000, 5000):
+        store.claim_many([
+            EventRecord("old", f"evt-{i}", "2025-10-22T10:00:00Z", "bench", {"i": i})
+            for i in range(b, b + 5000)
+        ])
+    astore = AsyncDedupStore(store)
+    
+    # Semua event "old" dianggap sudah lewat window ("new" disimpan selamanya)
+    later = datetime.utcnow() + timedelta(hours=2)
+    
+    async def compact():
+        total = 0
+        while True:
+            expired = await astore._run(astore._writer, store.expire_batch, later)
+            total += expired
+            if expired < store.retention.batch_size:
+                return total
+    
+    claim_latencies = []
+    
+    async def ingest():
+        i = 0
+        while not compaction.done():
+            t0 = time.perf_counter()
+            await astore.claim_many([
+                EventRecord("new", f"evt-{i}-{j}", "2025-10-22T10:00:00Z", "bench")
+                for j in range(50)
+            ])
+            claim_latencies.append((time.perf_counter() - t0) * 1000)
+            i += 1
+    
+    start = time.perf_counter()
+    compaction = asyncio.create_task(compact())
+    await asyncio.gather(compaction, ingest())
+    elapsed = time.perf_counter() - start
+    
+    metrics = store.retention_stats()
+    batches = 200_000 // store.retention.batch_size
+    claim_latencies.sort()
+    p99 = claim_latencies[int(len(claim_latencies) * 0.99) - 1]
+    
+    print(f"\n=== Compaction ===")
+    print(f"Expired {metrics['expired_events']} events in {elapsed:.2f}s")
+    print(f"Writer lock per batch: {metrics['compaction_seconds'] / batches * 1000:.2f}ms")
+    print(f"Claims during compaction: {len(claim_latencies)}, p99 {p99:.2f}ms, "
+          f"max {claim_latencies[-1]:.2f}ms")
+    
+    assert compaction.result() == 200_000
+    assert metrics["expired_events"] == 200_000
+    assert {t.topic for t in store.get_topic_stats()} == {"new"}
+    # Ingest terus berjalan (tidak menunggu seluruh compaction selesai)
+    assert len(claim_latencies) >= batches / 2
+    assert p99 < 250
+    await astore.close()
+
+
+def test_dedup_key_lookup_split_layout(tmp_path):
+    """
+    Benchmark: lookup duplikasi di dedup_keys (hash 16 byte, WITHOUT ROWID)
+    dibandingkan layout lama (PRIMARY KEY (topic, event_id) di tabel event)
+    
+    Jumlah key default 200k; set DEDUP_BENCH_KEYS=10000000 untuk skala 10M.
+    """
+    import random
+    import sqlite3
+    import uuid
+    from src.dedup_store import dedup_key_hash
+    
+    total = int(os.getenv("DEDUP_BENCH_KEYS", "200000"))
+    chunk = 100_000
+    rng = random.Random(7)
+    
+    def id_chunks():
+        """Event ID UUID acak yang sama untuk kedua layout, per chunk"""
+        ids_rng = random.Random(42)
+        for b in range(0, total, chunk):
+            yield [
+                str(uuid.UUID(int=ids_rng.getrandbits(128), version=4))
+                for _ in range(min(chunk, total - b))
+            ]
+    
+    # Layout baru: hanya key hash yang ikut di B-tree dedup
+    store = DedupStore(db_path=str(tmp_path / "split.db"), key_cache_size=0)
+    sample = []
+    start = time.perf_counter()
+    with store.lock:
+        for ids in id_chunks():
+            sample.extend(rng.sample(ids, 20))
+            with store._writer as conn:
+                conn.executemany(
+                    "INSERT INTO dedup_keys (key_hash) VALUES (?)",
+                    ((dedup_key_hash("orders", event_id),) for event_id in ids)
+                )
+    split_seed = time.perf_counter() - start
+    
+    # Layout lama: dedup lewat autoindex (topic, event_id) di tabel berisi payload
+    legacy = sqlite3.connect(str(tmp_path / "legacy.db"))
+    legacy.execute("PRAGMA journal_mode = WAL")
+    legacy.execute("""
+        CREATE TABLE processed_events (
+            topic TEXT NOT NULL, event_id TEXT NOT NULL, timestamp TEXT NOT NULL,
+            source TEXT NOT NULL, payload TEXT, processed_at TEXT NOT NULL,
+            PRIMARY KEY (topic, event_id)
+        )
+    """)
+    start = time.perf_counter()
+    for ids in id_chunks():
+        with legacy:
+            legacy.executemany(
+                "INSERT INTO processed_events VALUES "
+                "('orders', ?, '2025-10-22T10:00:00Z', 'bench', '{}', '2025-10-22T10:00:00')",
+                ((event_id,) for event_id in ids)
+            )
+    legacy_seed = time.perf_counter() - start
+    
+    # Lookup dibaca dari file database, bukan WAL yang besar sesudah seeding
+    store.checkpoint("TRUNCATE")
+    legacy.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    
+    probes = [(event_id, True) for event_id in sample]
+    probes += [(str(uuid.uuid4()), False) for _ in range(len(sample))]
+    rng.shuffle(probes)
+    
+    def latencies(lookup):
+        for event_id, _ in probes:
+            lookup(event_id)  # warm-up page cache
+        result = []
+        for event_id, expected in probes:
+            t0 = time.perf_counter()
+            found = lookup(event_id) is not None
+            result.append((time.perf_counter() - t0) * 1e6)
+            assert found == expected
+        result.sort()
+        return result[len(result) // 2], result[int(len(result) * 0.99) - 1]
+    
+    with store._reader() as conn:
+        split_p50, split_p99 = latencies(lambda event_id: conn.execute(
+            "SELECT 1 FROM dedup_keys WHERE key_hash = ?", (dedup_key_hash("orders", event_id),)
+        ).fetchone())
+        split_pages = conn.execute(
+            "SELECT COUNT(*) FROM dbstat WHERE name = 'dedup_keys'"
+        ).fetchone()[0]
+    legacy_p50, legacy_p99 = latencies(lambda event_id: legacy.execute(
+        "SELECT 1 FROM processed_events WHERE topic = 'orders' AND event_id = ?", (event_id,)
+    ).fetchone())
+    legacy_pages = legacy.execute(
+        "SELECT COUNT(*) FROM dbstat WHERE name = 'sqlite_autoindex_processed_events_1'"
+    ).fetchone()[0]
+    page_size = legacy.execute("PRAGMA page_size").fetchone()[0]
+    legacy.close()
+    
+    print(f"\n=== Dedup Key Lookup ({total} keys) ===")
+    print(f"Split (dedup_keys):  seed {split_seed:.1f}s, lookup p50 {split_p50:.1f}us "
+          f"p99 {split_p99:.1f}us, index {split_pages * page_size / total:.1f} B/key")
+    print(f"Legacy (autoindex):  seed {legacy_seed:.1f}s, lookup p50 {legacy_p50:.1f}us "
+          f"p99 {legacy_p99:.1f}us, index {legacy_pages * page_size / total:.1f} B/key")
+    
+    # Index dedup jauh lebih kecil, sehingga lebih banyak key muat di page cache
+    assert split_pages < legacy_pages / 2
+    # Latensi hanya dibandingkan relatif (median) terhadap layout lama; p99
+    # absolut terlalu bergantung pada beban mesin saat test berjalan
+    assert split_p50 <= legacy_p50 * 4
+    store.close()
+
+
+def test_segment_log_vs_table_reads(tmp_path):
+    """
+    Test: Backend segment log vs tabel event_log SQLite
+    
+    Ingest batch yang sama ke kedua backend, lalu bandingkan export (JSON
+    apa adanya) dan halaman /events (EventRecord -> Event), serta ukuran
+    database SQLite yang tersisa (dengan segment log hanya berisi key).
+    """
+    from src.models import EventRecord
+    
+    total = 20_000
+    events = [
+        EventRecord(
+            f"topic-{i % 4}", f"evt-{i:07d}", "2025-10-22T10:00:00Z", "bench",
+            {"user": i, "data": "x" * 400}
+        )
+        for i in range(total)
+    ]
+    results = {}
+    for name, options in (("table", {}), ("segment", {"event_log_dir": str(tmp_path / "log")})):
+        db_path = str(tmp_path / f"{name}.db")
+        store = DedupStore(db_path=db_path, key_cache_size=0, **options)
+        
+        start = time.perf_counter()
+        for i in range(0, total, 500):
+            store.claim_many(events[i:i + 500])
+        ingest = time.perf_counter() - start
+        store.checkpoint("TRUNCATE")
+        
+        def export():
+            size, cursor = 0, None
+            while True:
+                lines, cursor = store.get_events_json_page("topic-1", 1000, cursor)
+                size += len(b"\n".join(lines))
+                if cursor is None:
+                    return size
+        
+        def pages():
+            count, cursor = 0, None
+            while True:
+                page, cursor = store.get_events_page("topic-1", 100, cursor)
+                count += len([record.to_event() for record in page])
+                if cursor is None:
+                    return count
+        
+        export()  # warm-up page cache
+        start = time.perf_counter()
+        exported = export()
+        export_time = time.perf_counter() - start
+        start = time.perf_counter()
+        assert pages() == total // 4
+        pages_time = time.perf_counter() - start
+        
+        results[name] = {
+            "ingest": total / ingest,
+            "export": total / 4 / export_time,
+            "pages": total / 4 / pages_time,
+            "exported": exported,
+            "db_bytes": os.path.getsize(db_path),
+        }
+        store.close()
+    
+    print(f"\n=== Segment Log vs SQLite event_log ({total} events) ===")
+    for name, r in results.items():
+        print(f"{name:8s}: ingest {r['ingest']:8.0f} ev/s, export {r['export']:8.0f} ev/s, "
+              f"/events pages {r['pages']:8.0f} ev/s, SQLite file {r['db_bytes'] / 1024:8.0f} KiB")
+    
+    # Export identik byte-per-byte, tapi dibaca dari slice mmap tanpa serialisasi ulang
+    assert results["segment"]["exported"] == results["table"]["exported"]
+    assert results["segment"]["export"] > results["table"]["export"]
+    # Payload tidak lagi ada di SQLite
+    assert results["segment"]["db_bytes"] < results["table"]["db_bytes"] / 4
+
+
+def test_memory_engine_vs_sqlite_claims(tmp_path):
+    """
+    Benchmark: claim_many engine memory (dengan dan tanpa snapshot) vs SQLite
+    
+    Engine memory tidak melakukan I/O di jalur claim; snapshot ditulis di
+    luar lock, jadi biayanya hanya terlihat di waktu snapshot dan restart.
+    """
+    from src.memory_store import MemoryDedupStore
+    from src.models import EventRecord
+    
+    total = 40000
+    events = [
+        EventRecord(f"topic-{i % 4}", f"evt-{i:06d}", "2025-10-22T10:00:00Z", "bench", {"user": i})
+        for i in range(total)
+    ]
+    snapshot_path = str(tmp_path / "snapshot.jsonl")
+    engines = {
+        "sqlite": lambda: DedupStore(db_path=str(tmp_path / "dedup.db"), key_cache_size=0),
+        "memory": lambda: MemoryDedupStore(),
+        "memory+snapshot": lambda: MemoryDedupStore(snapshot_path=snapshot_path),
+    }
+    results = {}
+    for name, open_store in engines.items():
+        store = open_store()
+        start = time.perf_counter()
+        for i in range(0, total, 500):
+            store.claim_many(events[i:i + 500])
+        claim_rate = total / (time.perf_counter() - start)
+        # Retry producer: semua event sudah pernah diterima
+        start = time.perf_counter()
+        for i in range(0, total, 500):
+            store.claim_many(events[i:i + 500])
+        duplicate_rate = total / (time.perf_counter() - start)
+        store.close()
+        
+        start = time.perf_counter()
+        store = open_store()
+        restart = time.perf_counter() - start
+        assert store.claim_many(events[:10]) == ([True] * 10 if name == "memory" else [False] * 10)
+        store.close()
+        results[name] = (claim_rate, duplicate_rate, restart)
+    
+    print(f"\n=== Storage engines: claim_many ({total} events, batch 500) ===")
+    for name, (claim_rate, duplicate_rate, restart) in results.items():
+        print(f"{name:16s}: {claim_rate:9.0f} ev/s new, {duplicate_rate:9.0f} ev/s duplicate, "
+              f"restart {restart * 1000:7.1f} ms")
+    
+    assert results["memory"][0] > results["sqlite"][0]
+    assert results["memory+snapshot"][0] > results["sqlite"][0]
+
+
+def test_lmdb_engine_vs_sqlite(tmp_path):
+    """
+    Benchmark: engine LMDB vs SQLite untuk claim_many dan waktu restart
+    
+    Keduanya dengan fsync per batch (LMDB sync=True, SQLite profil WAL
+    default); restart diukur sampai store siap menerima claim.
+    """
+    pytest.importorskip("lmdb")
+    from src.lmdb_store import LmdbDedupStore
+    from src.models import EventRecord
+    
+    total = 40000
+    events = [
+        EventRecord(f"topic-{i % 4}", f"evt-{i:06d}", "2025-10-22T10:00:00Z", "bench", {"user": i})
+        for i in range(total)
+    ]
+    engines = {
+        "sqlite": lambda: DedupStore(db_path=str(tmp_path / "dedup.db"), key_cache_size=0),
+        "lmdb": lambda: LmdbDedupStore(path=str(tmp_path / "dedup.lmdb"), map_size=2 ** 30),
+    }
+    results = {}
+    for name, open_store in engines.items():
+        store = open_store()
+        start = time.perf_counter()
+        for i in range(0, total, 500):
+            store.claim_many(events[i:i + 500])
+        claim_rate = total / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for i in range(0, total, 500):
+            store.claim_many(events[i:i + 500])
+        duplicate_rate = total / (time.perf_counter() - start)
+        store.close()
+        
+        start = time.perf_counter()
+        store = open_store()
+        assert store.claim_many(events[:10]) == [False] * 10
+        restart = time.perf_counter() - start
+        store.close()
+        results[name] = (claim_rate, duplicate_rate, restart)
+    
+    print(f"\n=== LMDB vs SQLite: claim_many ({total} events, batch 500) ===")
+    for name, (claim_rate, duplicate_rate, restart) in results.items():
+        print(f"{name:8s}: {claim_rate:9.0f} ev/s new, {duplicate_rate:9.0f} ev/s duplicate, "
+              f"restart {restart * 1000:7.1f} ms")
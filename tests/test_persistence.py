@@ -4,9 +4,11 @@ Test persistence setelah restart
 import pytest
 import tempfile
 import os
-from src.models import Event
-from src.dedup_store import DedupStore
-from datetime import datetime
+from src.models import Event, EventRecord
+from src.dedup_store import DedupStore, RetentionPolicy
+from src.event_processor import EventProcessor
+from datetime import datetime, timedelta
+import asyncio
 
 
 @pytest.fixture
@@ -17,8 +19,10 @@ def temp_db_path():
     
     yield db_path
     
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    # Hapus juga file WAL/shared-memory
+    for path in (db_path, db_path + "-wal", db_path + "-shm", db_path + ".bloom"):
+        if os.path.exists(path):
+            os.unlink(path)
 
 
 def test_persistence_after_restart(temp_db_path):
@@ -166,3 +170,445 @@ def test_concurrent_access_simulation(temp_db_path):
     
     # Both should have same count
     assert store1.get_total_processed() == store2.get_total_processed()
+
+
+def test_group_commit_persists_after_restart(temp_db_path):
+    """Test: Batch yang sudah commit via mark_processed_many durable setelah restart"""
+    store1 = DedupStore(db_path=temp_db_path)
+    
+    events = [
+        Event(
+            topic="group-persist",
+            event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={"index": i}
+        )
+        for i in range(20)
+    ]
+    
+    assert all(store1.mark_processed_many(events))
+    store1.close()
+    
+    # Phase 2: restart
+    store2 = DedupStore(db_path=temp_db_path)
+    assert store2.get_total_processed() == 20
+    assert store2.mark_processed_many(events) == [False] * 20
+    for event in events:
+        assert store2.is_duplicate(event)
+
+
+@pytest.mark.asyncio
+async def test_batched_processor_acknowledged_after_restart(temp_db_path):
+    """
+    Test: Event yang sudah di-flush oleh processor (group commit)
+    tetap terdeteksi duplikasi setelah restart
+    """
+    store1 = DedupStore(db_path=temp_db_path)
+    proc1 = EventProcessor(store1, batch_size=25, batch_timeout_ms=50)
+    await proc1.start()
+    
+    events = [
+        Event(
+            topic="batch-persist",
+            event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={"index": i}
+        )
+        for i in range(60)
+    ]
+    
+    await proc1.submit_events(events)
+    
+    # Tunggu sampai semua batch di-flush (acknowledged)
+    for _ in range(100):
+        if proc1.get_stats().unique_processed == len(events):
+            break
+        await asyncio.sleep(0.05)
+    
+    await proc1.stop()
+    assert proc1.get_stats().unique_processed == len(events)
+    
+    # Phase 2: restart
+    store2 = DedupStore(db_path=temp_db_path)
+    proc2 = EventProcessor(store2, batch_size=25, batch_timeout_ms=50)
+    await proc2.start()
+    
+    await proc2.submit_events(events)
+    for _ in range(100):
+        if proc2.get_stats().duplicate_dropped == len(events):
+            break
+        await asyncio.sleep(0.05)
+    
+    await proc2.stop()
+    # Counter lifetime: unique dari sebelum restart tetap terhitung
+    stats = proc2.get_stats()
+    assert stats.duplicate_dropped == len(events)
+    assert stats.unique_processed == len(events)
+    assert stats.received == 2 * len(events)
+
+
+def _bloom_events(prefix, count):
+    return [
+        Event(
+            topic="bloom-persist",
+            event_id=f"{prefix}-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={}
+        )
+        for i in range(count)
+    ]
+
+
+def test_bloom_snapshot_after_restart(temp_db_path):
+    """Test: Snapshot Bloom filter dipakai setelah clean restart"""
+    store1 = DedupStore(db_path=temp_db_path, bloom_capacity=1000)
+    events = _bloom_events("evt", 50)
+    store1.mark_processed_many(events)
+    store1.close()
+    
+    assert os.path.exists(temp_db_path + ".bloom")
+    
+    store2 = DedupStore(db_path=temp_db_path, bloom_capacity=1000, key_cache_size=0)
+    assert store2.bloom.count == 50
+    for event in events:
+        assert store2.is_duplicate(event)
+    store2.close()
+
+
+def test_bloom_snapshot_discarded_after_crash(temp_db_path):
+    """
+    Test: Insert setelah snapshot di-load tanpa clean close (crash)
+    tidak boleh menjadi false negative setelah restart
+    """
+    store1 = DedupStore(db_path=temp_db_path, bloom_capacity=1000)
+    store1.mark_processed_many(_bloom_events("old", 10))
+    store1.close()
+    
+    # Load snapshot, insert lagi, lalu "crash" (tanpa close)
+    store2 = DedupStore(db_path=temp_db_path, bloom_capacity=1000)
+    late_events = _bloom_events("late", 10)
+    store2.mark_processed_many(late_events)
+    del store2
+    
+    # Snapshot lama masih ada di disk tapi tokennya sudah tidak valid
+    store3 = DedupStore(db_path=temp_db_path, bloom_capacity=1000, key_cache_size=0)
+    assert store3.bloom.count == 20
+    for event in late_events:
+        assert store3.is_duplicate(event)
+    store3.close()
+
+
+def test_bloom_rebuilt_from_dedup_keys(tmp_path):
+    """
+    Test: Filter di-rebuild dari dedup_keys, bukan event log, sehingga
+    membuka ulang store tanpa segment log tidak menghasilkan false negative
+    """
+    db_path = str(tmp_path / "dedup.db")
+    events = _bloom_events("evt", 5)
+    store1 = DedupStore(db_path=db_path, event_log_dir=str(tmp_path / "events"))
+    store1.claim_many(events)
+    store1.close()
+    
+    store2 = DedupStore(db_path=db_path, bloom_capacity=1000, key_cache_size=0)
+    assert store2.bloom.count == 5
+    assert all(store2.is_duplicate(event) for event in events)
+    assert store2.claim_many(events + _bloom_events("new", 2)) == [False] * 5 + [True] * 2
+    store2.close()
+
+
+def test_bloom_false_negative_does_not_fail_batch(temp_db_path):
+    """Test: Key yang filter-nya tidak sinkron tetap duplikasi, batch tidak gagal"""
+    events = _bloom_events("evt", 5)
+    store = DedupStore(db_path=temp_db_path, bloom_capacity=1000, key_cache_size=0)
+    store.claim_many(events[:3])
+    store.bloom.clear()
+    
+    assert store.claim_many(events) == [False] * 3 + [True] * 2
+    assert store.bloom_false_negatives == 3
+    assert store.get_total_processed() == 5
+    assert store.get_counters()["duplicate_dropped"] == 3
+    store.close()
+
+
+def _create_legacy_db(db_path, rows):
+    """Buat database layout lama: key dan payload dalam satu tabel processed_events"""
+    import sqlite3
+    
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE processed_events (
+            topic TEXT NOT NULL,
+            event_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            source TEXT NOT NULL,
+            payload TEXT,
+            processed_at TEXT NOT NULL,
+            PRIMARY KEY (topic, event_id)
+        )
+    """)
+    conn.execute("CREATE INDEX idx_topic ON processed_events(topic)")
+    conn.executemany("INSERT INTO processed_events VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_migrates_old_schema_with_event_ts(temp_db_path):
+    """Test: Database lama tanpa kolom event_ts di-migrate dan bisa difilter"""
+    _create_legacy_db(temp_db_path, [
+        ("legacy", "evt-old", "2024-01-01T00:00:00Z", "test", "{}", "2024-01-01T00:00:01"),
+        ("legacy", "evt-new", "2025-01-01T00:00:00Z", "test", '{"k": 1}', "2025-01-01T00:00:01"),
+    ])
+    
+    store = DedupStore(db_path=temp_db_path)
+    page, _ = store.get_events_page("legacy", since=1704067200.0 + 1)
+    assert [event.event_id for event in page] == ["evt-new"]
+    assert page[0].payload == {"k": 1}
+    
+    indexes = {
+        row[1] for row in store._writer.execute("PRAGMA index_list(event_log)")
+    }
+    assert "idx_topic_processed_at" in indexes
+    assert "idx_topic" not in indexes
+    store.close()
+
+
+def test_migrates_processed_events_to_split_layout(temp_db_path):
+    """Test: processed_events lama dipindah ke dedup_keys + event_log, dedup tetap jalan"""
+    _create_legacy_db(temp_db_path, [
+        ("orders", f"evt-{i}", "2025-01-01T00:00:00Z", "test", f'{{"i": {i}}}', f"2025-01-01T00:00:{i:02d}")
+        for i in range(20)
+    ])
+    
+    store = DedupStore(db_path=temp_db_path)
+    tables = {
+        row[0] for row in store._writer.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    assert "processed_events" not in tables
+    assert {"dedup_keys", "event_log"} <= tables
+    assert store.get_total_processed() == 20
+    
+    legacy = Event(topic="orders", event_id="evt-7", timestamp="2025-01-01T00:00:00Z", source="test")
+    assert store.is_duplicate(legacy)
+    assert store.claim_many([legacy, Event(
+        topic="orders", event_id="evt-20", timestamp="2025-01-01T00:00:00Z", source="test"
+    )]) == [False, True]
+    
+    page, _ = store.get_events_page("orders", limit=2)
+    assert [event.event_id for event in page] == ["evt-20", "evt-19"]
+    assert page[1].payload == {"i": 19}
+    store.close()
+    
+    # Restart: migrasi tidak diulang
+    store2 = DedupStore(db_path=temp_db_path)
+    assert store2.get_total_processed() == 21
+    assert store2.is_duplicate(legacy)
+    store2.close()
+
+
+def test_topic_stats_rebuilt_for_existing_database(temp_db_path):
+    """Test: Database tanpa tabel topic_stats mendapat counter dari isi tabel event"""
+    store1 = DedupStore(db_path=temp_db_path)
+    store1.claim_many([
+        Event(topic=f"t{i % 3}", event_id=f"evt-{i}", timestamp="2025-10-22T10:00:00Z", source="test")
+        for i in range(9)
+    ])
+    store1.close()
+    
+    # Simulasikan database versi lama
+    import sqlite3
+    conn = sqlite3.connect(temp_db_path)
+    conn.execute("DROP TABLE topic_stats")
+    conn.commit()
+    conn.close()
+    
+    store2 = DedupStore(db_path=temp_db_path)
+    assert {t.topic: t.count for t in store2.get_topic_stats()} == {"t0": 3, "t1": 3, "t2": 3}
+    assert store2.get_total_processed() == 9
+    store2.close()
+
+
+def test_counters_survive_restart(temp_db_path):
+    """Test: Counter received/unique/duplicate di-restore setelah restart"""
+    events = [
+        Event(topic="counters", event_id=f"evt-{i}", timestamp="2025-10-22T10:00:00Z", source="test")
+        for i in range(5)
+    ]
+    store1 = DedupStore(db_path=temp_db_path)
+    store1.claim_many(events)
+    store1.claim_many(events[:2])  # duplikasi dari key cache, tanpa transaksi
+    store1.close()
+    
+    store2 = DedupStore(db_path=temp_db_path)
+    assert store2.get_counters() == {"received": 7, "unique_processed": 5, "duplicate_dropped": 2}
+    
+    # Counter terus bertambah dari nilai yang di-restore
+    store2.claim_many(events[:1] + [
+        Event(topic="counters", event_id="evt-new", timestamp="2025-10-22T10:00:00Z", source="test")
+    ])
+    store2.close()
+    
+    store3 = DedupStore(db_path=temp_db_path)
+    assert store3.get_counters() == {"received": 9, "unique_processed": 6, "duplicate_dropped": 3}
+    store3.close()
+
+
+def test_counters_initialized_for_existing_database(temp_db_path):
+    """Test: Database tanpa tabel dedup_counters mulai dari jumlah event tersimpan"""
+    store1 = DedupStore(db_path=temp_db_path)
+    store1.claim_many([
+        Event(topic="t", event_id=f"evt-{i}", timestamp="2025-10-22T10:00:00Z", source="test")
+        for i in range(4)
+    ])
+    store1.close()
+    
+    import sqlite3
+    conn = sqlite3.connect(temp_db_path)
+    conn.execute("DROP TABLE dedup_counters")
+    conn.commit()
+    conn.close()
+    
+    store2 = DedupStore(db_path=temp_db_path)
+    assert store2.get_counters() == {"received": 4, "unique_processed": 4, "duplicate_dropped": 0}
+    store2.close()
+
+
+def test_expiry_and_incremental_vacuum_shrink_database(temp_db_path):
+    """Test: Database baru memakai auto_vacuum INCREMENTAL sehingga file menyusut setelah expiry"""
+    store = DedupStore(
+        db_path=temp_db_path,
+        retention=RetentionPolicy(retention_seconds=60, batch_size=2000, vacuum_pages=100_000)
+    )
+    with store._reader() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    
+    for b in range(0, 10_000, 2000):
+        store.claim_many([
+            Event(
+                topic="vacuum", event_id=f"evt-{i}", timestamp="2025-10-22T10:00:00Z",
+                source="test", payload={"data": "x" * 200}
+            )
+            for i in range(b, b + 2000)
+        ])
+    store.checkpoint("TRUNCATE")
+    size_before = os.path.getsize(temp_db_path)
+    
+    assert store.compact(now=datetime.utcnow() + timedelta(minutes=5)) == 10_000
+    store.checkpoint("TRUNCATE")
+    size_after = os.path.getsize(temp_db_path)
+    
+    assert store.retention_stats()["vacuumed_pages"] > 0
+    assert size_after < size_before / 2
+    store.close()
+    
+    # Counter per topic yang sudah kosong tidak muncul lagi setelah restart
+    store2 = DedupStore(db_path=temp_db_path)
+    assert store2.get_topic_stats() == []
+    assert store2.get_counters()["unique_processed"] == 10_000
+    store2.close()
+
+
+def _log_events(prefix, count):
+    return [
+        Event(
+            topic="log", event_id=f"{prefix}-{i:03d}", timestamp="2025-10-22T10:00:00Z",
+            source="test", payload={"i": i}
+        )
+        for i in range(count)
+    ]
+
+
+def test_segment_log_recovery_truncates_torn_tail(temp_db_path, tmp_path):
+    """Test: Record yang terpotong atau belum di-commit dibuang saat recovery segment log"""
+    log_dir = str(tmp_path / "log")
+    store1 = DedupStore(db_path=temp_db_path, event_log_dir=log_dir)
+    committed = _log_events("ok", 10)
+    assert all(store1.claim_many(committed))
+    
+    # Satu direktori log hanya boleh dibuka satu store
+    with pytest.raises(RuntimeError):
+        DedupStore(db_path=str(tmp_path / "other.db"), event_log_dir=log_dir)
+    
+    # Record ditulis ke segment tapi transaksi key tidak pernah commit (crash)
+    uncommitted = _log_events("lost", 1)[0]
+    store1.segment_log.append([
+        ("2099-01-01T00:00:00", None, EventRecord.from_event(uncommitted))
+    ])
+    store1.segment_log.sync(force=True)
+    base, offset = store1.segment_log.end.split(":")
+    store1.close()
+    
+    # Header record terakhir hanya tertulis sebagian (torn write)
+    segment = tmp_path / "log" / f"{int(base):020d}.log"
+    with open(segment, "r+b") as f:
+        f.seek(int(offset))
+        f.write(b"\xff\x01\x00\x00\x12\x34")
+    
+    store2 = DedupStore(db_path=temp_db_path, event_log_dir=log_dir)
+    assert _walk_log(store2) == [event.event_id for event in reversed(committed)]
+    assert store2.get_total_processed() == 10
+    assert store2.claim(uncommitted)
+    assert not store2.claim(committed[0])
+    store2.close()
+    
+    # Sisa record lama sudah dinolkan: restart berikutnya tetap konsisten
+    store3 = DedupStore(db_path=temp_db_path, event_log_dir=log_dir)
+    assert _walk_log(store3)[0] == uncommitted.event_id
+    assert store3.get_total_processed() == 11
+    assert store3.get_events_by_topic("log", limit=1)[0].payload == {"i": 0}
+    base, offset = store3.segment_log.end.split(":")
+    store3.close()
+    
+    # Tanpa posisi commit (mis. fsync_interval > 0): record dengan crc salah dipotong
+    import sqlite3
+    import struct
+    conn = sqlite3.connect(temp_db_path)
+    conn.execute("DELETE FROM dedup_meta WHERE key = 'event_log_end'")
+    conn.commit()
+    conn.close()
+    with open(tmp_path / "log" / f"{int(base):020d}.log", "r+b") as f:
+        f.seek(int(offset))
+        f.write(struct.pack("<IIdHHHHHI", 80, 12345, 0.0, 3, 4, 5, 6, 7, 2) + b"x" * 50)
+    
+    store4 = DedupStore(db_path=temp_db_path, event_log_dir=log_dir)
+    assert store4.get_total_processed() == 11
+    assert store4.claim(_log_events("after", 1)[0])
+    assert _walk_log(store4)[:2] == ["after-000", uncommitted.event_id]
+    store4.close()
+
+
+def _walk_log(store):
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = store.get_events_page("log", limit=4, cursor=cursor)
+        seen.extend(event.event_id for event in page)
+        if cursor is None:
+            return seen
+
+
+def test_sqlite_event_log_moved_to_segment_log(temp_db_path, tmp_path):
+    """Test: Event di tabel event_log dipindah ke segment log saat store pertama kali memakai log"""
+    store1 = DedupStore(db_path=temp_db_path)
+    events = _log_events("old", 30)
+    store1.claim_many(events[:15])
+    store1.claim_many(events[15:])
+    before = _walk_log(store1)
+    store1.close()
+    
+    log_dir = str(tmp_path / "log")
+    store2 = DedupStore(db_path=temp_db_path, event_log_dir=log_dir)
+    assert _walk_log(store2) == before
+    with store2._reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM event_log").fetchone()[0] == 0
+    assert store2.is_duplicate(events[3])
+    assert store2.claim_many(_log_events("new", 2) + events[:1]) == [True, True, False]
+    store2.close()
+    
+    store3 = DedupStore(db_path=temp_db_path, event_log_dir=log_dir)
+    assert _walk_log(store3)[:2] == ["new-001", "new-000"]
+    assert store3.get_total_processed() == 32
+    assert store3.get_counters()["unique_processed"] == 32
+    store3.close()
@@ -0,0 +1,355 @@
+"""
+Test event processor: worker pool dan urutan per topic
+"""
+import pytest
+import tempfile
+import os
+import asyncio
+import random
+from src.models import Event
+from src.dedup_store import DedupStore, RetentionPolicy
+from src.event_processor import EventProcessor
+from datetime import datetime
+
+
+@pytest.fixture
+def temp_db():
+    """Fixture untuk temporary database"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.db') as f:
+        db_path = f.name
+    
+    yield db_path
+    
+    # Hapus juga file WAL/shared-memory
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+class RecordingProcessor(EventProcessor):
+    """EventProcessor yang mencatat urutan dan concurrency per topic"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.processed = {}
+        self.active = {}
+        self.max_active = {}
+        self.max_total_active = 0
+    
+    async def _process_single_event(self, event: Event):
+        self.active[event.topic] = self.active.get(event.topic, 0) + 1
+        self.max_active[event.topic] = max(
+            self.max_active.get(event.topic, 0), self.active[event.topic]
+        )
+        self.max_total_active = max(self.max_total_active, sum(self.active.values()))
+        
+        await asyncio.sleep(random.uniform(0, 0.003))
+        
+        self.processed.setdefault(event.topic, []).append(int(event.event_id.split("-")[1]))
+        self.active[event.topic] -= 1
+
+
+def make_events(topics, per_topic):
+    """Buat event round-robin lintas topic dengan event_id berurutan per topic"""
+    return [
+        Event(
+            topic=f"topic-{t}",
+            event_id=f"evt-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={}
+        )
+        for i in range(per_topic)
+        for t in range(topics)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("num_workers,batch_size,num_partitions", [
+    (1, 1, 1), (4, 1, 1), (8, 16, 1), (1, 8, 4), (2, 4, 3)
+])
+async def test_per_topic_ordering_with_workers(temp_db, num_workers, batch_size, num_partitions):
+    """Test: Event di topic yang sama diproses berurutan dan tidak bersamaan"""
+    proc = RecordingProcessor(
+        DedupStore(db_path=temp_db),
+        batch_size=batch_size,
+        batch_timeout_ms=5,
+        num_workers=num_workers,
+        num_partitions=num_partitions
+    )
+    await proc.start()
+    
+    events = make_events(topics=5, per_topic=40)
+    for i in range(0, len(events), 25):
+        await proc.submit_events(events[i:i + 25])
+    
+    await proc.stop()
+    
+    assert len(proc.processed) == 5
+    for topic, order in proc.processed.items():
+        assert order == list(range(40)), f"Out of order for {topic}"
+        assert proc.max_active[topic] == 1, f"Concurrent processing for {topic}"
+    
+    if num_workers * num_partitions > 1:
+        assert proc.max_total_active > 1, "Workers should process topics concurrently"
+    
+    assert proc._topic_tails == {}
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_queue(temp_db):
+    """Test: stop() memproses semua event yang sudah di-claim sebelum berhenti"""
+    proc = RecordingProcessor(DedupStore(db_path=temp_db), num_workers=4)
+    await proc.start()
+    
+    await proc.submit_events(make_events(topics=3, per_topic=30))
+    await proc.stop()
+    
+    assert proc.queue_depth() == 0
+    assert sum(len(order) for order in proc.processed.values()) == 90
+
+
+class SlowHotTopicProcessor(EventProcessor):
+    """EventProcessor dengan processing lambat untuk topic "hot" """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.completed = []
+    
+    async def _process_single_event(self, event: Event):
+        if event.topic == "hot":
+            await asyncio.sleep(0.01)
+        self.completed.append(event.topic)
+
+
+def _topics_in_distinct_partitions(proc, count):
+    """Cari nama topic yang jatuh ke partisi berbeda"""
+    found = {}
+    i = 0
+    while len(found) < count:
+        topic = f"cold-{i}"
+        found.setdefault(proc.partition_for(topic).index, topic)
+        i += 1
+    return found
+
+
+@pytest.mark.asyncio
+async def test_hot_topic_does_not_starve_other_partitions(temp_db):
+    """Test: Backlog topic ramai tidak menahan topic di partisi lain"""
+    proc = SlowHotTopicProcessor(DedupStore(db_path=temp_db), batch_size=1, num_partitions=4)
+    await proc.start()
+    
+    hot_partition = proc.partition_for("hot")
+    cold_topic = next(
+        topic for index, topic in _topics_in_distinct_partitions(proc, 4).items()
+        if index != hot_partition.index
+    )
+    
+    hot_events = [
+        Event(topic="hot", event_id=f"hot-{i}",
+              timestamp=datetime.utcnow().isoformat() + "Z", source="test", payload={})
+        for i in range(100)
+    ]
+    cold_event = Event(topic=cold_topic, event_id="cold-0",
+                       timestamp=datetime.utcnow().isoformat() + "Z", source="test", payload={})
+    
+    await proc.submit_events(hot_events)
+    await proc.submit_events([cold_event])
+    
+    for _ in range(100):
+        if cold_topic in proc.completed:
+            break
+        await asyncio.sleep(0.005)
+    
+    # Event cold selesai jauh sebelum backlog hot habis
+    assert cold_topic in proc.completed
+    assert proc.completed.count("hot") < 50
+    
+    stats = proc.get_stats()
+    assert len(stats.partitions) == 4
+    hot_stats = stats.partitions[hot_partition.index]
+    assert hot_stats.depth > 0
+    assert hot_stats.enqueued == 100
+    
+    await proc.stop()
+    stats = proc.get_stats()
+    assert sum(p.processed for p in stats.partitions) == 101
+    assert all(p.depth == 0 for p in stats.partitions)
+    assert stats.partitions[hot_partition.index].lag_seconds > 0
+
+
+class StalledProcessor(EventProcessor):
+    """EventProcessor yang consumer-nya sangat lambat (overload)"""
+    
+    async def _process_single_event(self, event: Event):
+        await asyncio.sleep(0.05)
+
+
+def _batch(prefix, count, payload_size=0):
+    return [
+        Event(
+            topic=f"bp-{i % 4}",
+            event_id=f"{prefix}-{i}",
+            timestamp=datetime.utcnow().isoformat() + "Z",
+            source="test",
+            payload={"data": "x" * payload_size}
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_backpressure_rejects_when_full(temp_db):
+    """Test: Batch ditolak (QueueFullError) saat queue penuh dan tidak di-claim"""
+    from src.event_processor import QueueFullError
+    
+    proc = StalledProcessor(DedupStore(db_path=temp_db), max_queue_events=20, enqueue_timeout=0)
+    await proc.start()
+    
+    result = await proc.submit_events(_batch("a", 20))
+    assert result["processed"] == 20
+    
+    rejected = _batch("b", 5)
+    with pytest.raises(QueueFullError) as exc_info:
+        await proc.submit_events(rejected)
+    assert not exc_info.value.too_large
+    
+    # Event yang ditolak tidak boleh tercatat sebagai processed
+    assert not any(proc.dedup_store.is_duplicate(e) for e in rejected)
+    
+    with pytest.raises(QueueFullError) as exc_info:
+        await proc.submit_events(_batch("c", 21))
+    assert exc_info.value.too_large
+    
+    stats = proc.get_stats()
+    assert stats.rejected_events == 26
+    assert stats.rejected_requests == 2
+    assert stats.queue_depth <= 20
+    
+    await proc.stop()
+
+
+@pytest.mark.asyncio
+async def test_non_json_payload_rejected_before_claim(temp_db):
+    """Test: Payload non-JSON ditolak sebelum reserve/claim, batch berikutnya tetap diproses"""
+    from src.event_processor import InvalidPayloadError
+    
+    proc = EventProcessor(DedupStore(db_path=temp_db), max_queue_events=100, max_queue_bytes=10 ** 6)
+    await proc.start()
+    
+    batch = _batch("ok", 3)
+    bad = Event.model_construct(
+        topic="bp-0", event_id="bad", timestamp="2025-10-22T10:00:00Z", source="test",
+        payload={"b": b"\x00\x01"}
+    )
+    with pytest.raises(InvalidPayloadError):
+        await proc.submit_events(batch + [bad])
+    assert not any(proc.dedup_store.is_duplicate(e) for e in batch)
+    assert proc.queue_depth() == 0
+    
+    result = await proc.submit_events(batch)
+    assert result["processed"] == 3
+    await proc.stop()
+
+
+@pytest.mark.asyncio
+async def test_backpressure_waits_for_capacity(temp_db):
+    """Test: Publisher menunggu kapasitas sampai enqueue_timeout"""
+    proc = StalledProcessor(
+        DedupStore(db_path=temp_db), num_partitions=4, max_queue_events=8, enqueue_timeout=2.0
+    )
+    await proc.start()
+    
+    await proc.submit_events(_batch("a", 8))
+    result = await proc.submit_events(_batch("b", 4))
+    assert result["processed"] == 4
+    assert proc.get_stats().rejected_requests == 0
+    
+    await proc.stop()
+
+
+@pytest.mark.asyncio
+async def test_backpressure_bytes_limit(temp_db):
+    """Test: Limit bytes membatasi queue berdasarkan ukuran payload"""
+    from src.event_processor import QueueFullError
+    
+    proc = StalledProcessor(DedupStore(db_path=temp_db), max_queue_bytes=5000, enqueue_timeout=0)
+    await proc.start()
+    
+    await proc.submit_events(_batch("a", 3, payload_size=1000))
+    with pytest.raises(QueueFullError):
+        await proc.submit_events(_batch("b", 3, payload_size=1000))
+    
+    assert 3000 < proc.get_stats().queue_bytes <= 5000
+    await proc.stop()
+    assert proc.get_stats().queue_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_idle_stop_is_prompt(temp_db):
+    """Test: stop() tidak menunggu polling timeout worker yang idle"""
+    import time
+    
+    proc = EventProcessor(DedupStore(db_path=temp_db), num_workers=4, num_partitions=4)
+    await proc.start()
+    await asyncio.sleep(0.01)
+    
+    start = time.perf_counter()
+    await proc.stop()
+    assert time.perf_counter() - start < 0.2
+    assert all(task.done() for task in asyncio.all_tasks() if task is not asyncio.current_task())
+
+
+@pytest.mark.asyncio
+async def test_consumer_drains_available_events_in_batches(temp_db):
+    """Test: Consumer mengambil semua event yang tersedia sampai batch_size"""
+    batch_sizes = []
+    
+    class BatchRecordingProcessor(EventProcessor):
+        async def _process_batch(self, partition, batch):
+            batch_sizes.append(len(batch))
+            await super()._process_batch(partition, batch)
+    
+    proc = BatchRecordingProcessor(DedupStore(db_path=temp_db), batch_size=64)
+    await proc.start()
+    
+    # Semua event masuk queue sebelum worker sempat berjalan
+    await proc.submit_events(make_events(topics=2, per_topic=100))
+    await proc.stop()
+    
+    assert sum(batch_sizes) == 200
+    assert batch_sizes[:3] == [64, 64, 64]
+
+
+@pytest.mark.asyncio
+async def test_background_compaction_expires_events(temp_db):
+    """Test: Background task meng-expire event lewat retention window dan berhenti saat stop"""
+    store = DedupStore(
+        db_path=temp_db,
+        retention=RetentionPolicy(retention_seconds=0.2, interval=0.05, batch_size=10)
+    )
+    proc = EventProcessor(store)
+    await proc.start()
+    assert proc._compaction_task is not None
+    
+    events = make_events(topics=2, per_topic=15)
+    await proc.submit_events(events)
+    
+    for _ in range(100):
+        if proc.get_stats().expired_events == len(events):
+            break
+        await asyncio.sleep(0.05)
+    
+    stats = proc.get_stats()
+    assert stats.expired_events == len(events)
+    assert stats.stored_events == 0
+    assert stats.compaction_seconds > 0
+    # Counter lifetime tidak berkurang karena expiry
+    assert stats.unique_processed == len(events)
+    
+    # Setelah expired, event yang sama diterima lagi sebagai event baru
+    result = await proc.submit_events(events[:5])
+    assert result["processed"] == 5
+    
+    await proc.stop()
+    assert proc._compaction_task is None
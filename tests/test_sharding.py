@@ -0,0 +1,201 @@
+"""
+Test sharded dedup store dan tool reshard
+"""
+import pytest
+import threading
+from src.models import Event
+from src.dedup_store import DedupStore, RetentionPolicy, parse_event_ts
+from src.event_processor import EventProcessor
+from src.reshard import layout_paths, reshard
+from src.sharded_store import ShardedDedupStore, find_layouts, open_dedup_store
+from datetime import datetime, timedelta
+
+
+def make_events(batch, count=30):
+    """Event lintas 3 topic dengan timestamp berbeda per jam"""
+    return [
+        Event(
+            topic=("orders", "clicks", "audit")[i % 3],
+            event_id=f"evt-{(i * 7) % count:02d}-{batch}",
+            timestamp=f"2025-10-22T{10 + i % 4:02d}:00:00Z",
+            source="test",
+            payload={"batch": batch, "i": i}
+        )
+        for i in range(count)
+    ]
+
+
+def walk(store, topic, limit, **filters):
+    """Ambil seluruh event_id topic lewat cursor pagination"""
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = store.get_events_page(topic, limit=limit, cursor=cursor, **filters)
+        seen.extend(event.event_id for event in page)
+        if cursor is None:
+            return seen
+
+
+def expected_order(sharded, topic, **filters):
+    """Urutan (processed_at, event_id) DESC dari gabungan semua shard"""
+    entries = []
+    for shard in sharded.shards:
+        entries.extend(shard.get_events_keyed(topic, 10 ** 6, **filters)[0])
+    return [event_id for _, event_id, _ in sorted(entries, key=lambda e: e[:2], reverse=True)]
+
+
+@pytest.fixture(params=["table", "segment-log"])
+def log_options(request, tmp_path):
+    """Backend payload: tabel event_log SQLite atau segment log"""
+    if request.param == "table":
+        return {}
+    return {"event_log_dir": str(tmp_path / "events"), "segment_bytes": 8192}
+
+
+def test_sharded_claims_and_pages_match_single_store(tmp_path, log_options):
+    """Test: Hasil claim, counter dan pagination sharded store sama dengan store tanpa shard"""
+    single = DedupStore(db_path=str(tmp_path / "single.db"))
+    sharded = ShardedDedupStore(db_path=str(tmp_path / "dedup.db"), shards=4, **log_options)
+
+    for batch in range(4):
+        # Duplikasi di dalam batch dan lintas batch
+        events = make_events(batch) + make_events(max(batch - 1, 0), 10)
+        assert sharded.claim_many(events) == single.claim_many(events)
+    assert sharded.claim(make_events(0)[0]) is single.claim(make_events(0)[0]) is False
+    assert sharded.is_duplicate(make_events(3)[5])
+
+    assert sharded.get_counters() == single.get_counters()
+    assert [(t.topic, t.count) for t in sharded.get_topic_stats()] == [
+        (t.topic, t.count) for t in single.get_topic_stats()
+    ]
+    assert sharded.get_all_topics() == single.get_all_topics()
+    assert all(shard.get_total_processed() > 0 for shard in sharded.shards)
+
+    # Merge lintas shard urut (processed_at, event_id) DESC, cursor tidak melompati event
+    for topic in ("orders", "clicks", "audit"):
+        order = expected_order(sharded, topic)
+        assert sorted(order) == sorted(walk(single, topic, 1000))
+        assert walk(sharded, topic, 7) == walk(sharded, topic, 1) == order
+    window = {
+        "since": parse_event_ts("2025-10-22T11:00:00Z"),
+        "until": parse_event_ts("2025-10-22T13:00:00Z")
+    }
+    assert walk(sharded, "orders", 3, **window) == expected_order(sharded, "orders", **window)
+
+    records, cursor = sharded.get_events_page("clicks", limit=5)
+    lines, json_cursor = sharded.get_events_json_page("clicks", limit=5)
+    assert [bytes(line) for line in lines] == [record.to_json().encode() for record in records]
+    assert cursor == json_cursor
+    with pytest.raises(ValueError):
+        sharded.get_events_page("clicks", cursor="not-a-cursor")
+
+    sharded.clear()
+    assert sharded.get_total_processed() == 0
+    assert sharded.claim(make_events(0)[0])
+    single.close()
+    sharded.close()
+
+
+def test_claim_not_blocked_by_busy_shard(tmp_path):
+    """Test: Shard punya lock sendiri, claim ke shard lain tidak menunggu shard yang sibuk"""
+    store = ShardedDedupStore(db_path=str(tmp_path / "dedup.db"), shards=4)
+    events = make_events(0, 40)
+    busy = [e for e in events if store.shard_for(e.topic, e.event_id) == 0]
+    others = [e for e in events if store.shard_for(e.topic, e.event_id) != 0]
+    assert busy and others
+
+    results = {}
+    def claim(name, batch):
+        results[name] = store.claim_many(batch)
+
+    # Shard 0 ditahan (mis. expiry/checkpoint panjang)
+    with store.shards[0].lock:
+        other_thread = threading.Thread(target=claim, args=("others", others))
+        busy_thread = threading.Thread(target=claim, args=("busy", busy))
+        other_thread.start()
+        busy_thread.start()
+        other_thread.join(timeout=5)
+        assert results.get("others") == [True] * len(others)
+        busy_thread.join(timeout=0.2)
+        assert busy_thread.is_alive()
+    busy_thread.join(timeout=5)
+    assert results["busy"] == [True] * len(busy)
+    assert store.get_total_processed() == 40
+    store.close()
+
+
+def test_sharded_retention_expires_every_shard(tmp_path):
+    """Test: Compaction sharded store menghabiskan event lama di semua shard"""
+    store = ShardedDedupStore(
+        db_path=str(tmp_path / "dedup.db"),
+        shards=3,
+        retention=RetentionPolicy(retention_seconds=60, batch_size=4)
+    )
+    store.claim_many(make_events(0, 60))
+    assert store.compact() == 0
+    assert store.compact(now=datetime.utcnow() + timedelta(minutes=5)) == 60
+    assert store.get_total_processed() == 0
+    assert store.retention_stats()["expired_events"] == 60
+    assert store.claim_many(make_events(0, 3)) == [True] * 3
+    store.close()
+
+
+def test_layout_mismatch_rejected_and_reshard_preserves_data(tmp_path, log_options):
+    """Test: Layout shard lain ditolak; reshard menyalin key, urutan /events dan counter"""
+    db_path = str(tmp_path / "dedup.db")
+    store = open_dedup_store(db_path, 1, **log_options)
+    assert isinstance(store, DedupStore)
+    for batch in range(3):
+        store.claim_many(make_events(batch) + make_events(0, 5))
+    counters = store.get_counters()
+    pages = {topic: walk(store, topic, 1000) for topic in ("orders", "clicks", "audit")}
+    store.close()
+
+    with pytest.raises(ValueError, match="reshard"):
+        open_dedup_store(db_path, 4, **log_options)
+
+    assert reshard(db_path, 1, 4, **log_options) == sum(map(len, pages.values()))
+    assert find_layouts(db_path) == [1, 4]
+    with pytest.raises(ValueError):
+        reshard(db_path, 1, 4, **log_options)
+
+    store = open_dedup_store(db_path, 4, **log_options)
+    assert isinstance(store, ShardedDedupStore)
+    assert store.get_counters() == counters
+    # processed_at asli dipertahankan: urutan halaman sama persis dengan layout lama
+    assert {topic: walk(store, topic, 4) for topic in pages} == pages
+    assert store.claim_many(make_events(2)) == [False] * 30
+    counters = store.get_counters()
+    store.close()
+
+    # Layout lama disisakan untuk dihapus operator; 4 -> 2 shard
+    assert db_path in layout_paths(db_path, 1, log_options.get("event_log_dir"))
+    assert reshard(db_path, 4, 2, **log_options) == sum(map(len, pages.values()))
+    store = open_dedup_store(db_path, 2, **log_options)
+    assert store.get_counters() == counters
+    assert {topic: walk(store, topic, 1000) for topic in pages} == pages
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_processor_on_sharded_store(tmp_path):
+    """Test: EventProcessor bekerja di atas sharded store (stats dan /events gabungan)"""
+    store = ShardedDedupStore(db_path=str(tmp_path / "dedup.db"), shards=4, bloom_capacity=1000)
+    processor = EventProcessor(store, num_partitions=2)
+    await processor.start()
+
+    result = await processor.submit_events(make_events(0) + make_events(0)[:10])
+    assert result["processed"] == 30
+    assert result["duplicates"] == 10
+    await processor.drain()
+
+    stats = processor.get_stats()
+    assert stats.unique_processed == 30
+    assert stats.duplicate_dropped == 10
+    assert stats.stored_events == 30
+    assert stats.bloom_fill_ratio > 0
+    page, cursor = await processor.get_events_page("orders", limit=4)
+    assert len(page) == 4 and cursor is not None
+
+    await processor.stop()
+    assert store.closed